@@ -0,0 +1,186 @@
+"""
+Load test of every HTTP endpoint through an in-process ASGI client
+(httpx.ASGITransport). The numbers include routing, validation, the
+threadpool hand-off, the database and serialization, but no sockets or
+server process, so they are stable enough to compare between commits.
+
+Each endpoint gets `--requests` requests from `--concurrency` concurrent
+clients, against a copy of a generated power-law graph. Results (p50/p95/p99
+latency, requests per second, non-2xx responses as errors) are written as
+JSON; compare two runs with benchmarks.compare.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_api --scale 10k --concurrency 32 --output results/api.json
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Optional, Set
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.append(str(BACKEND_DIR))
+
+import httpx
+
+from benchmarks.common import (
+    BenchContext,
+    add_graph_arguments,
+    graph_users,
+    load_graph_sample,
+    prepare_graph,
+    run_metadata,
+    summarize,
+    working_copy,
+    write_results,
+)
+
+BULK_ROWS = 1000
+
+
+@dataclass
+class Endpoint:
+    name: str
+    # Returns the keyword arguments for httpx.AsyncClient.request, or None
+    # when there is nothing left to request (e.g. no rows left to delete)
+    request: Callable[[BenchContext], Optional[dict]]
+    # "read", "write" (half the requests) or "batch" (--batch-requests)
+    kind: str = "read"
+    ok: Set[int] = field(default_factory=lambda: {200})
+    on_response: Optional[Callable[[BenchContext, httpx.Response], None]] = None
+
+
+def _connect_request(ctx: BenchContext) -> dict:
+    user_id_1, user_id_2 = ctx.pair()
+    return {"method": "POST", "url": "/users/connect", "json": {"user_id": str(user_id_1), "connected_user_id": str(user_id_2)}}
+
+def _record_connection(ctx: BenchContext, response: httpx.Response) -> None:
+    body = response.json()
+    ctx.new_edges.append((body["user_id"], body["connected_user_id"]))
+
+def _delete_connection_request(ctx: BenchContext) -> Optional[dict]:
+    # Deletes connections made by the POST /users/connect case
+    if not ctx.new_edges:
+        return None
+    return {"method": "DELETE", "url": "/users/connections/{}/{}".format(*ctx.new_edges.pop())}
+
+def _delete_user_request(ctx: BenchContext) -> Optional[dict]:
+    # Deletes users made by the POST /users/ case
+    if not ctx.new_users:
+        return None
+    return {"method": "DELETE", "url": f"/users/{ctx.new_users.pop()}"}
+
+def _bulk_connect_request(ctx: BenchContext) -> dict:
+    pairs = (ctx.pair() for _ in range(BULK_ROWS))
+    return {"method": "POST", "url": "/users/connect/bulk", "json": [
+        {"user_id": str(user_id_1), "connected_user_id": str(user_id_2)} for user_id_1, user_id_2 in pairs
+    ]}
+
+
+ENDPOINTS = [
+    Endpoint("GET /users/", lambda ctx: {"method": "GET", "url": "/users/", "params": {"limit": 100}}),
+    Endpoint("GET /users/ (deep page)", lambda ctx: {"method": "GET", "url": "/users/", "params": {"limit": 100, "cursor": ctx.deep_cursor}}),
+    Endpoint("GET /users/{user_id}", lambda ctx: {"method": "GET", "url": f"/users/{ctx.user_id()}"}),
+    Endpoint("GET /users/{user_id}/connections", lambda ctx: {"method": "GET", "url": f"/users/{ctx.user_id()}/connections"}),
+    Endpoint("GET /users/{user_id}/possible_connections", lambda ctx: {"method": "GET", "url": f"/users/{ctx.user_id()}/possible_connections"}),
+    Endpoint("GET /users/{user_id}/path/{other_user_id}", lambda ctx: {"method": "GET", "url": "/users/{}/path/{}".format(*ctx.pair())}, ok={200, 404, 422}),
+    Endpoint("GET /users/{user_id}/network", lambda ctx: {"method": "GET", "url": f"/users/{ctx.user_id()}/network", "params": {"depth": 2}}),
+    Endpoint("GET /stats/", lambda ctx: {"method": "GET", "url": "/stats/"}),
+    Endpoint("GET /stats/cache", lambda ctx: {"method": "GET", "url": "/stats/cache"}),
+    Endpoint("GET /metrics", lambda ctx: {"method": "GET", "url": "/metrics"}),
+    Endpoint("POST /users/", lambda ctx: {"method": "POST", "url": "/users/", "json": {"name": "Bench", "email": ctx.email()}},
+             kind="write", on_response=lambda ctx, response: ctx.new_users.append(response.json()["id"])),
+    Endpoint("PUT /users/{user_id}", lambda ctx: {"method": "PUT", "url": f"/users/{ctx.user_id()}", "json": {"name": "Renamed", "email": "unused@example.com"}},
+             kind="write"),
+    Endpoint("POST /users/connect", _connect_request, kind="write", on_response=_record_connection),
+    Endpoint("DELETE /users/connections/{user_id_1}/{user_id_2}", _delete_connection_request, kind="write", ok={204}),
+    Endpoint("DELETE /users/{user_id}", _delete_user_request, kind="write"),
+    Endpoint("POST /users/bulk", lambda ctx: {"method": "POST", "url": "/users/bulk", "json": [{"name": "Bench", "email": ctx.email()} for _ in range(BULK_ROWS)]},
+             kind="batch"),
+    Endpoint("POST /users/connect/bulk", _bulk_connect_request, kind="batch"),
+    Endpoint("GET /users/ (ndjson stream)", lambda ctx: {"method": "GET", "url": "/users/", "headers": {"Accept": "application/x-ndjson"}}, kind="batch"),
+]
+
+
+async def run_endpoint(client: httpx.AsyncClient, endpoint: Endpoint, ctx: BenchContext, total: int, concurrency: int) -> dict:
+    latencies, errors, remaining = [], 0, total
+
+    async def worker():
+        nonlocal errors, remaining
+        while remaining > 0:
+            remaining -= 1
+            kwargs = endpoint.request(ctx)
+            if not kwargs:
+                errors += 1
+                continue
+            started = time.perf_counter()
+            try:
+                response = await client.request(**kwargs)
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            elapsed = time.perf_counter() - started
+            if response.status_code not in endpoint.ok:
+                errors += 1
+                continue
+            latencies.append(elapsed)
+            if endpoint.on_response:
+                endpoint.on_response(ctx, response)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, total))))
+    return summarize(latencies, time.perf_counter() - started, errors)
+
+
+async def run_endpoints(app, ctx: BenchContext, args) -> dict:
+    totals = {"read": args.requests, "write": max(1, args.requests // 2), "batch": args.batch_requests}
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for endpoint in ENDPOINTS:
+            if args.only and not any(pattern in endpoint.name for pattern in args.only):
+                continue
+            results[endpoint.name] = await run_endpoint(client, endpoint, ctx, totals[endpoint.kind], args.concurrency)
+            print(f"{endpoint.name}: {results[endpoint.name]}", file=sys.stderr)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_graph_arguments(parser)
+    parser.add_argument("--requests", type=int, default=500, help="requests per read endpoint")
+    parser.add_argument("--batch-requests", type=int, default=3, help="requests per bulk or full-stream endpoint")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--cache", default="none", help="CACHE_BACKEND for the app (default: none, to measure the database path)")
+    parser.add_argument("--only", nargs="*", help="only run endpoints whose name contains one of these")
+    args = parser.parse_args()
+
+    graph = prepare_graph(args.data_dir, graph_users(args), args.degree, args.exponent, args.seed)
+    workdir = Path(tempfile.mkdtemp(prefix="bench-api-"))
+    try:
+        database_url = f"sqlite:///{working_copy(graph, workdir)}"
+        user_ids, edges = load_graph_sample(database_url)
+        # The app reads its settings when imported, so configure it first
+        os.environ.update(DATABASE_URL=database_url, CACHE_BACKEND=args.cache)
+        from main import app
+        import crud.user_crud as user_crud
+        from db.database import SessionLocal
+        import models.models as models
+
+        ctx = BenchContext(user_ids, edges, args.seed)
+        with SessionLocal() as db:
+            middle = db.query(models.User).order_by(models.User.created_at, models.User.id).offset(len(user_ids) // 2).first()
+            ctx.deep_cursor = user_crud.encode_user_cursor(middle)
+        results = asyncio.run(run_endpoints(app, ctx, args))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    write_results("api", run_metadata(args, requests=args.requests, concurrency=args.concurrency, cache=args.cache), results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Compares the sync (threadpool) and async (DB_ASYNC=1) route stacks under
+high concurrency.
+
+For each mode a fresh uvicorn process is started against the same seeded
+SQLite file, and `--concurrency` clients issue a read-heavy mix of requests
+for `--duration` seconds. Results (requests per second and latency
+percentiles) are printed as JSON.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_async --users 10000 --concurrency 500 --duration 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.append(str(BACKEND_DIR))
+
+import httpx
+
+from benchmarks.common import seed_uniform_graph, summarize
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _wait_until_ready(base_url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(f"{base_url}/stats/")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not start")
+
+
+async def _run_load(base_url: str, user_ids, concurrency: int, duration: float, timeout: float, seed: int = 0):
+    rng = random.Random(seed)
+    latencies, errors = [], 0
+    deadline = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+        async def worker():
+            nonlocal errors
+            while time.monotonic() < deadline:
+                user_id = rng.choice(user_ids)
+                path = rng.choice([f"/users/{user_id}", f"/users/{user_id}/connections", "/stats/"])
+                started = time.perf_counter()
+                try:
+                    response = await client.get(path)
+                    if response.status_code != 200:
+                        errors += 1
+                        continue
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+
+        started = time.monotonic()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.monotonic() - started
+    return summarize(latencies, elapsed, errors)
+
+
+def run_mode(workdir: Path, user_ids, db_async: bool, args) -> dict:
+    port = _free_port()
+    env = dict(
+        os.environ,
+        DB_ASYNC="1" if db_async else "0",
+        # Measure the database path, not the response cache
+        CACHE_BACKEND="none",
+        PYTHONPATH=str(BACKEND_DIR),
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir, env=env,
+        # Failed requests are counted as errors; keep server tracebacks out of the report
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        asyncio.run(_wait_until_ready(base_url))
+        result = asyncio.run(_run_load(base_url, user_ids, args.concurrency, args.duration, args.timeout))
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            # Graceful shutdown waits for in-flight requests, which can be
+            # stuck behind an exhausted connection pool on the sync path
+            server.kill()
+            server.wait()
+    return {"mode": "async" if db_async else "sync", **result}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--degree", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--timeout", type=float, default=30.0, help="per-request client timeout in seconds")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench-async-"))
+    try:
+        # The app opens ./database.db relative to its working directory
+        user_ids = [str(user_id) for user_id in seed_uniform_graph(f"sqlite:///{workdir / 'database.db'}", args.users, args.degree)]
+        results = [run_mode(workdir, user_ids, db_async, args) for db_async in (False, True)]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps({"users": args.users, "concurrency": args.concurrency, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Micro-benchmarks for the CRUD layer: every function of crud.user_crud,
+crud.statistics_crud and crud.graph_crud is called directly, without HTTP,
+against a generated power-law graph.
+
+Read functions run `--iterations` times with random arguments. Functions
+that scan whole tables run `--scan-iterations` times. Writes run against a
+throwaway copy of the graph. Results (p50/p95/p99 latency and calls per
+second per function) are written as JSON; compare two runs with
+benchmarks.compare.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_crud --scale 100k --output results/crud.json
+"""
+import argparse
+import sys
+import shutil
+import tempfile
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.append(str(BACKEND_DIR))
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+import models.models as models
+import schemas
+import crud.graph_crud as graph_crud
+import crud.statistics_crud as statistics_crud
+import crud.user_crud as user_crud
+import core.graph_store as graph_store
+from db.database import build_engine
+from benchmarks.common import (
+    BenchContext,
+    add_graph_arguments,
+    graph_users,
+    load_graph_sample,
+    prepare_graph,
+    run_metadata,
+    time_calls,
+    working_copy,
+    write_results,
+)
+
+
+def _create_user(db, ctx):
+    user = user_crud.create_user(db, schemas.UserCreate(name="Bench", email=ctx.email()))
+    ctx.new_users.append(user.id)
+
+def _create_connection(db, ctx):
+    user_id_1, user_id_2 = ctx.pair()
+    try:
+        user_crud.create_connection(db, user_id_1, user_id_2)
+    except IntegrityError:
+        db.rollback()
+        return False
+    ctx.new_edges.append((user_id_1, user_id_2))
+
+def _delete_connection(db, ctx):
+    if not ctx.new_edges:
+        return False
+    return user_crud.delete_connection(db, *ctx.new_edges.pop())
+
+def _delete_user(db, ctx):
+    if not ctx.new_users:
+        return False
+    return user_crud.delete_user(db, ctx.new_users.pop())
+
+def _delete_connected_user(db, ctx):
+    # Deletes an existing user of the graph with all their connections, and
+    # drops them from the sample so later cases do not pick them
+    return user_crud.delete_user(db, ctx.user_ids.pop(ctx.rng.randrange(len(ctx.user_ids))))
+
+def _create_users_batch(db, ctx):
+    user_crud.create_users_batch(db, [
+        (index, schemas.UserCreate(name="Bench", email=ctx.email())) for index in range(user_crud.BULK_BATCH_SIZE)
+    ])
+
+def _create_connections_batch(db, ctx):
+    user_crud.create_connections_batch(db, [
+        (index, schemas.ConnectionCreate(user_id=user_id_1, connected_user_id=user_id_2))
+        for index, (user_id_1, user_id_2) in enumerate(ctx.pair() for _ in range(user_crud.BULK_BATCH_SIZE))
+    ])
+
+def _find_path(db, ctx):
+    # Searches giving up at MAX_VISITED are a result too, and cost the most
+    try:
+        graph_crud.find_path(db, *ctx.pair())
+    except graph_crud.SearchLimitExceeded:
+        pass
+
+def _apply_statistics_delta(db, ctx):
+    statistics_crud.apply_statistics_delta(db, users=1, connections=1)
+    db.rollback()
+
+
+# (name, call(db, ctx), kind) where kind picks the iteration count:
+# "read", "scan" (whole-table), "write" (half the reads) or "batch" (bulk)
+CASES = [
+    ("user_crud.get_user_by_id", lambda db, ctx: user_crud.get_user_by_id(db, ctx.user_id()), "read"),
+    ("user_crud.get_user_by_email", lambda db, ctx: user_crud.get_user_by_email(db, f"user{ctx.rng.randrange(len(ctx.user_ids))}@example.com"), "read"),
+    ("user_crud.get_users_page", lambda db, ctx: user_crud.get_users_page(db, limit=100), "read"),
+    ("user_crud.get_users_page.deep", lambda db, ctx: user_crud.get_users_page(db, limit=100, cursor=ctx.deep_cursor), "read"),
+    ("user_crud.search_user_rows", lambda db, ctx: user_crud.search_user_rows(db, f"user{ctx.rng.randrange(len(ctx.user_ids))}"[:6]), "read"),
+    ("user_crud.search_user_rows.words", lambda db, ctx: user_crud.search_user_rows(db, f"us {ctx.rng.randrange(len(ctx.user_ids))}"), "read"),
+    ("user_crud.get_user_connections", lambda db, ctx: user_crud.get_user_connections(db, ctx.user_id()), "read"),
+    ("user_crud.get_neighbor_ids", lambda db, ctx: user_crud.get_neighbor_ids(db, ctx.user_id()), "read"),
+    ("user_crud.get_connection", lambda db, ctx: user_crud.get_connection(db, *ctx.rng.choice(ctx.edges)), "read"),
+    ("user_crud.get_possible_users_to_connect", lambda db, ctx: user_crud.get_possible_users_to_connect(db, ctx.user_id()), "read"),
+    ("graph_crud.find_path", _find_path, "read"),
+    ("graph_crud.get_network", lambda db, ctx: graph_crud.get_network(db, ctx.user_id(), depth=2, max_users=1000), "read"),
+    ("statistics_crud.get_statistics", lambda db, ctx: statistics_crud.get_statistics(db), "read"),
+    ("statistics_crud.get_average_connections_per_user", lambda db, ctx: statistics_crud.get_average_connections_per_user(db), "read"),
+    ("statistics_crud.get_timeseries", lambda db, ctx: statistics_crud.get_timeseries(db, "hour", datetime.now(timezone.utc) - timedelta(hours=47), datetime.now(timezone.utc)), "read"),
+    ("user_crud.get_all_users", lambda db, ctx: user_crud.get_all_users(db), "scan"),
+    ("user_crud.iter_users", lambda db, ctx: sum(1 for _ in user_crud.iter_users(db)), "scan"),
+    ("statistics_crud.compute_statistics_counters", lambda db, ctx: statistics_crud.compute_statistics_counters(db), "scan"),
+    ("statistics_crud.reconcile_statistics", lambda db, ctx: statistics_crud.reconcile_statistics(db), "scan"),
+    ("user_crud.backfill_adjacency", lambda db, ctx: user_crud.backfill_adjacency(db), "scan"),
+    ("statistics_crud.rebuild_rollups", lambda db, ctx: statistics_crud.rebuild_rollups(db), "scan"),
+    ("user_crud.create_user", _create_user, "write"),
+    ("user_crud.modify_user", lambda db, ctx: user_crud.modify_user(db, ctx.user_id(), schemas.UserCreate(name="Renamed", email="unused@example.com")), "write"),
+    ("user_crud.create_connection", _create_connection, "write"),
+    ("user_crud.delete_connection", _delete_connection, "write"),
+    ("user_crud.delete_user", _delete_user, "write"),
+    ("statistics_crud.apply_statistics_delta", _apply_statistics_delta, "write"),
+    ("user_crud.create_users_batch", _create_users_batch, "batch"),
+    ("user_crud.create_connections_batch", _create_connections_batch, "batch"),
+    ("user_crud.delete_user.connected", _delete_connected_user, "write"),
+]
+
+
+def run_cases(database_url: str, ctx: BenchContext, args, only=None) -> dict:
+    engine = build_engine(database_url)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    iterations = {
+        "read": args.iterations,
+        "scan": args.scan_iterations,
+        "write": max(1, args.iterations // 2),
+        "batch": args.scan_iterations,
+    }
+    with SessionLocal() as db:
+        # A cursor from the middle of the table for the deep-page case
+        middle = db.query(models.User).order_by(models.User.created_at, models.User.id).offset(len(ctx.user_ids) // 2).first()
+        ctx.deep_cursor = user_crud.encode_user_cursor(middle)
+        if args.graph_store:
+            graph_store.store.load(db)
+            print(f"graph store: {graph_store.store.memory_usage()}", file=sys.stderr)
+
+    results = {}
+    for name, call, kind in CASES:
+        if only and not any(pattern in name for pattern in only):
+            continue
+        with SessionLocal() as db:
+            results[name] = time_calls(lambda: call(db, ctx), iterations[kind])
+        print(f"{name}: {results[name]}", file=sys.stderr)
+    engine.dispose()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_graph_arguments(parser)
+    parser.add_argument("--iterations", type=int, default=200, help="calls per read function")
+    parser.add_argument("--scan-iterations", type=int, default=3, help="calls per whole-table or batch function")
+    parser.add_argument("--only", nargs="*", help="only run functions whose name contains one of these")
+    parser.add_argument("--graph-store", action="store_true", help="load the in-memory graph store first")
+    args = parser.parse_args()
+
+    graph = prepare_graph(args.data_dir, graph_users(args), args.degree, args.exponent, args.seed)
+    workdir = Path(tempfile.mkdtemp(prefix="bench-crud-"))
+    try:
+        database_url = f"sqlite:///{working_copy(graph, workdir)}"
+        user_ids, edges = load_graph_sample(database_url)
+        results = run_cases(database_url, BenchContext(user_ids, edges, args.seed), args, args.only)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    write_results("crud", run_metadata(args, iterations=args.iterations, graph_store=args.graph_store), results, args.output)
+
+
+if __name__ == "__main__":
+    main()
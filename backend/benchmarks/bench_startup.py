@@ -0,0 +1,114 @@
+"""
+Measures cold start: how long a new process takes to import the
+application, and how long a new uvicorn worker takes until it answers its
+first request. This is the delay an autoscaler waits for before a new
+instance takes traffic.
+
+Every run starts from a fresh interpreter against an already migrated
+SQLite file, the way production workers start (MIGRATE_ON_STARTUP=0, so
+only the schema check runs). Results (median and worst of `--runs`) are
+printed as JSON; with `--budget` the command exits with status 1 when the
+worst time to first response exceeds it, so it can gate CI.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_startup --runs 5 --budget 2.0
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.append(str(BACKEND_DIR))
+
+import httpx
+
+from benchmarks.common import seed_uniform_graph
+
+_IMPORT_SCRIPT = "import time; started = time.perf_counter(); import main; print(time.perf_counter() - started)"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _environment() -> dict:
+    return dict(os.environ, PYTHONPATH=str(BACKEND_DIR), MIGRATE_ON_STARTUP="0")
+
+
+def measure_import(workdir: Path) -> float:
+    """Seconds spent importing `main` in a new interpreter."""
+    output = subprocess.run(
+        [sys.executable, "-c", _IMPORT_SCRIPT], cwd=workdir, env=_environment(),
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def measure_first_response(workdir: Path, timeout: float = 30.0) -> float:
+    """Seconds from spawning a uvicorn process until GET /stats/ succeeds."""
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}/stats/"
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir, env=_environment(), stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client() as client:
+            while time.perf_counter() - started < timeout:
+                try:
+                    if client.get(url).status_code == 200:
+                        return time.perf_counter() - started
+                except httpx.TransportError:
+                    pass
+                if server.poll() is not None:
+                    raise RuntimeError("The server exited during startup")
+                time.sleep(0.01)
+    finally:
+        server.terminate()
+        server.wait()
+    raise RuntimeError(f"Server did not answer within {timeout} seconds")
+
+
+def _summary(values) -> dict:
+    return {"median_s": round(statistics.median(values), 3), "max_s": round(max(values), 3)}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--users", type=int, default=1_000, help="users in the seeded database")
+    parser.add_argument("--budget", type=float, help="maximum seconds to first response; exit 1 when exceeded")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench-startup-"))
+    try:
+        # The app opens ./database.db relative to its working directory
+        seed_uniform_graph(f"sqlite:///{workdir / 'database.db'}", args.users, 10)
+        subprocess.run([sys.executable, "-m", "scripts.migrate"], cwd=BACKEND_DIR, check=True, capture_output=True,
+                       env=dict(os.environ, DATABASE_URL=f"sqlite:///{workdir / 'database.db'}"))
+        imports = [measure_import(workdir) for _ in range(args.runs)]
+        first_responses = [measure_first_response(workdir) for _ in range(args.runs)]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {"runs": args.runs, "import": _summary(imports), "first_response": _summary(first_responses)}
+    if args.budget is not None:
+        report["budget_s"] = args.budget
+        report["within_budget"] = max(first_responses) <= args.budget
+    print(json.dumps(report, indent=2))
+    return 0 if report.get("within_budget", True) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
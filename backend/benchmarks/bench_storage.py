@@ -0,0 +1,127 @@
+"""
+Compares the two id storage formats on SQLite (see db.uuid_storage): the
+same generated graph is written once with 16-byte BLOB ids and once with
+the 32-character hex text ids older databases use.
+
+Reports the size of each file and of its largest tables and indexes
+(after VACUUM), and the latency of the joins the read endpoints run: a
+user's neighbors, friends of friends, and mutual connections of a pair.
+The join cases are named "<case>.blob" and "<case>.text"; sizes are in
+the "meta" section.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_storage --scale 100k --output results/storage.json
+"""
+import argparse
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.append(str(BACKEND_DIR))
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from db.database import install_sqlite_pragmas
+from db.uuid_storage import convert_database
+from benchmarks.common import (
+    BenchContext,
+    add_graph_arguments,
+    graph_users,
+    load_graph_sample,
+    prepare_graph,
+    run_metadata,
+    time_calls,
+    working_copy,
+    write_results,
+)
+
+# The joins behind /users/{id}/connections, /users/{id}/possible_connections
+# and /users/{id}/mutual/{other}, written out so both formats run the same SQL
+JOINS = {
+    "neighbors": (
+        "SELECT u.id, u.name, u.email FROM user_adjacency a JOIN users u ON u.id = a.neighbor_id WHERE a.user_id = :a",
+        1,
+    ),
+    "friends_of_friends": (
+        "SELECT second.neighbor_id, count(*) FROM user_adjacency first "
+        "JOIN user_adjacency second ON second.user_id = first.neighbor_id "
+        "WHERE first.user_id = :a AND second.neighbor_id != :a "
+        "GROUP BY second.neighbor_id ORDER BY count(*) DESC LIMIT 20",
+        1,
+    ),
+    "mutual": (
+        "SELECT u.id, u.name FROM user_adjacency first "
+        "JOIN user_adjacency second ON second.user_id = :b AND second.neighbor_id = first.neighbor_id "
+        "JOIN users u ON u.id = first.neighbor_id WHERE first.user_id = :a",
+        2,
+    ),
+}
+
+
+def storage_sizes(engine) -> dict:
+    """File size, plus the ten largest tables and indexes when SQLite has the dbstat table."""
+    with engine.connect() as connection:
+        page_size = connection.exec_driver_sql("PRAGMA page_size").scalar()
+        pages = connection.exec_driver_sql("PRAGMA page_count").scalar()
+        sizes = {"file_mb": round(page_size * pages / 2**20, 2)}
+        try:
+            largest = connection.exec_driver_sql(
+                "SELECT name, sum(pgsize) FROM dbstat GROUP BY name ORDER BY sum(pgsize) DESC LIMIT 10"
+            ).all()
+        except OperationalError:
+            return sizes
+    sizes["objects_mb"] = {name: round(size / 2**20, 2) for name, size in largest}
+    return sizes
+
+
+def run_joins(engine, ctx: BenchContext, iterations: int, encode) -> dict:
+    results = {}
+    with engine.connect() as connection:
+        for name, (sql, arguments) in JOINS.items():
+            statement = text(sql)
+
+            def call():
+                ids = ctx.rng.choice(ctx.edges) if arguments == 2 else (ctx.user_id(),)
+                connection.execute(statement, dict(zip("ab", map(encode, ids)))).all()
+
+            results[name] = time_calls(call, iterations)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_graph_arguments(parser)
+    parser.add_argument("--iterations", type=int, default=500, help="calls per join")
+    args = parser.parse_args()
+
+    graph = prepare_graph(args.data_dir, graph_users(args), args.degree, args.exponent, args.seed)
+    workdir = Path(tempfile.mkdtemp(prefix="bench-storage-"))
+    try:
+        blob_path = working_copy(graph, workdir)
+        text_path = workdir / "text-ids.db"
+        convert_database(blob_path, text_path, to_legacy=True)
+        user_ids, edges = load_graph_sample(f"sqlite:///{blob_path}")
+
+        sizes, results = {}, {}
+        for label, path, encode in (("blob", blob_path, lambda user_id: user_id.bytes), ("text", text_path, lambda user_id: user_id.hex)):
+            engine = create_engine(f"sqlite:///{path}")
+            with engine.connect() as connection:
+                connection.exec_driver_sql("VACUUM")
+            install_sqlite_pragmas(engine)
+            sizes[label] = storage_sizes(engine)
+            # Same random inputs for both formats
+            for name, summary in run_joins(engine, BenchContext(user_ids, edges, args.seed), args.iterations, encode).items():
+                results[f"{name}.{label}"] = summary
+                print(f"{name}.{label}: {summary}", file=sys.stderr)
+            engine.dispose()
+        print(f"sizes: {sizes}", file=sys.stderr)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    write_results("storage", run_metadata(args, iterations=args.iterations, sizes=sizes), results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""
+Helpers shared by the benchmark scripts.
+"""
+import argparse
+import itertools
+import json
+import platform
+import random
+import shutil
+import subprocess
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import sqlalchemy
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+
+import models.models as models
+from crud.statistics_crud import reconcile_statistics
+from crud.user_crud import search_term_rows
+from db.migrations import run_migrations
+from db.uuid_storage import convert_database, legacy_uuid_columns
+
+
+def percentile(sorted_values: Sequence[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies: List[float], elapsed: float, errors: int = 0) -> Dict[str, float]:
+    """
+    Turns raw per-request latencies (seconds) into the numbers we report.
+    """
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(ordered) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+    }
+
+
+def seed_uniform_graph(database_url: str, users: int, average_degree: int, seed: int = 0) -> List[uuid.UUID]:
+    """
+    Creates the schema and fills it with `users` users connected at random.
+    Returns the user ids.
+    """
+    rng = random.Random(seed)
+    engine = create_engine(database_url)
+    models.Base.metadata.create_all(engine)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    user_ids = [uuid.UUID(int=rng.getrandbits(128), version=4) for _ in range(users)]
+
+    edges = set()
+    target = users * average_degree // 2
+    while len(edges) < target:
+        a, b = rng.sample(range(users), 2)
+        edges.add((min(a, b), max(a, b)))
+    write_graph(engine, user_ids, sorted(edges), start)
+    return user_ids
+
+
+def power_law_edges(users: int, average_degree: int, exponent: float = 2.5, seed: int = 0) -> List[Tuple[int, int]]:
+    """
+    Chung-Lu style random graph: user i gets the weight (i + 1) ** (-1 / (exponent - 1))
+    and both ends of every edge are drawn proportionally to it, so expected
+    degrees follow a power law with the given exponent. A few hubs end up
+    with thousands of connections and most users with one or two, like a
+    real social graph. Self loops and duplicate edges are drawn again.
+    """
+    rng = random.Random(seed)
+    alpha = 1 / (exponent - 1)
+    cumulative = list(itertools.accumulate((i + 1) ** -alpha for i in range(users)))
+    population = range(users)
+    target = users * average_degree // 2
+    seen, edges = set(), []
+    while len(edges) < target:
+        ends = rng.choices(population, cum_weights=cumulative, k=2 * (target - len(edges)))
+        for a, b in zip(ends[::2], ends[1::2]):
+            if a == b:
+                continue
+            a, b = min(a, b), max(a, b)
+            # One int per edge keeps the dedup set small at the 1M-user scale
+            key = a * users + b
+            if key in seen:
+                continue
+            seen.add(key)
+            edges.append((a, b))
+            if len(edges) == target:
+                break
+    return edges
+
+
+def seed_power_law_graph(database_url: str, users: int, average_degree: int, exponent: float = 2.5, seed: int = 0) -> List[uuid.UUID]:
+    """
+    Same as seed_uniform_graph, with power-law degrees (see power_law_edges).
+    """
+    rng = random.Random(seed)
+    engine = create_engine(database_url)
+    models.Base.metadata.create_all(engine)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    user_ids = [uuid.UUID(int=rng.getrandbits(128), version=4) for _ in range(users)]
+    write_graph(engine, user_ids, power_law_edges(users, average_degree, exponent, seed), start)
+    return user_ids
+
+
+def write_graph(engine, user_ids: List[uuid.UUID], edges, start: datetime, batch_size: int = 5000) -> None:
+    """
+    Bulk-writes users and (index, index) edges, including the adjacency rows
+    and the statistics row, bypassing the per-row CRUD functions.
+    """
+    with Session(engine) as db:
+        for offset in range(0, len(user_ids), batch_size):
+            users = [
+                {
+                    "id": user_id,
+                    "name": f"User {offset + i}",
+                    "email": f"user{offset + i}@example.com",
+                    "created_at": start + timedelta(seconds=offset + i),
+                }
+                for i, user_id in enumerate(user_ids[offset:offset + batch_size])
+            ]
+            db.execute(insert(models.User), users)
+            db.execute(insert(models.UserSearchTerm), [
+                row for user in users for row in search_term_rows(user["id"], user["name"], user["email"])
+            ])
+        connections, adjacency = [], []
+        for n, (a, b) in enumerate(edges):
+            connection_id = uuid.uuid4()
+            connections.append({
+                "id": connection_id,
+                "user_id": user_ids[a],
+                "connected_user_id": user_ids[b],
+                "connection_made_at": start + timedelta(seconds=n),
+            })
+            adjacency.append({"user_id": user_ids[a], "neighbor_id": user_ids[b], "connection_id": connection_id})
+            adjacency.append({"user_id": user_ids[b], "neighbor_id": user_ids[a], "connection_id": connection_id})
+            if len(connections) >= batch_size:
+                db.execute(insert(models.Connection), connections)
+                db.execute(insert(models.UserAdjacency), adjacency)
+                connections, adjacency = [], []
+        if connections:
+            db.execute(insert(models.Connection), connections)
+            db.execute(insert(models.UserAdjacency), adjacency)
+        db.commit()
+        reconcile_statistics(db)
+
+
+# Named graph sizes accepted by --scale
+SCALES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+
+def add_graph_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--scale", choices=sorted(SCALES), default="10k", help="number of users in the generated graph")
+    parser.add_argument("--users", type=int, help="exact number of users, overrides --scale")
+    parser.add_argument("--degree", type=int, default=10, help="average number of connections per user")
+    parser.add_argument("--exponent", type=float, default=2.5, help="power-law exponent of the degree distribution")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", type=Path, default=Path(".benchmarks"), help="where generated graphs are kept between runs")
+    parser.add_argument("--output", type=Path, help="write the JSON results here instead of stdout")
+
+
+def graph_users(args) -> int:
+    return args.users or SCALES[args.scale]
+
+
+def prepare_graph(data_dir: Path, users: int, average_degree: int, exponent: float, seed: int) -> Path:
+    """
+    Returns a SQLite file holding the requested graph. Generating the large
+    graphs takes minutes, so each parameter set is only generated once;
+    benchmarks must run against a working_copy of it.
+    """
+    data_dir.mkdir(parents=True, exist_ok=True)
+    path = data_dir / f"graph-{users}-{average_degree}-{exponent}-{seed}.db"
+    if not path.exists():
+        partial = path.with_suffix(".partial")
+        partial.unlink(missing_ok=True)
+        seed_power_law_graph(f"sqlite:///{partial}", users, average_degree, exponent, seed)
+        partial.rename(path)
+    # Also brings graphs generated by an older schema up to date (text ids,
+    # new tables, indexes and their backfills)
+    if legacy_uuid_columns(create_engine(f"sqlite:///{path}")):
+        converted = path.with_suffix(".converting")
+        converted.unlink(missing_ok=True)
+        convert_database(path, converted)
+        converted.replace(path)
+    run_migrations(create_engine(f"sqlite:///{path}"))
+    return path
+
+
+def working_copy(path: Path, workdir: Path) -> Path:
+    copy = workdir / "database.db"
+    shutil.copyfile(path, copy)
+    return copy
+
+
+def load_graph_sample(database_url: str, edges: int = 10_000) -> Tuple[List[uuid.UUID], List[Tuple[uuid.UUID, uuid.UUID]]]:
+    """
+    Reads back every user id and a sample of existing edges to drive the
+    benchmark requests.
+    """
+    engine = create_engine(database_url)
+    with Session(engine) as db:
+        user_ids = list(db.scalars(select(models.User.id)))
+        sample = [tuple(row) for row in db.execute(
+            select(models.Connection.user_id, models.Connection.connected_user_id).limit(edges)
+        )]
+    engine.dispose()
+    return user_ids, sample
+
+
+def run_metadata(args, **extra) -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlalchemy": sqlalchemy.__version__,
+        "users": graph_users(args),
+        "degree": args.degree,
+        "exponent": args.exponent,
+        "seed": args.seed,
+        **extra,
+    }
+
+
+def write_results(suite: str, meta: dict, results: Dict[str, dict], output: Optional[Path]) -> None:
+    document = json.dumps({"suite": suite, "meta": meta, "results": results}, indent=2)
+    if output:
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(document + "\n")
+    else:
+        print(document)
+
+
+class BenchContext:
+    """
+    Random inputs for the benchmark cases, plus rows created by earlier
+    write cases that later ones (deletes) consume.
+    """
+    def __init__(self, user_ids, edges, seed: int):
+        self.rng = random.Random(seed)
+        self.user_ids = user_ids
+        self.edges = edges
+        self.new_users = []
+        self.new_edges = []
+        self.counter = 0
+        self.deep_cursor = None
+
+    def user_id(self):
+        return self.rng.choice(self.user_ids)
+
+    def pair(self):
+        return tuple(self.rng.sample(self.user_ids, 2))
+
+    def email(self) -> str:
+        self.counter += 1
+        return f"bench{self.counter}@example.com"
+
+
+def time_calls(call, iterations: int) -> Dict[str, float]:
+    """
+    Calls `call()` `iterations` times and summarizes the latencies. A call
+    returning False is counted as an error.
+    """
+    latencies, errors = [], 0
+    started = time.perf_counter()
+    for _ in range(iterations):
+        call_started = time.perf_counter()
+        if call() is False:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - call_started)
+    return summarize(latencies, time.perf_counter() - started, errors)
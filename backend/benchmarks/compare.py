@@ -0,0 +1,81 @@
+"""
+Compares two benchmark result files (from bench_crud or bench_api) and
+flags regressions: a case is reported as regressed when its p95 latency grew
+or its throughput dropped by more than `--threshold` (a fraction).
+
+Usage (from the backend directory):
+    python -m benchmarks.compare results/before.json results/after.json --threshold 0.15
+Exits with status 1 when something regressed and `--fail` is given, so it
+can gate CI.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+def _change(before: float, after: float) -> Optional[float]:
+    if not before:
+        return None
+    return (after - before) / before
+
+
+def compare_results(before: Dict[str, dict], after: Dict[str, dict], threshold: float) -> List[dict]:
+    """
+    Returns one row per case present in both runs with the relative change
+    of each reported number and whether it counts as a regression.
+    """
+    rows = []
+    for name in before:
+        if name not in after:
+            continue
+        old, new = before[name], after[name]
+        changes = {key: _change(old[key], new[key]) for key in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps")}
+        regressed = (
+            (changes["p95_ms"] is not None and changes["p95_ms"] > threshold)
+            or (changes["throughput_rps"] is not None and changes["throughput_rps"] < -threshold)
+            or new["errors"] > old["errors"]
+        )
+        rows.append({"name": name, "before": old, "after": new, "changes": changes, "regressed": regressed})
+    return rows
+
+
+def _format_change(change: Optional[float]) -> str:
+    return "n/a" if change is None else f"{change:+.1%}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("before", type=Path)
+    parser.add_argument("after", type=Path)
+    parser.add_argument("--threshold", type=float, default=0.10)
+    parser.add_argument("--fail", action="store_true", help="exit with status 1 if anything regressed")
+    args = parser.parse_args()
+
+    before = json.loads(args.before.read_text())
+    after = json.loads(args.after.read_text())
+    if before.get("suite") != after.get("suite"):
+        sys.exit(f"Cannot compare a {before.get('suite')!r} run with a {after.get('suite')!r} run")
+
+    rows = compare_results(before["results"], after["results"], args.threshold)
+    print(f"{before['meta'].get('commit')} -> {after['meta'].get('commit')} ({before['suite']}, {after['meta'].get('users')} users)")
+    width = max((len(row["name"]) for row in rows), default=4)
+    print(f"{'case':<{width}}  {'p50':>8}  {'p95':>8}  {'p99':>8}  {'rps':>8}")
+    for row in rows:
+        changes = row["changes"]
+        print(
+            f"{row['name']:<{width}}  {_format_change(changes['p50_ms']):>8}  {_format_change(changes['p95_ms']):>8}"
+            f"  {_format_change(changes['p99_ms']):>8}  {_format_change(changes['throughput_rps']):>8}"
+            + ("  REGRESSED" if row["regressed"] else "")
+        )
+
+    regressed = [row["name"] for row in rows if row["regressed"]]
+    if regressed:
+        print(f"\n{len(regressed)} regression(s) above {args.threshold:.0%}: {', '.join(regressed)}")
+        if args.fail:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
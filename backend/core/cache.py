@@ -0,0 +1,306 @@
+"""
+Response cache for the read endpoints.
+
+Entries are tagged (e.g. "user:<id>", "stats") and every tag has a version
+counter. The version of each tag is folded into the storage key, so
+invalidating a tag is a single counter bump that makes every entry carrying
+it unreachable, whatever query parameters were used to build it. Stale
+entries then age out through the TTL or the LRU bound.
+
+Misses are coalesced (CACHE_COALESCE): concurrent requests for the same
+versioned key share one load, see core.singleflight.
+
+With read replicas, an entry may have been loaded from a replica that has
+not caught up with the latest write. Clients whose reads are pinned to the
+primary after writing (db.replicas) therefore skip the lookup: they load
+from the primary and refill the entry.
+"""
+import copy
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+from uuid import UUID
+
+from fastapi import Request
+
+import db.database as database
+from core.config import settings
+from core.singleflight import SingleFlight
+
+USERS_TAG = "users"
+STATS_TAG = "stats"
+# Carried by every cached neighbor list. A change to a user with many
+# connections bumps it once instead of the tag of every neighbor.
+CONNECTIONS_TAG = "connections"
+
+_MISSING = object()
+# Distinguishes this process's in-memory tag versions from those of other
+# processes and of earlier runs, which restart from 0
+_PROCESS_EPOCH = uuid.uuid4().hex
+
+
+def user_tag(user_id: UUID) -> str:
+    """Profile and neighbor list of one user."""
+    return f"user:{user_id}"
+
+def possible_tag(user_id: UUID) -> str:
+    """Possible-connections lists of one user."""
+    return f"possible:{user_id}"
+
+
+class LRUCache:
+    """
+    In-process cache bounded by entry count, with a TTL per entry.
+    Tag versions are kept apart from the entries so they are never evicted.
+    """
+    # Versions only count writes made through this process
+    shared = False
+
+    def __init__(self, max_entries: int = 10_000, ttl: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return _MISSING
+            expires_at, value = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return _MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (self._clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def versions(self, tags: Iterable[str]) -> Tuple[int, ...]:
+        with self._lock:
+            return tuple(self._versions.get(tag, 0) for tag in tags)
+
+    def bump(self, tags: Iterable[str]) -> None:
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SharedCache:
+    """
+    Cache stored in a Redis-compatible server so every worker shares entries
+    and tag versions. `client` only needs get, set(ex=), mget and
+    pipeline() (with incr and execute). Values are stored as JSON.
+    """
+    shared = True
+
+    def __init__(self, client, ttl: float = 30.0, prefix: str = "rf:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        # Capacity is enforced by the server, which does not report it back
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Any:
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            self.misses += 1
+            return _MISSING
+        self.hits += 1
+        return json.loads(raw)
+
+    def set(self, key: str, value: Any) -> None:
+        self.client.set(self.prefix + key, json.dumps(value), ex=max(1, int(self.ttl)))
+
+    def versions(self, tags: Iterable[str]) -> Tuple[int, ...]:
+        tags = list(tags)
+        if not tags:
+            return ()
+        raw = self.client.mget([f"{self.prefix}v:{tag}" for tag in tags])
+        return tuple(int(value) if value is not None else 0 for value in raw)
+
+    def bump(self, tags: Iterable[str]) -> None:
+        # One round trip however many tags a write touches
+        pipeline = self.client.pipeline(transaction=False)
+        for tag in tags:
+            pipeline.incr(f"{self.prefix}v:{tag}")
+        pipeline.execute()
+
+    def clear(self) -> None:
+        # Entries expire on their own; nothing to drop locally
+        pass
+
+    def __len__(self) -> int:
+        return 0
+
+
+class NullCache(LRUCache):
+    """Stores nothing; used when caching is disabled."""
+
+    def __init__(self):
+        super().__init__(max_entries=0, ttl=0)
+
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+
+class ResponseCache:
+    """
+    Front end used by routes and CRUD write functions. Routes call
+    get_or_load with the tags an entry depends on; writes call invalidate
+    with the tags they affect.
+    """
+
+    def __init__(self, backend, flight: Optional[SingleFlight] = None, etag_window: float = settings.cache_ttl_seconds):
+        self.backend = backend
+        self.flight = flight
+        self.etag_window = etag_window
+        self.invalidations = 0
+        # Set on the views returned by fresh()
+        self.skip_lookup = False
+
+    def fresh(self) -> "ResponseCache":
+        """
+        View of this cache that always calls the loader, neither reading
+        entries nor joining a load in flight, and stores what it loads.
+        """
+        view = copy.copy(self)
+        view.skip_lookup = True
+        return view
+
+    def _versioned_key(self, key: str, tags: Tuple[str, ...]) -> str:
+        versions = self.backend.versions(tags)
+        return key + "@" + ".".join(str(version) for version in versions)
+
+    def get_or_load(self, key: str, tags: Iterable[str], loader: Callable[[], Any]) -> Any:
+        """
+        Returns the cached value for `key`, or calls `loader` and caches its
+        result. None results are not cached so missing rows are re-checked.
+        Concurrent misses share one loader call; since the flight is keyed
+        by the versioned key, a request arriving after an invalidation
+        starts a new load instead of joining one that may predate the write.
+        """
+        storage_key = self._versioned_key(key, tuple(tags))
+        value = _MISSING if self.skip_lookup else self.backend.get(storage_key)
+        if value is not _MISSING:
+            return value
+
+        def load():
+            value = loader()
+            if value is not None:
+                self.backend.set(storage_key, value)
+            return value
+
+        if self.flight is None or self.skip_lookup:
+            return load()
+        return self.flight.do(storage_key, load, metric_key=key)
+
+    async def aget_or_load(self, key: str, tags: Iterable[str], loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Same as get_or_load for coroutine loaders."""
+        storage_key = self._versioned_key(key, tuple(tags))
+        value = _MISSING if self.skip_lookup else self.backend.get(storage_key)
+        if value is not _MISSING:
+            return value
+
+        async def load():
+            value = await loader()
+            if value is not None:
+                self.backend.set(storage_key, value)
+            return value
+
+        if self.flight is None or self.skip_lookup:
+            return await load()
+        return await self.flight.ado(storage_key, load, metric_key=key)
+
+    def etag(self, key: str, tags: Iterable[str], clock: Callable[[], float] = time.time) -> str:
+        """
+        Weak validator for the response stored under `key`, built from the
+        versions of its tags only, so a conditional request is answered
+        without running the query. With an in-process backend the versions
+        miss writes made by other workers; the validator then also changes
+        every `etag_window` seconds, the staleness the cache itself allows.
+        """
+        parts = [key, *map(str, self.backend.versions(tuple(tags)))]
+        if not self.backend.shared:
+            parts += [_PROCESS_EPOCH, str(int(clock() // max(self.etag_window, 1)))]
+        digest = hashlib.blake2b("\0".join(parts).encode(), digest_size=8).hexdigest()
+        return f'W/"{digest}"'
+
+    def invalidate(self, *tags: str) -> None:
+        tags = set(tags)
+        self.backend.bump(tags)
+        self.invalidations += len(tags)
+
+    def metrics(self) -> Dict[str, Any]:
+        flight = self.flight.metrics() if self.flight is not None else {"loads": 0, "coalesced": 0, "coalesced_by_key": {}}
+        return {
+            "hits": self.backend.hits,
+            "misses": self.backend.misses,
+            "evictions": self.backend.evictions,
+            "expirations": self.backend.expirations,
+            "invalidations": self.invalidations,
+            "entries": len(self.backend),
+            **flight,
+        }
+
+
+def build_cache(backend: str = settings.cache_backend) -> ResponseCache:
+    # Coalescing also applies without a cache: it saves the duplicate loads
+    flight = SingleFlight() if settings.cache_coalesce else None
+    if backend == "none":
+        return ResponseCache(NullCache(), flight)
+    if backend == "redis":
+        # Optional dependency, only needed for the shared backend
+        import redis
+        client = redis.Redis.from_url(settings.cache_url or "redis://localhost:6379/0")
+        return ResponseCache(SharedCache(client, ttl=settings.cache_ttl_seconds), flight)
+    return ResponseCache(LRUCache(max_entries=settings.cache_max_entries, ttl=settings.cache_ttl_seconds), flight)
+
+
+cache = build_cache()
+
+
+def get_cache(request: Request) -> ResponseCache:
+    """
+    FastAPI dependency returning the process-wide cache, or its fresh() view
+    for clients whose reads are pinned to the primary.
+    """
+    if database.router.pins(request.cookies.get(database.PIN_COOKIE)):
+        return cache.fresh()
+    return cache
+
+def configure_cache(new_cache: ResponseCache) -> ResponseCache:
+    """Swaps the process-wide cache (used by tests). Returns the previous one."""
+    global cache
+    previous, cache = cache, new_cache
+    return previous
@@ -0,0 +1,36 @@
+"""
+Conditional GET support for the polled read endpoints.
+
+Routes compute an ETag with ResponseCache.etag before doing any work. When
+the request's If-None-Match already holds it, they answer 304 Not Modified
+without touching the database; otherwise they send the body with the ETag.
+`Cache-Control: no-cache` lets browsers keep the body but revalidate on
+every request, so the frontend's polling gets 304s without code changes.
+"""
+from typing import Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+
+def validator_headers(etag: str) -> Dict[str, str]:
+    return {"ETag": etag, "Cache-Control": "no-cache"}
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison (RFC 9110, 13.1.2) against an If-None-Match value."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if (candidate[2:] if candidate.startswith("W/") else candidate) == opaque:
+            return True
+    return False
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """A 304 response when the client already has `etag`, else None."""
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=validator_headers(etag))
+    return None
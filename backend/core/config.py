@@ -0,0 +1,161 @@
+import os
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+
+def _env_str(name: str, default: Optional[str]) -> Optional[str]:
+    value = os.environ.get(name)
+    return value if value not in (None, "") else default
+
+def _env_int(name: str, default: int) -> int:
+    value = os.environ.get(name)
+    return int(value) if value not in (None, "") else default
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.environ.get(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+def _env_list(name: str, default: Tuple[str, ...]) -> Tuple[str, ...]:
+    value = os.environ.get(name)
+    if value in (None, ""):
+        return default
+    return tuple(item.strip() for item in value.split(",") if item.strip())
+
+def _env_float(name: str, default: float) -> float:
+    value = os.environ.get(name)
+    return float(value) if value not in (None, "") else default
+
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    Runtime configuration, read once from environment variables.
+    """
+    # Response cache: "memory" (in-process LRU), "redis" (shared) or "none"
+    cache_backend: str = "memory"
+    cache_url: Optional[str] = None
+    cache_max_entries: int = 10_000
+    cache_ttl_seconds: float = 30.0
+    # Writes touching users with more connections than this invalidate the
+    # coarse tags (every neighbor or possible-connections list) instead of
+    # one tag per neighbor
+    cache_fanout_limit: int = 100
+    # Concurrent cache misses on the same key share one load (core.singleflight)
+    cache_coalesce: bool = True
+    # Database engine
+    database_url: str = "sqlite:///./database.db"
+    # Defaults to database_url with the matching async driver
+    async_database_url: Optional[str] = None
+    # Read replicas for the routes that only read (db.replicas): health
+    # check interval, and how long a client's reads stay on the primary
+    # after it wrote
+    database_replica_urls: Tuple[str, ...] = ()
+    replica_check_interval_seconds: float = 5.0
+    read_your_writes_seconds: float = 5.0
+    # Serve the hot routes with async def handlers on an AsyncEngine
+    db_async: bool = False
+    # Connection pool. pool_size + max_overflow matches AnyIO's default of 40
+    # worker threads so sync routes never queue on the pool behind each other
+    db_pool_size: int = 20
+    db_max_overflow: int = 20
+    db_pool_timeout: float = 30.0
+    db_pool_pre_ping: bool = True
+    db_pool_recycle: int = 1800
+    # Enforced server-side on PostgreSQL; SQLite has no equivalent
+    db_statement_timeout_ms: int = 30_000
+    # SQLite connect-time pragmas
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    # Negative values are KiB, as in PRAGMA cache_size
+    sqlite_cache_size: int = -64_000
+    sqlite_busy_timeout_ms: int = 5_000
+    # SQLite only enforces foreign keys (and ON DELETE CASCADE) when asked to
+    sqlite_foreign_keys: bool = True
+    # Request/SQL instrumentation and the /metrics endpoint
+    metrics_enabled: bool = True
+    slow_query_ms: float = 100.0
+    slow_query_samples: int = 100
+    # Allow per-request cProfile reports through the X-Profile header
+    profiling_enabled: bool = False
+    # In-process copy of the graph for neighbor and mutual-friend queries
+    # (core.graph_store); per process, so single-worker deployments only
+    graph_store_enabled: bool = False
+    graph_store_chunk_size: int = 50_000
+    # Run db.migrations in the lifespan hook
+    migrate_on_startup: bool = True
+    # Write-behind mode for connection writes (core.write_queue): requests are
+    # journaled and acknowledged with 202, then applied in batches
+    write_behind_enabled: bool = False
+    write_behind_batch_size: int = 500
+    write_behind_flush_ms: float = 5.0
+    # Gzip response bodies of at least this many bytes (for clients that accept it)
+    gzip_enabled: bool = True
+    gzip_minimum_size: int = 1000
+    # Bulk exports (routes.export): rows per round trip, and how many may run
+    # at once before further requests get 429
+    export_chunk_size: int = 5000
+    export_max_concurrent: int = 2
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        return cls(
+            cache_backend=_env_str("CACHE_BACKEND", cls.cache_backend),
+            cache_url=_env_str("CACHE_URL", cls.cache_url),
+            cache_max_entries=_env_int("CACHE_MAX_ENTRIES", cls.cache_max_entries),
+            cache_ttl_seconds=_env_float("CACHE_TTL_SECONDS", cls.cache_ttl_seconds),
+            cache_fanout_limit=_env_int("CACHE_FANOUT_LIMIT", cls.cache_fanout_limit),
+            cache_coalesce=_env_bool("CACHE_COALESCE", cls.cache_coalesce),
+            database_url=_env_str("DATABASE_URL", cls.database_url),
+            async_database_url=_env_str("ASYNC_DATABASE_URL", cls.async_database_url),
+            database_replica_urls=_env_list("DATABASE_REPLICA_URLS", cls.database_replica_urls),
+            replica_check_interval_seconds=_env_float("REPLICA_CHECK_INTERVAL_SECONDS", cls.replica_check_interval_seconds),
+            read_your_writes_seconds=_env_float("READ_YOUR_WRITES_SECONDS", cls.read_your_writes_seconds),
+            db_async=_env_bool("DB_ASYNC", cls.db_async),
+            db_pool_size=_env_int("DB_POOL_SIZE", cls.db_pool_size),
+            db_max_overflow=_env_int("DB_MAX_OVERFLOW", cls.db_max_overflow),
+            db_pool_timeout=_env_float("DB_POOL_TIMEOUT", cls.db_pool_timeout),
+            db_pool_pre_ping=_env_bool("DB_POOL_PRE_PING", cls.db_pool_pre_ping),
+            db_pool_recycle=_env_int("DB_POOL_RECYCLE", cls.db_pool_recycle),
+            db_statement_timeout_ms=_env_int("DB_STATEMENT_TIMEOUT_MS", cls.db_statement_timeout_ms),
+            sqlite_journal_mode=_env_str("SQLITE_JOURNAL_MODE", cls.sqlite_journal_mode),
+            sqlite_synchronous=_env_str("SQLITE_SYNCHRONOUS", cls.sqlite_synchronous),
+            sqlite_mmap_size=_env_int("SQLITE_MMAP_SIZE", cls.sqlite_mmap_size),
+            sqlite_cache_size=_env_int("SQLITE_CACHE_SIZE", cls.sqlite_cache_size),
+            sqlite_busy_timeout_ms=_env_int("SQLITE_BUSY_TIMEOUT_MS", cls.sqlite_busy_timeout_ms),
+            sqlite_foreign_keys=_env_bool("SQLITE_FOREIGN_KEYS", cls.sqlite_foreign_keys),
+            metrics_enabled=_env_bool("METRICS_ENABLED", cls.metrics_enabled),
+            slow_query_ms=_env_float("SLOW_QUERY_MS", cls.slow_query_ms),
+            slow_query_samples=_env_int("SLOW_QUERY_SAMPLES", cls.slow_query_samples),
+            profiling_enabled=_env_bool("PROFILING_ENABLED", cls.profiling_enabled),
+            graph_store_enabled=_env_bool("GRAPH_STORE_ENABLED", cls.graph_store_enabled),
+            graph_store_chunk_size=_env_int("GRAPH_STORE_CHUNK_SIZE", cls.graph_store_chunk_size),
+            migrate_on_startup=_env_bool("MIGRATE_ON_STARTUP", cls.migrate_on_startup),
+            write_behind_enabled=_env_bool("WRITE_BEHIND_ENABLED", cls.write_behind_enabled),
+            write_behind_batch_size=_env_int("WRITE_BEHIND_BATCH_SIZE", cls.write_behind_batch_size),
+            write_behind_flush_ms=_env_float("WRITE_BEHIND_FLUSH_MS", cls.write_behind_flush_ms),
+            gzip_enabled=_env_bool("GZIP_ENABLED", cls.gzip_enabled),
+            gzip_minimum_size=_env_int("GZIP_MINIMUM_SIZE", cls.gzip_minimum_size),
+            export_chunk_size=_env_int("EXPORT_CHUNK_SIZE", cls.export_chunk_size),
+            export_max_concurrent=_env_int("EXPORT_MAX_CONCURRENT", cls.export_max_concurrent),
+        )
+
+    def resolved_async_database_url(self) -> str:
+        if self.async_database_url:
+            return self.async_database_url
+        for sync_prefix, async_prefix in _ASYNC_DRIVERS:
+            if self.database_url.startswith(sync_prefix):
+                return async_prefix + self.database_url[len(sync_prefix):]
+        return self.database_url
+
+
+_ASYNC_DRIVERS = (
+    ("sqlite://", "sqlite+aiosqlite://"),
+    ("postgresql://", "postgresql+asyncpg://"),
+    ("postgresql+psycopg2://", "postgresql+asyncpg://"),
+)
+
+
+settings = Settings.from_env()
@@ -0,0 +1,128 @@
+"""
+Encodings for the bulk exports (routes.export): CSV, and a binary edge list
+graph tools can memory-map.
+
+The edge list, all integers little-endian:
+
+    ids     node_count x 16 bytes   user ids (UUID bytes) in ascending order;
+                                    a user's index is its position here
+    pairs   edge_count x 8 bytes    one (int32, int32) pair of user indexes
+                                    per connection, requester first, sorted by
+                                    (requester, other) index
+    footer  32 bytes                EDGE_LIST_MAGIC, version (uint32),
+                                    reserved (uint32), node_count (uint64),
+                                    edge_count (uint64)
+
+The counts are only known once the scan is over, so they sit in a footer,
+found from the end of the file. The pairs start at 16 * node_count, which
+keeps them aligned. With numpy:
+
+    pairs = numpy.memmap(path, dtype="<i4", mode="r", offset=16 * node_count, shape=(edge_count, 2))
+
+`read_edge_list` does the same with the standard library.
+"""
+import csv
+import io
+import struct
+import sys
+from array import array
+from typing import Iterable, NamedTuple, Sequence
+from uuid import UUID
+
+from core.serialization import format_datetime
+
+EDGE_LIST_MAGIC = b"EDGELIST"
+EDGE_LIST_VERSION = 1
+EDGE_LIST_MEDIA_TYPE = "application/octet-stream"
+CSV_MEDIA_TYPE = "text/csv; charset=utf-8"
+_FOOTER = struct.Struct("<8sIIQQ")
+_ID_SIZE = 16
+_PAIR_SIZE = 8
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, UUID):
+        return str(value)
+    if hasattr(value, "isoformat"):
+        return format_datetime(value)
+    return value
+
+
+def csv_lines(rows: Iterable[Sequence], header: Sequence[str] = ()) -> bytes:
+    """
+    Encodes rows as CSV (RFC 4180), ids and datetimes formatted as in the
+    JSON responses and None as an empty field. One call per chunk of rows.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(header)
+    writer.writerows([_csv_value(value) for value in row] for row in rows)
+    return buffer.getvalue().encode()
+
+
+class EdgeListEncoder:
+    """
+    Turns the rows of export_crud.edge_list_statement into the edge list,
+    chunk by chunk: `encode` for each chunk of rows, `footer` once at the end.
+    """
+    def __init__(self):
+        self.node_count = 0
+        self.edge_count = 0
+
+    def encode(self, rows: Iterable[Sequence]) -> bytes:
+        ids = bytearray()
+        pairs = array("i")
+        for is_edge, user_id, a, b in rows:
+            if not is_edge:
+                # The statement orders the users first, by index; a mismatch
+                # is a bug, better an error than a wrong file
+                if self.edge_count or a != self.node_count:
+                    raise RuntimeError("Users out of order in the edge list scan.")
+                ids += user_id.bytes
+                self.node_count += 1
+            else:
+                pairs.append(a)
+                pairs.append(b)
+                self.edge_count += 1
+        if sys.byteorder != "little":
+            pairs.byteswap()
+        return bytes(ids) + pairs.tobytes()
+
+    def footer(self) -> bytes:
+        return _FOOTER.pack(EDGE_LIST_MAGIC, EDGE_LIST_VERSION, 0, self.node_count, self.edge_count)
+
+
+class EdgeList(NamedTuple):
+    node_count: int
+    edge_count: int
+    # node_count * 16 bytes of user ids
+    ids: memoryview
+    # 2 * edge_count int32 user indexes: source of edge i at 2i, target at 2i + 1
+    pairs: memoryview
+
+    def user_id(self, index: int) -> UUID:
+        return UUID(bytes=bytes(self.ids[index * _ID_SIZE:(index + 1) * _ID_SIZE]))
+
+
+def read_edge_list(buffer) -> EdgeList:
+    """
+    Views over an edge list held in `buffer` (bytes, or an mmap.mmap of the
+    file), without copying it. The pairs are read in the machine's byte
+    order, which is the file's on little-endian machines.
+    """
+    if len(buffer) < _FOOTER.size:
+        raise ValueError("Not an edge list: too short.")
+    magic, version, _, node_count, edge_count = _FOOTER.unpack_from(buffer, len(buffer) - _FOOTER.size)
+    if magic != EDGE_LIST_MAGIC:
+        raise ValueError("Not an edge list: bad magic.")
+    if version != EDGE_LIST_VERSION:
+        raise ValueError(f"Unsupported edge list version {version}.")
+    pairs_start = node_count * _ID_SIZE
+    pairs_end = pairs_start + edge_count * _PAIR_SIZE
+    if pairs_end + _FOOTER.size != len(buffer):
+        raise ValueError("Edge list size does not match its footer.")
+    view = memoryview(buffer)
+    return EdgeList(node_count, edge_count, view[:pairs_start], view[pairs_start:pairs_end].cast("i"))
@@ -0,0 +1,299 @@
+"""
+Optional in-process copy of the social graph (GRAPH_STORE_ENABLED).
+
+Every user with connections gets a dense integer id, and their neighbors
+are kept as a sorted array('I') of those ids: 4 bytes per direction of an
+edge plus a fixed overhead per user. Neighbor, membership, degree and
+mutual-friend queries are then answered from memory. The store is loaded
+from user_adjacency at startup, streamed in chunks. After that, the CRUD
+write paths keep it current by publishing the edges every committed write
+touched (sync_edges); the store re-reads them from the database rather
+than trusting the order in which racing writers publish.
+
+Queries return None while the store is not loaded, and callers fall back
+to SQL. The copy is per process: it only sees writes made through this
+process, so it is meant for single-worker deployments.
+"""
+import heapq
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import String, select, tuple_, type_coerce
+from sqlalchemy.orm import Session
+
+import models.models as models
+from core.config import settings
+
+
+class GraphStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Orders the publishers in sync_edges among themselves, without
+        # holding up the readers, which only take _lock
+        self._sync_lock = threading.Lock()
+        self._index: Dict[UUID, int] = {}
+        self._ids: List[Optional[UUID]] = []
+        self._neighbors: List[array] = []
+        self.edge_count = 0
+        self.ready = False
+        self.load_seconds: Optional[float] = None
+
+    def _node(self, user_id: UUID) -> int:
+        # Callers hold the lock
+        node = self._index.get(user_id)
+        if node is None:
+            node = self._index[user_id] = len(self._ids)
+            self._ids.append(user_id)
+            self._neighbors.append(array("I"))
+        return node
+
+    def load(self, db: Session, chunk_size: int = 50_000) -> None:
+        """
+        (Re)builds the store from user_adjacency, `chunk_size` rows at a
+        time. Writes published meanwhile wait for the load to finish.
+        """
+        started = time.perf_counter()
+        adjacency = models.UserAdjacency
+        # Ids are read as the driver returns them, 16 bytes on SQLite and
+        # text on PostgreSQL (no per-row UUID conversion, which would
+        # dominate the load), and turned into a UUID once per user
+        raw_nodes: Dict[object, int] = {}
+
+        def node(raw) -> int:
+            found = raw_nodes.get(raw)
+            if found is None:
+                found = raw_nodes[raw] = self._node(UUID(bytes=raw) if isinstance(raw, bytes) else UUID(str(raw)))
+            return found
+
+        with self._lock:
+            self.ready = False
+            self._index, self._ids, self._neighbors = {}, [], []
+            result = db.connection().execute(
+                select(type_coerce(adjacency.user_id, String), type_coerce(adjacency.neighbor_id, String))
+                .execution_options(yield_per=chunk_size)
+            )
+            neighbors = self._neighbors
+            for rows in result.partitions():
+                for user_id, neighbor_id in rows:
+                    neighbors[node(user_id)].append(node(neighbor_id))
+            self._neighbors = [array("I", sorted(ids)) for ids in neighbors]
+            self.edge_count = sum(len(ids) for ids in self._neighbors) // 2
+            self.ready = True
+        self.load_seconds = time.perf_counter() - started
+
+    # Change feed, called by the CRUD layer after committing
+
+    def sync_edges(self, db: Session, pairs: Iterable[Tuple[UUID, UUID]], chunk_size: int = 500) -> None:
+        """
+        Makes the store agree with the database on the given edges. Two
+        writers racing on the same edge (a create and a delete) can publish
+        in the opposite order to their commits; applying "add" and "remove"
+        as told would then leave the store wrong until the next load.
+        Instead, whoever publishes reads the edges' committed state, and
+        publishers take turns (_sync_lock), so the last one to publish always
+        sees the last commit. The commit and the read happen outside the
+        lock the readers take, which is only held to apply the result, so a
+        slow or locked database never stalls graph reads. Call it right after
+        committing, before the session reads anything else.
+        """
+        pairs = list(pairs)
+        adjacency = models.UserAdjacency
+        if not self.ready or not pairs:
+            return
+        with self._sync_lock:
+            # The read has to start a new transaction now, in this
+            # publisher's turn, not reuse a snapshot taken before another
+            # writer committed
+            if db.in_transaction():
+                db.commit()
+            present = set()
+            for start in range(0, len(pairs), chunk_size):
+                chunk = pairs[start:start + chunk_size]
+                present.update(
+                    (row.user_id, row.neighbor_id) for row in db.execute(
+                        select(adjacency.user_id, adjacency.neighbor_id)
+                        .where(tuple_(adjacency.user_id, adjacency.neighbor_id).in_(chunk))
+                    )
+                )
+            with self._lock:
+                if not self.ready:
+                    return
+                self._apply(
+                    [pair for pair in pairs if pair in present],
+                    [pair for pair in pairs if pair not in present],
+                )
+
+    def _apply(self, added: List[Tuple[UUID, UUID]], removed: List[Tuple[UUID, UUID]]) -> None:
+        # Callers hold the lock. Both directions are updated together and
+        # every change is idempotent.
+        for user_id_1, user_id_2 in added:
+            node_1, node_2 = self._node(user_id_1), self._node(user_id_2)
+            if _insert(self._neighbors[node_1], node_2):
+                _insert(self._neighbors[node_2], node_1)
+                self.edge_count += 1
+        for user_id_1, user_id_2 in removed:
+            node_1, node_2 = self._index.get(user_id_1), self._index.get(user_id_2)
+            if node_1 is not None and node_2 is not None and _remove(self._neighbors[node_1], node_2):
+                _remove(self._neighbors[node_2], node_1)
+                self.edge_count -= 1
+
+    def add_edges(self, pairs: Iterable[Tuple[UUID, UUID]]) -> None:
+        with self._lock:
+            if not self.ready:
+                return
+            self._apply(list(pairs), [])
+
+    def remove_edges(self, pairs: Iterable[Tuple[UUID, UUID]]) -> None:
+        with self._lock:
+            if not self.ready:
+                return
+            self._apply([], list(pairs))
+
+    def remove_user(self, user_id: UUID) -> None:
+        with self._lock:
+            if not self.ready:
+                return
+            node = self._index.pop(user_id, None)
+            if node is None:
+                return
+            for neighbor in self._neighbors[node]:
+                _remove(self._neighbors[neighbor], node)
+            self.edge_count -= len(self._neighbors[node])
+            # The slot is not reused; ids are never handed out twice
+            self._ids[node] = None
+            self._neighbors[node] = array("I")
+
+    # Queries
+
+    def neighbor_ids(self, user_id: UUID) -> Optional[List[UUID]]:
+        if not self.ready:
+            return None
+        with self._lock:
+            node = self._index.get(user_id)
+            if node is None:
+                return []
+            ids = self._ids
+            return [ids[neighbor] for neighbor in self._neighbors[node]]
+
+    def is_connected(self, user_id_1: UUID, user_id_2: UUID) -> Optional[bool]:
+        if not self.ready:
+            return None
+        with self._lock:
+            node_1, node_2 = self._index.get(user_id_1), self._index.get(user_id_2)
+            if node_1 is None or node_2 is None:
+                return False
+            return _contains(self._neighbors[node_1], node_2)
+
+    def degree(self, user_id: UUID) -> Optional[int]:
+        if not self.ready:
+            return None
+        with self._lock:
+            node = self._index.get(user_id)
+            return 0 if node is None else len(self._neighbors[node])
+
+    def mutual_ids(self, user_id_1: UUID, user_id_2: UUID) -> Optional[List[UUID]]:
+        """
+        Connections the two users have in common, ordered by id.
+        """
+        if not self.ready:
+            return None
+        with self._lock:
+            node_1, node_2 = self._index.get(user_id_1), self._index.get(user_id_2)
+            if node_1 is None or node_2 is None:
+                return []
+            smaller, larger = sorted((self._neighbors[node_1], self._neighbors[node_2]), key=len)
+            common = [self._ids[node] for node in smaller if _contains(larger, node)]
+        return sorted(common)
+
+    def top_candidates(self, user_id: UUID, count: int) -> Optional[List[Tuple[UUID, int]]]:
+        """
+        The first `count` users the given user is not connected with but
+        shares connections with, as (user id, mutual connections), most
+        mutual connections first and ties by id, like
+        user_crud.get_possible_users_to_connect. Users without mutual
+        connections are not included.
+        """
+        if not self.ready:
+            return None
+        with self._lock:
+            node = self._index.get(user_id)
+            if node is None:
+                return []
+            own = self._neighbors[node]
+            counts: Dict[int, int] = {}
+            for neighbor in own:
+                for candidate in self._neighbors[neighbor]:
+                    counts[candidate] = counts.get(candidate, 0) + 1
+            counts.pop(node, None)
+            for neighbor in own:
+                counts.pop(neighbor, None)
+            ids = self._ids
+            best = heapq.nsmallest(count, counts.items(), key=lambda item: (-item[1], ids[item[0]]))
+            return [(ids[candidate], mutual) for candidate, mutual in best]
+
+    def memory_usage(self) -> dict:
+        """
+        Approximate bytes held by the store (arrays, id maps and the UUIDs
+        themselves), for sizing the process.
+        """
+        with self._lock:
+            users = len(self._index)
+            arrays = sys.getsizeof(self._neighbors) + sum(sys.getsizeof(neighbors) for neighbors in self._neighbors)
+            ids = sys.getsizeof(self._ids) + sys.getsizeof(self._index) + sum(
+                sys.getsizeof(user_id) + sys.getsizeof(user_id.int) for user_id in self._ids if user_id is not None
+            )
+            # Dense ids above 256 are separate int objects
+            ids += max(users - 257, 0) * sys.getsizeof(257)
+            total = arrays + ids
+            return {
+                "ready": self.ready,
+                "users": users,
+                "edges": self.edge_count,
+                "memory_bytes": total,
+                "bytes_per_edge": round(total / self.edge_count, 1) if self.edge_count else 0.0,
+                "load_seconds": round(self.load_seconds, 3) if self.load_seconds is not None else None,
+            }
+
+
+def _contains(neighbors: array, node: int) -> bool:
+    position = bisect_left(neighbors, node)
+    return position < len(neighbors) and neighbors[position] == node
+
+def _insert(neighbors: array, node: int) -> bool:
+    position = bisect_left(neighbors, node)
+    if position < len(neighbors) and neighbors[position] == node:
+        return False
+    neighbors.insert(position, node)
+    return True
+
+def _remove(neighbors: array, node: int) -> bool:
+    position = bisect_left(neighbors, node)
+    if position < len(neighbors) and neighbors[position] == node:
+        del neighbors[position]
+        return True
+    return False
+
+
+store = GraphStore()
+
+
+def get_graph_store() -> GraphStore:
+    """FastAPI dependency returning the process-wide graph store."""
+    return store
+
+def configure_graph_store(new_store: GraphStore) -> GraphStore:
+    """Swaps the process-wide graph store (used by tests). Returns the previous one."""
+    global store
+    previous, store = store, new_store
+    return previous
+
+def load_graph_store(session_factory) -> None:
+    """Loads the process-wide store if GRAPH_STORE_ENABLED is set."""
+    if settings.graph_store_enabled:
+        with session_factory() as db:
+            store.load(db, settings.graph_store_chunk_size)
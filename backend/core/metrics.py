@@ -0,0 +1,302 @@
+"""
+Request and SQL instrumentation.
+
+MetricsMiddleware times every HTTP request and attaches a RequestStats to
+the request's context. The SQLAlchemy cursor hooks installed by
+instrument_engine add every statement to it, so each request knows how many
+queries it ran and how long they took. The aggregates are rendered in the
+Prometheus text format for /metrics.
+
+Profiling is opt-in (PROFILING_ENABLED): a request sent with an
+`X-Profile` header gets a cProfile report of its endpoint instead of the
+normal response body. The header value picks the pstats sort order
+(`cumulative` by default, or e.g. `tottime`).
+"""
+import cProfile
+import inspect
+import io
+import pstats
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextvars import ContextVar
+from functools import wraps
+from typing import Dict, List, Optional, Tuple
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+
+from core.config import settings
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+# Longest statement text kept in a slow query sample
+MAX_SAMPLE_SQL_LENGTH = 2000
+# Lines of the pstats report returned for a profiled request
+PROFILE_REPORT_LINES = 40
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.sum += value
+        self.count += 1
+        index = bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        total, result = 0, []
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class RequestStats:
+    """
+    Statements run on behalf of one request.
+    """
+    __slots__ = ("queries", "query_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+
+
+class Metrics:
+    """
+    Process-wide aggregates. Updated from the event loop (requests) and from
+    worker threads (statements), hence the lock.
+    """
+    def __init__(self, slow_query_seconds: float = 0.1, slow_query_samples: int = 100):
+        self.slow_query_seconds = slow_query_seconds
+        self._lock = threading.Lock()
+        self._request_seconds: Dict[Tuple[str, str, str], Histogram] = {}
+        self._request_queries: Dict[Tuple[str, str], Histogram] = {}
+        self._request_query_seconds: Dict[Tuple[str, str], Histogram] = {}
+        self.queries_total = 0
+        self.query_seconds_total = 0.0
+        self.slow_queries_total = 0
+        self.slow_queries = deque(maxlen=slow_query_samples)
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float, stats: RequestStats) -> None:
+        with self._lock:
+            _histogram(self._request_seconds, (method, route, str(status)), LATENCY_BUCKETS).observe(seconds)
+            _histogram(self._request_queries, (method, route), QUERY_COUNT_BUCKETS).observe(stats.queries)
+            _histogram(self._request_query_seconds, (method, route), LATENCY_BUCKETS).observe(stats.query_seconds)
+
+    def observe_query(self, statement: str, seconds: float) -> None:
+        stats = _current_request.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.query_seconds += seconds
+        with self._lock:
+            self.queries_total += 1
+            self.query_seconds_total += seconds
+            if seconds >= self.slow_query_seconds:
+                self.slow_queries_total += 1
+                self.slow_queries.append({
+                    "sql": statement[:MAX_SAMPLE_SQL_LENGTH],
+                    "duration_ms": round(seconds * 1000, 3),
+                    "path": _current_path.get(),
+                    "at": time.time(),
+                })
+
+    def slow_query_samples(self) -> List[dict]:
+        with self._lock:
+            return list(self.slow_queries)
+
+    def render(self) -> str:
+        """
+        Renders every metric in the Prometheus text exposition format.
+        """
+        with self._lock:
+            lines = []
+            _render_histograms(lines, "http_request_duration_seconds", "Request latency by route.", ("method", "route", "status"), self._request_seconds)
+            _render_histograms(lines, "http_request_db_queries", "SQL statements run per request.", ("method", "route"), self._request_queries)
+            _render_histograms(lines, "http_request_db_seconds", "Time spent in SQL statements per request.", ("method", "route"), self._request_query_seconds)
+            _render_counter(lines, "db_queries_total", "SQL statements executed.", self.queries_total)
+            _render_counter(lines, "db_query_seconds_total", "Time spent executing SQL statements.", self.query_seconds_total)
+            _render_counter(lines, "db_slow_queries_total", f"SQL statements slower than {self.slow_query_seconds}s.", self.slow_queries_total)
+        return "\n".join(lines) + "\n"
+
+
+def _histogram(histograms: dict, labels: tuple, buckets: Tuple[float, ...]) -> Histogram:
+    histogram = histograms.get(labels)
+    if histogram is None:
+        histogram = histograms[labels] = Histogram(buckets)
+    return histogram
+
+def _format_labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _render_histograms(lines: List[str], name: str, help_text: str, label_names, histograms: dict) -> None:
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for labels, histogram in sorted(histograms.items()):
+        for bound, count in histogram.cumulative():
+            bucket_labels = _format_labels(label_names, labels, f'le="{bound}"')
+            lines.append(f"{name}_bucket{bucket_labels} {count}")
+        bucket_labels = _format_labels(label_names, labels, 'le="+Inf"')
+        lines.append(f"{name}_bucket{bucket_labels} {histogram.count}")
+        lines.append(f"{name}_sum{_format_labels(label_names, labels)} {histogram.sum}")
+        lines.append(f"{name}_count{_format_labels(label_names, labels)} {histogram.count}")
+
+def _render_counter(lines: List[str], name: str, help_text: str, value) -> None:
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} counter")
+    lines.append(f"{name} {value}")
+
+
+metrics = Metrics(settings.slow_query_ms / 1000, settings.slow_query_samples)
+
+_current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+_current_path: ContextVar[Optional[str]] = ContextVar("current_path", default=None)
+_current_profile: ContextVar[Optional[cProfile.Profile]] = ContextVar("current_profile", default=None)
+
+
+_instrumented = set()
+
+def instrument_engine(target) -> None:
+    """
+    Times every statement run through `target`, an Engine or the Engine
+    class itself (which covers every engine, including the async ones).
+    Instrumenting the same target again does nothing.
+    """
+    if target in _instrumented:
+        return
+    _instrumented.add(target)
+
+    @event.listens_for(target, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+    @event.listens_for(target, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started_at"].pop()
+        metrics.observe_query(statement, time.perf_counter() - started)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (no BaseHTTPMiddleware, so streaming responses are
+    not buffered). Records the latency and SQL statements of each request
+    under its route template and reports the latter in a Server-Timing
+    header.
+    """
+    def __init__(self, app, metrics: Metrics = metrics, profiling: bool = False):
+        self.app = app
+        self.metrics = metrics
+        self.profiling = profiling
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        request_token = _current_request.set(stats)
+        path_token = _current_path.set(scope["path"])
+        profile_sort = dict(scope["headers"]).get(b"x-profile") if self.profiling else None
+        profile = cProfile.Profile() if profile_sort is not None else None
+        profile_token = _current_profile.set(profile)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                timing = f'db;dur={stats.query_seconds * 1000:.2f};desc="{stats.queries} queries"'
+                message = {**message, "headers": [*message.get("headers", []), (b"server-timing", timing.encode())]}
+            if profile is None:
+                await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            self.metrics.observe_request(scope["method"], route, status, time.perf_counter() - started, stats)
+            _current_request.reset(request_token)
+            _current_path.reset(path_token)
+            _current_profile.reset(profile_token)
+
+        if profile is not None:
+            await _send_profile_report(send, profile, profile_sort.decode() or "cumulative", status, stats)
+
+
+async def _send_profile_report(send, profile: cProfile.Profile, sort: str, status: int, stats: RequestStats) -> None:
+    output = io.StringIO()
+    report = pstats.Stats(profile, stream=output)
+    try:
+        report.sort_stats(sort)
+    except KeyError:
+        report.sort_stats("cumulative")
+    report.print_stats(PROFILE_REPORT_LINES)
+    body = output.getvalue().encode()
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [
+            (b"content-type", b"text/plain; charset=utf-8"),
+            (b"content-length", str(len(body)).encode()),
+            (b"x-profile-status", str(status).encode()),
+            (b"x-profile-queries", str(stats.queries).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def _profiled(endpoint):
+    """
+    Wraps an endpoint so it runs under the request's profiler, if any. Sync
+    endpoints execute in a worker thread, which a profiler enabled on the
+    event loop thread would not see. For async endpoints the profile also
+    includes whatever else the event loop ran while the endpoint awaited.
+    """
+    if inspect.iscoroutinefunction(endpoint):
+        @wraps(endpoint)
+        async def async_wrapper(*args, **kwargs):
+            profile = _current_profile.get()
+            if profile is None:
+                return await endpoint(*args, **kwargs)
+            profile.enable()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                profile.disable()
+        return async_wrapper
+
+    @wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        profile = _current_profile.get()
+        if profile is None:
+            return endpoint(*args, **kwargs)
+        profile.enable()
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            profile.disable()
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    """
+    Route class for the API routers, so their endpoints can be profiled with
+    the X-Profile header.
+    """
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, _profiled(endpoint), **kwargs)
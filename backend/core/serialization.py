@@ -0,0 +1,95 @@
+"""
+Fast JSON encoding for the hot list endpoints.
+
+Those endpoints select plain column rows instead of ORM objects and turn
+them into JSON-ready dicts here. This skips the per-item validation against
+the response model that FastAPI would otherwise run. The dicts have the
+same keys, in the same order, with the same value formats as
+`schemas.User.model_dump(mode="json")`, so the encoded bodies are
+byte-for-byte what the response models produce.
+
+Bodies are encoded with orjson when it is installed, and with the stdlib
+json module otherwise.
+"""
+import json
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+from fastapi.responses import Response
+
+try:
+    # Optional dependency, several times faster than the stdlib encoder
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def format_datetime(value: Optional[datetime]) -> Optional[str]:
+    """
+    Formats a datetime the way Pydantic serializes it to JSON: ISO 8601,
+    with UTC written as "Z" and the offset truncated to minutes.
+    """
+    if value is None:
+        return None
+    text = value.isoformat()
+    offset = value.utcoffset()
+    if offset is None:
+        return text
+    if not offset:
+        return text[:-len("+00:00")] + "Z"
+    if offset % timedelta(minutes=1):
+        return text.rsplit(":", 1)[0]
+    return text
+
+
+def user_row_to_json(row) -> dict:
+    """
+    Row with id, name, email and created_at (e.g. from
+    user_crud.USER_ROW_COLUMNS) -> the JSON form of schemas.User.
+    """
+    return {
+        "name": row.name,
+        "email": row.email,
+        "id": str(row.id),
+        "created_at": format_datetime(row.created_at),
+        "last_updated_at": None,
+    }
+
+def connection_row_to_json(row) -> dict:
+    """
+    Row with user_id, connected_user_id, id and connection_made_at (e.g.
+    from export_crud.CONNECTION_ROW_COLUMNS) -> the JSON form of
+    schemas.Connection.
+    """
+    return {
+        "user_id": str(row.user_id),
+        "connected_user_id": str(row.connected_user_id),
+        "id": str(row.id),
+        "connection_made_at": format_datetime(row.connection_made_at),
+    }
+
+def possible_row_to_json(row) -> dict:
+    """
+    Same as user_row_to_json plus `mutual_count`, for
+    schemas.PossibleConnection.
+    """
+    return {**user_row_to_json(row), "mutual_connections": row.mutual_count}
+
+
+def dumps(content: Any) -> bytes:
+    """Compact JSON, non-ASCII characters left unescaped (as Pydantic does)."""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(Response):
+    """
+    JSON response for content that is already JSON-ready (e.g. the output of
+    user_row_to_json). Returned directly from an endpoint, it bypasses the
+    response model, which then only documents the shape.
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,112 @@
+"""
+Request coalescing for identical concurrent reads.
+
+When many requests miss the cache for the same key at the same moment (a
+traffic spike on /stats or on a popular user's connections), only the
+first one runs the loader; the others wait for it and receive its result,
+or its exception. Once the load finishes the key is released, so later
+requests go through the cache again. The sync path (threadpool routes) and
+the async path (event loop routes) keep separate flights.
+
+Coalescing is per process: each worker runs at most one load per key.
+"""
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Runs at most one loader per key at a time. `max_tracked_keys` bounds the
+    per-key counters; the least recently coalesced keys are dropped first.
+    """
+
+    def __init__(self, max_tracked_keys: int = 1000):
+        self.max_tracked_keys = max_tracked_keys
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._tasks: Dict[str, "asyncio.Future"] = {}
+        self.loads = 0
+        self.coalesced = 0
+        self._coalesced_by_key: "OrderedDict[str, int]" = OrderedDict()
+
+    def _record(self, metric_key: str, leader: bool) -> None:
+        # Callers hold the lock
+        if leader:
+            self.loads += 1
+            return
+        self.coalesced += 1
+        self._coalesced_by_key[metric_key] = self._coalesced_by_key.get(metric_key, 0) + 1
+        self._coalesced_by_key.move_to_end(metric_key)
+        while len(self._coalesced_by_key) > self.max_tracked_keys:
+            self._coalesced_by_key.popitem(last=False)
+
+    def do(self, key: str, loader: Callable[[], Any], metric_key: Optional[str] = None) -> Any:
+        """
+        Returns `loader()`, sharing one call among the threads asking for
+        `key` at the same time. `metric_key` (default `key`) names the key
+        in the counters.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            self._record(metric_key or key, leader)
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = loader()
+            return call.result
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def ado(self, key: str, loader: Callable[[], Awaitable[Any]], metric_key: Optional[str] = None) -> Any:
+        """
+        Same as do for coroutine loaders, on the running event loop. The
+        load runs as a task owned by the first request: cancelling that
+        request cancels the load, and the requests that were waiting on it
+        start a new one.
+        """
+        with self._lock:
+            task = self._tasks.get(key)
+            leader = task is None
+            if leader:
+                task = self._tasks[key] = asyncio.ensure_future(loader())
+                task.add_done_callback(lambda done: self._release(key, done))
+            self._record(metric_key or key, leader)
+        if leader:
+            return await task
+        try:
+            # Shielded: a waiting request that goes away leaves the load running
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.cancelled():
+                raise
+        return await self.ado(key, loader, metric_key)
+
+    def _release(self, key: str, task: "asyncio.Future") -> None:
+        with self._lock:
+            if self._tasks.get(key) is task:
+                del self._tasks[key]
+
+    def metrics(self, top: int = 20) -> Dict[str, Any]:
+        with self._lock:
+            by_key = sorted(self._coalesced_by_key.items(), key=lambda item: -item[1])[:top]
+            return {"loads": self.loads, "coalesced": self.coalesced, "coalesced_by_key": dict(by_key)}
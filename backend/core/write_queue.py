@@ -0,0 +1,172 @@
+"""
+Optional write-behind mode for connection writes (WRITE_BEHIND_ENABLED).
+
+POST /users/connect and DELETE /users/connections/{a}/{b} validate the
+request, hand the operation to this queue and answer 202 with an operation
+id. A single worker thread per process then:
+
+1. takes up to WRITE_BEHIND_BATCH_SIZE queued operations (waiting at most
+   WRITE_BEHIND_FLUSH_MS for more to arrive), records them in the
+   connection_operations journal in one transaction and only then releases
+   the waiting requests. An acknowledged operation is therefore committed;
+   it survives a crash and is applied after the restart.
+2. applies the pending journal rows, oldest first, in one transaction per
+   batch (crud.operation_crud.apply_pending_operations).
+
+Both steps cost one commit per batch instead of one per request, which is
+where the throughput comes from. Clients follow an operation through
+GET /users/connections/operations/{id}.
+"""
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Optional, Tuple
+
+import crud.operation_crud as operation_crud
+from core.config import Settings, settings
+
+# Pause before retrying after applying failed (e.g. the database is locked)
+_RETRY_SECONDS = 1.0
+
+
+class WriteQueue:
+    def __init__(self, session_factory, batch_size: int = 500, flush_interval: float = 0.005):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._condition = threading.Condition()
+        self._queued: List[Tuple[dict, Future]] = []
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self.journaled = 0
+        self.applied = 0
+        self.flushes = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """Starts the worker, which first applies what a previous run left pending."""
+        if self.running:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="write-queue", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 30.0) -> None:
+        """Journals and applies everything queued, then stops the worker."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, kind: str, user_id, connected_user_id, idempotency_key: Optional[str] = None) -> Future:
+        """
+        Queues an operation. The returned future resolves to the operation id
+        once the operation is journaled (committed), or to the journaling
+        error.
+        """
+        future: Future = Future()
+        operation = {"kind": kind, "user_id": user_id, "connected_user_id": connected_user_id, "idempotency_key": idempotency_key}
+        with self._condition:
+            if not self.running or self._stopping:
+                raise RuntimeError("The write queue is not running.")
+            self._queued.append((operation, future))
+            # Wakes the idle worker, and the lingering one once a batch is full
+            if len(self._queued) in (1, self.batch_size):
+                self._condition.notify()
+        return future
+
+    def _take_batch(self, block: bool) -> List[Tuple[dict, Future]]:
+        with self._condition:
+            while block and not self._queued and not self._stopping:
+                self._condition.wait()
+            # Give concurrent requests up to the flush interval to join the batch
+            deadline = time.monotonic() + self.flush_interval
+            while len(self._queued) < self.batch_size and not self._stopping:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._queued:
+                    break
+                self._condition.wait(remaining)
+            batch, self._queued = self._queued[:self.batch_size], self._queued[self.batch_size:]
+            return batch
+
+    def _journal(self, batch: List[Tuple[dict, Future]]) -> bool:
+        try:
+            with self.session_factory() as db:
+                ids = operation_crud.journal_operations(db, [operation for operation, _ in batch])
+        except Exception as error:
+            for _, future in batch:
+                future.set_exception(error)
+            return False
+        self.journaled += len(batch)
+        self.flushes += 1
+        for (_, future), operation_id in zip(batch, ids):
+            future.set_result(operation_id)
+        return True
+
+    def _apply(self) -> None:
+        with self.session_factory() as db:
+            while True:
+                processed = operation_crud.apply_pending_operations(db, self.batch_size)
+                self.applied += processed
+                if processed < self.batch_size:
+                    return
+
+    def _run(self) -> None:
+        # Whatever a previous run journaled but did not apply comes first
+        backlog = True
+        while True:
+            batch = self._take_batch(block=not backlog)
+            if batch and self._journal(batch):
+                backlog = True
+            if backlog:
+                try:
+                    self._apply()
+                    backlog = False
+                except Exception:
+                    # Pending operations stay in the journal until the next attempt
+                    time.sleep(_RETRY_SECONDS)
+            with self._condition:
+                if self._stopping and not self._queued and not backlog:
+                    return
+
+    def metrics(self) -> dict:
+        with self._condition:
+            queued = len(self._queued)
+        return {
+            "running": self.running,
+            "queued": queued,
+            "journaled": self.journaled,
+            "applied": self.applied,
+            "flushes": self.flushes,
+        }
+
+
+queue: Optional[WriteQueue] = None
+
+
+def get_write_queue() -> Optional[WriteQueue]:
+    """FastAPI dependency returning the process-wide queue, or None when write-behind is off."""
+    return queue
+
+def configure_write_queue(new_queue: Optional[WriteQueue]) -> Optional[WriteQueue]:
+    """Swaps the process-wide queue (used by tests). Returns the previous one."""
+    global queue
+    previous, queue = queue, new_queue
+    return previous
+
+def start_write_queue(session_factory, config: Settings = settings) -> None:
+    """Starts the process-wide queue if WRITE_BEHIND_ENABLED is set."""
+    global queue
+    if config.write_behind_enabled:
+        if queue is None:
+            queue = WriteQueue(session_factory, config.write_behind_batch_size, config.write_behind_flush_ms / 1000)
+        queue.start()
+
+def stop_write_queue() -> None:
+    if queue is not None:
+        queue.stop()
@@ -0,0 +1,16 @@
+"""
+Async counterparts of crud.statistics_crud, see crud.async_user_crud.
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, Tuple
+import crud.statistics_crud as statistics_crud
+
+
+async def get_average_connections_per_user(db: AsyncSession) -> float:
+    return await db.run_sync(statistics_crud.get_average_connections_per_user)
+
+async def get_statistics(db: AsyncSession) -> dict:
+    return await db.run_sync(statistics_crud.get_statistics)
+
+async def reconcile_statistics(db: AsyncSession) -> Dict[str, Tuple[object, object]]:
+    return await db.run_sync(statistics_crud.reconcile_statistics)
@@ -0,0 +1,71 @@
+"""
+Async counterparts of crud.user_crud for the async route path.
+
+Each function runs the sync implementation through AsyncSession.run_sync,
+so the query logic lives in one place while the database I/O goes through
+the async driver and never blocks the event loop.
+"""
+from sqlalchemy import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import AsyncIterator, List, Optional, Tuple
+from uuid import UUID
+import models.models as models
+import schemas
+import crud.user_crud as user_crud
+
+
+async def create_user(db: AsyncSession, user: schemas.UserCreate):
+    return await db.run_sync(user_crud.create_user, user)
+
+async def get_users_page(db: AsyncSession, limit: int = 100, cursor: Optional[str] = None) -> Tuple[List[models.User], Optional[str]]:
+    return await db.run_sync(user_crud.get_users_page, limit, cursor)
+
+async def get_user_rows_page(db: AsyncSession, limit: int = 100, cursor: Optional[str] = None) -> Tuple[List[Row], Optional[str]]:
+    return await db.run_sync(user_crud.get_user_rows_page, limit, cursor)
+
+async def iter_users(db: AsyncSession, chunk_size: int = 1000) -> AsyncIterator:
+    """
+    Async version of user_crud.iter_users, streaming rows from the cursor.
+    """
+    result = await db.stream(user_crud.iter_users_statement(chunk_size))
+    async for row in result:
+        yield row
+
+async def search_user_rows(db: AsyncSession, query: str, limit: int = 20, cursor: Optional[str] = None) -> Tuple[List[Row], Optional[str]]:
+    return await db.run_sync(user_crud.search_user_rows, query, limit, cursor)
+
+async def get_user_by_email(db: AsyncSession, email: str):
+    return await db.run_sync(user_crud.get_user_by_email, email)
+
+async def get_user_by_id(db: AsyncSession, user_id: UUID):
+    return await db.run_sync(user_crud.get_user_by_id, user_id)
+
+async def create_connection(db: AsyncSession, user_id_1: UUID, user_id_2: UUID):
+    return await db.run_sync(user_crud.create_connection, user_id_1, user_id_2)
+
+async def get_user_connections(db: AsyncSession, user_id: UUID) -> List[models.User]:
+    return await db.run_sync(user_crud.get_user_connections, user_id)
+
+async def get_user_connection_rows(db: AsyncSession, user_id: UUID) -> List[Row]:
+    return await db.run_sync(user_crud.get_user_connection_rows, user_id)
+
+async def delete_user(db: AsyncSession, user_id: UUID):
+    return await db.run_sync(user_crud.delete_user, user_id)
+
+async def get_connection(db: AsyncSession, user_id_1: UUID, user_id_2: UUID):
+    return await db.run_sync(user_crud.get_connection, user_id_1, user_id_2)
+
+async def delete_connection(db: AsyncSession, user_id_1: UUID, user_id_2: UUID):
+    return await db.run_sync(user_crud.delete_connection, user_id_1, user_id_2)
+
+async def modify_user(db: AsyncSession, user_id: UUID, updated_user: schemas.UserCreate):
+    return await db.run_sync(user_crud.modify_user, user_id, updated_user)
+
+async def get_degree(db: AsyncSession, user_id: UUID) -> int:
+    return await db.run_sync(user_crud.get_degree, user_id)
+
+async def get_possible_users_to_connect(db: AsyncSession, user_id: UUID, limit: int = 20, offset: int = 0) -> List[Tuple[models.User, int]]:
+    return await db.run_sync(user_crud.get_possible_users_to_connect, user_id, limit, offset)
+
+async def get_possible_user_rows(db: AsyncSession, user_id: UUID, limit: int = 20, offset: int = 0) -> List[Row]:
+    return await db.run_sync(user_crud.get_possible_user_rows, user_id, limit, offset)
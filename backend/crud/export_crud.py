@@ -0,0 +1,79 @@
+"""
+Full-table scans behind the bulk exports (routes.export).
+
+Every export is a single statement read through a server-side cursor
+`chunk_size` rows at a time, so memory stays bounded whatever the size of
+the tables, and one statement sees one consistent snapshot. The users and
+connections scans are unordered: the database only has to walk the table.
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import Integer, func, literal, null, select, text, type_coerce, union_all, Row
+import models.models as models
+from crud.user_crud import USER_ROW_COLUMNS
+from models.types import GUID
+from typing import Iterator, List
+
+CONNECTION_ROW_COLUMNS = (
+    models.Connection.user_id,
+    models.Connection.connected_user_id,
+    models.Connection.id,
+    models.Connection.connection_made_at,
+)
+
+# Values of the `part` column of the edge list scan
+EDGE_LIST_NODE = 0
+EDGE_LIST_EDGE = 1
+
+
+def _scan(db: Session, statement, chunk_size: int) -> Iterator[List[Row]]:
+    if db.get_bind().dialect.name == "postgresql":
+        # An export may legitimately outlast DB_STATEMENT_TIMEOUT_MS; this
+        # only lifts it for the export's own transaction
+        db.execute(text("SET LOCAL statement_timeout = 0"))
+    result = db.execute(statement.execution_options(yield_per=chunk_size))
+    yield from result.partitions()
+
+
+def iter_user_chunks(db: Session, chunk_size: int = 5000) -> Iterator[List[Row]]:
+    """Every user as USER_ROW_COLUMNS rows, in lists of up to `chunk_size`."""
+    return _scan(db, select(*USER_ROW_COLUMNS), chunk_size)
+
+def iter_connection_chunks(db: Session, chunk_size: int = 5000) -> Iterator[List[Row]]:
+    """Every connection as CONNECTION_ROW_COLUMNS rows, in lists of up to `chunk_size`."""
+    return _scan(db, select(*CONNECTION_ROW_COLUMNS), chunk_size)
+
+def edge_list_statement():
+    """
+    One statement for the binary edge list: first a (EDGE_LIST_NODE, id,
+    index, NULL) row per user, in id order, where index is the user's
+    position in that order; then a (EDGE_LIST_EDGE, NULL, index, index) row
+    per connection, requester first.
+
+    The users are numbered by the database (row_number over the primary key)
+    and the connections joined to those numbers there, so the caller never
+    has to keep an id -> index map. The explicit ORDER BY puts the users
+    first whatever plan the database picks for the union, and sorts the
+    connections by (source, target) index.
+    """
+    user = models.User
+    connection = models.Connection
+    ranked = select(user.id, (func.row_number().over(order_by=user.id) - 1).label("idx")).cte("ranked")
+    source = ranked.alias("source")
+    target = ranked.alias("target")
+    nodes = select(
+        literal(EDGE_LIST_NODE, Integer).label("part"),
+        ranked.c.id,
+        ranked.c.idx.label("a"),
+        type_coerce(null(), Integer).label("b"),
+    )
+    edges = (
+        select(literal(EDGE_LIST_EDGE, Integer), type_coerce(null(), GUID), source.c.idx, target.c.idx)
+        .select_from(connection)
+        .join(source, source.c.id == connection.user_id)
+        .join(target, target.c.id == connection.connected_user_id)
+    )
+    return union_all(nodes, edges).order_by("part", "a", "b")
+
+def iter_edge_list_chunks(db: Session, chunk_size: int = 5000) -> Iterator[List[Row]]:
+    """edge_list_statement rows, in lists of up to `chunk_size`."""
+    return _scan(db, edge_list_statement(), chunk_size)
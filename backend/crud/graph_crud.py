@@ -0,0 +1,127 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select
+import models.models as models
+import core.graph_store as graph_store
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from uuid import UUID
+
+# Upper bounds for the traversals, the routes only accept values below them
+MAX_PATH_DEPTH = 6
+MAX_NETWORK_DEPTH = 3
+# Stop expanding once this many users have been reached
+MAX_VISITED = 100_000
+# Frontier ids per IN (...) query
+FRONTIER_CHUNK_SIZE = 500
+
+
+class SearchLimitExceeded(Exception):
+    """Raised by find_path when it reaches `max_visited` users without an answer."""
+
+
+def _adjacent(db: Session, user_ids: List[UUID]) -> Iterator[Tuple[UUID, UUID]]:
+    """
+    Yields (user_id, neighbor_id) for every edge leaving the given users.
+    A whole BFS level is expanded with one primary key range scan per chunk
+    of ids instead of one query per user. With the graph store loaded the
+    edges come from memory instead.
+    """
+    store = graph_store.store
+    if store.ready:
+        for user_id in user_ids:
+            for neighbor_id in store.neighbor_ids(user_id) or ():
+                yield user_id, neighbor_id
+        return
+
+    adjacency = models.UserAdjacency
+    for start in range(0, len(user_ids), FRONTIER_CHUNK_SIZE):
+        chunk = user_ids[start:start + FRONTIER_CHUNK_SIZE]
+        yield from db.execute(
+            select(adjacency.user_id, adjacency.neighbor_id).where(adjacency.user_id.in_(chunk))
+        ).all()
+
+
+def find_path(db: Session, source_id: UUID, target_id: UUID, max_depth: int = MAX_PATH_DEPTH, max_visited: int = MAX_VISITED) -> Optional[List[UUID]]:
+    """
+    Returns the user ids along a shortest path from source to target, both
+    included, or None if there is none within `max_depth` hops. Raises
+    SearchLimitExceeded as soon as `max_visited` users have been reached,
+    checked for every new user so one level around a hub cannot grow the
+    search past it.
+    Bidirectional BFS: the side with the smaller frontier is expanded one
+    full level at a time, so a path of length d only explores about twice
+    the d/2-hop neighborhoods instead of the whole d-hop one.
+    """
+    if source_id == target_id:
+        return [source_id]
+
+    # Per side: user id -> (parent towards the side's root, distance)
+    visited = ({source_id: (None, 0)}, {target_id: (None, 0)})
+    frontiers = [[source_id], [target_id]]
+    depth = 0
+    while frontiers[0] and frontiers[1] and depth < max_depth:
+        side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+        own, other = visited[side], visited[1 - side]
+        next_frontier, best = [], None
+        for user_id, neighbor_id in _adjacent(db, frontiers[side]):
+            if neighbor_id in other:
+                # Finish the level and keep the meeting point with the shortest total
+                length = own[user_id][1] + 1 + other[neighbor_id][1]
+                if best is None or length < best[0]:
+                    best = (length, user_id, neighbor_id)
+            if neighbor_id not in own:
+                if len(own) + len(other) >= max_visited:
+                    raise SearchLimitExceeded(f"Searched {max_visited} users without an answer.")
+                own[neighbor_id] = (user_id, own[user_id][1] + 1)
+                next_frontier.append(neighbor_id)
+        depth += 1
+
+        if best is not None:
+            _, user_id, neighbor_id = best
+            # Walk back to both roots from the two ends of the meeting edge
+            own_half = _walk_to_root(own, user_id)[::-1]
+            other_half = _walk_to_root(other, neighbor_id)
+            path = own_half + other_half
+            return path if side == 0 else path[::-1]
+        frontiers[side] = next_frontier
+    return None
+
+
+def _walk_to_root(parents: Dict[UUID, Tuple[Optional[UUID], int]], user_id: UUID) -> List[UUID]:
+    path = [user_id]
+    while parents[path[-1]][0] is not None:
+        path.append(parents[path[-1]][0])
+    return path
+
+
+def get_network(db: Session, user_id: UUID, depth: int = 2, max_users: int = MAX_VISITED) -> Tuple[List[List[UUID]], bool]:
+    """
+    Breadth-first walk around a user. Returns the ids found at each distance
+    (index 0 holds the direct connections) and whether the walk stopped
+    early because `max_users` was reached.
+    """
+    seen = {user_id}
+    levels, frontier = [], [user_id]
+    for _ in range(depth):
+        level = []
+        for _, neighbor_id in _adjacent(db, frontier):
+            if neighbor_id in seen:
+                continue
+            if len(seen) - 1 >= max_users:
+                levels.append(sorted(level))
+                return levels, True
+            seen.add(neighbor_id)
+            level.append(neighbor_id)
+        if not level:
+            break
+        levels.append(sorted(level))
+        frontier = level
+    return levels, False
+
+
+def get_users_by_ids(db: Session, user_ids: Iterable[UUID]) -> List[models.User]:
+    """
+    Loads the given users with one query, in the order of `user_ids`.
+    """
+    user_ids = list(user_ids)
+    users = {user.id: user for user in db.query(models.User).filter(models.User.id.in_(user_ids))}
+    return [users[user_id] for user_id in user_ids if user_id in users]
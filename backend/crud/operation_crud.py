@@ -0,0 +1,154 @@
+"""
+Journal behind the write-behind mode (WRITE_BEHIND_ENABLED, see
+core.write_queue): connection creates and deletes are first recorded in
+connection_operations, many per transaction, and applied later, again many
+per transaction.
+"""
+import uuid
+from datetime import datetime, timezone
+from typing import List, Optional, Set, Tuple
+from uuid import UUID
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import models.models as models
+import crud.statistics_crud as statistics_crud
+import core.cache as response_cache
+import core.graph_store as graph_store
+from core.cache import STATS_TAG, USERS_TAG, user_tag
+
+CREATE = "create"
+DELETE = "delete"
+PENDING = "pending"
+APPLYING = "applying"
+APPLIED = "applied"
+FAILED = "failed"
+
+
+def journal_operations(db: Session, operations: List[dict]) -> List[UUID]:
+    """
+    Records operations ({"kind", "user_id", "connected_user_id",
+    "idempotency_key"}) as pending in one transaction and returns their ids,
+    in order. An operation whose idempotency key is already journaled (or
+    repeated in the batch) is not recorded again; it gets the id of the
+    first one.
+    """
+    table = models.ConnectionOperation
+    keys = [operation["idempotency_key"] for operation in operations if operation.get("idempotency_key")]
+    known = dict(db.execute(select(table.idempotency_key, table.id).where(table.idempotency_key.in_(keys))).tuples().all()) if keys else {}
+
+    ids, rows = [], []
+    now = datetime.now(timezone.utc)
+    for operation in operations:
+        key = operation.get("idempotency_key")
+        if key and key in known:
+            ids.append(known[key])
+            continue
+        operation_id = uuid.uuid4()
+        if key:
+            known[key] = operation_id
+        ids.append(operation_id)
+        rows.append({
+            "id": operation_id,
+            "idempotency_key": key,
+            "kind": operation["kind"],
+            "user_id": operation["user_id"],
+            "connected_user_id": operation["connected_user_id"],
+            "status": PENDING,
+            "created_at": now,
+        })
+    if rows:
+        db.execute(insert(table), rows)
+    db.commit()
+    return ids
+
+def get_operation(db: Session, operation_id: UUID) -> Optional[models.ConnectionOperation]:
+    return db.query(models.ConnectionOperation).filter(models.ConnectionOperation.id == operation_id).first()
+
+def count_pending_operations(db: Session) -> int:
+    table = models.ConnectionOperation
+    return db.query(table.seq).filter(table.status == PENDING).count()
+
+
+def _apply_operation(db: Session, operation: models.ConnectionOperation, existing_users: Set[UUID]) -> Optional[str]:
+    # Returns why the operation failed, or None once it is applied (not committed)
+    user_id_1, user_id_2 = operation.user_id, operation.connected_user_id
+    if operation.kind == CREATE:
+        missing = next((user_id for user_id in (user_id_1, user_id_2) if user_id not in existing_users), None)
+        if missing is not None:
+            return f"User with id {missing} does not exist."
+        connection_id = uuid.uuid4()
+        try:
+            with db.begin_nested():
+                db.execute(insert(models.Connection), [{"id": connection_id, "user_id": user_id_1, "connected_user_id": user_id_2}])
+                db.execute(insert(models.UserAdjacency), [
+                    {"user_id": user_id_1, "neighbor_id": user_id_2, "connection_id": connection_id},
+                    {"user_id": user_id_2, "neighbor_id": user_id_1, "connection_id": connection_id},
+                ])
+        except IntegrityError:
+            return "Connection already exists between these users."
+        return None
+
+    connection_id = db.scalar(select(models.UserAdjacency.connection_id).where(
+        models.UserAdjacency.user_id == user_id_1,
+        models.UserAdjacency.neighbor_id == user_id_2,
+    ))
+    if connection_id is None:
+        return "Connection not found."
+    db.execute(delete(models.UserAdjacency).where(models.UserAdjacency.connection_id == connection_id))
+    db.execute(delete(models.Connection).where(models.Connection.id == connection_id))
+    return None
+
+def apply_pending_operations(db: Session, limit: int = 500) -> int:
+    """
+    Applies up to `limit` pending operations, oldest first, in a single
+    transaction, and marks each one applied or failed (with the reason).
+    Returns the number of operations processed.
+
+    The operations are claimed with an UPDATE at the start of the
+    transaction, so concurrent workers (one per process) never apply the
+    same operation twice: the second one waits for the first to commit and
+    then no longer sees them as pending.
+    """
+    table = models.ConnectionOperation
+    claim = uuid.uuid4().hex
+    oldest = select(table.seq).where(table.status == PENDING).order_by(table.seq).limit(limit)
+    db.execute(
+        update(table)
+        .where(table.status == PENDING, table.seq.in_(oldest.scalar_subquery()))
+        .values(status=APPLYING, claim=claim)
+        .execution_options(synchronize_session=False)
+    )
+    operations = db.scalars(select(table).where(table.claim == claim).order_by(table.seq)).all()
+    if not operations:
+        db.rollback()
+        return 0
+
+    user_ids = {user_id for operation in operations for user_id in (operation.user_id, operation.connected_user_id)}
+    existing_users = set(db.scalars(select(models.User.id).where(models.User.id.in_(user_ids))))
+    created: List[Tuple[UUID, UUID]] = []
+    removed: List[Tuple[UUID, UUID]] = []
+    now = datetime.now(timezone.utc)
+    for operation in operations:
+        operation.detail = _apply_operation(db, operation, existing_users)
+        operation.status = FAILED if operation.detail else APPLIED
+        operation.applied_at = now
+        if operation.status == APPLIED:
+            (created if operation.kind == CREATE else removed).append((operation.user_id, operation.connected_user_id))
+
+    # Counted separately: the rollups count the creates, whatever the net change
+    if created:
+        statistics_crud.apply_statistics_delta(db, connections=len(created))
+    if removed:
+        statistics_crud.apply_statistics_delta(db, connections=-len(removed))
+    db.commit()
+
+    touched = created + removed
+    if touched:
+        # As in user_crud.create_connections_batch, USERS_TAG stands in for
+        # the possible-connections lists of every neighbor
+        response_cache.cache.invalidate(STATS_TAG, USERS_TAG, *{user_tag(user_id) for pair in touched for user_id in pair})
+        graph_store.store.sync_edges(db, touched)
+    return len(operations)
@@ -1,56 +1,227 @@
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func
-import backend.models.models as models
+from sqlalchemy import delete, func, select, update
+import models.models as models
 import schemas
-from typing import List
+from typing import Dict, Iterable, List, Optional, Tuple
 from uuid import UUID
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
-def get_average_connections_per_user(db: Session) -> float:
+SUMMARY_ID = 1
+
+# Granularities kept in stats_rollup, with the length of one bucket
+ROLLUP_BUCKETS = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+# Rows per INSERT ... ON CONFLICT when rebuilding the rollups
+ROLLUP_BATCH_SIZE = 500
+
+
+def compute_statistics_counters(db: Session) -> dict:
     """
-    Calculate the average number of connections per user.
-    Considers both initiated and received connections.
+    Computes the summary counters from scratch by scanning the tables.
+    Only used to seed and reconcile the stats_summary row.
     """
+    return {
+        'user_count': db.query(func.count(models.User.id)).scalar(),
+        'connection_count': db.query(func.count(models.Connection.id)).scalar(),
+        'last_connection_at': db.query(func.max(models.Connection.connection_made_at)).scalar(),
+    }
 
-    # Get total number of users
-    total_users = db.query(models.User).count()
-    if total_users == 0:
-        return 0.0  # Avoid division by zero if there are no users
 
-    # Get total number of initiated connections
-    initiated_connections_count = db.query(models.Connection.user_id).count()
+def seed_summary(db: Session) -> bool:
+    """
+    Inserts the stats_summary row, computed from the tables, unless it
+    exists. ON CONFLICT DO NOTHING, so concurrent seeders never fail each
+    other. Runs in the caller's transaction; returns whether the row was
+    inserted by this call.
+    """
+    statement = _dialect_insert(db)(models.StatsSummary).values(id=SUMMARY_ID, **compute_statistics_counters(db))
+    return db.execute(statement.on_conflict_do_nothing(index_elements=[models.StatsSummary.id])).rowcount == 1
+
+
+def _get_summary(db: Session) -> models.StatsSummary:
+    # Read-only: the session may be a replica's. run_migrations seeds the
+    # row; until then the counters are computed from the tables
+    summary = db.get(models.StatsSummary, SUMMARY_ID)
+    if summary is None:
+        summary = models.StatsSummary(id=SUMMARY_ID, **compute_statistics_counters(db))
+    return summary
 
-    # Get total number of received connections
-    received_connections_count = db.query(models.Connection.connected_user_id).count()
 
-    # Total number of unique connections (each connection is counted twice in above queries)
-    total_connections = initiated_connections_count + received_connections_count
+def apply_statistics_delta(db: Session, users: int = 0, connections: int = 0) -> None:
+    """
+    Adjusts the summary counters inside the caller's transaction. Call it
+    before committing a write so the counters and the data change together.
+    """
+    # Make pending rows visible to the subquery below and to the seeding path
+    db.flush()
+
+    values = {}
+    if users:
+        values['user_count'] = models.StatsSummary.user_count + users
+    if connections:
+        values['connection_count'] = models.StatsSummary.connection_count + connections
+        # Index-backed MAX, so both creates and deletes keep this exact
+        values['last_connection_at'] = select(func.max(models.Connection.connection_made_at)).scalar_subquery()
+    if not values:
+        return
+
+    statement = (
+        update(models.StatsSummary)
+        .where(models.StatsSummary.id == SUMMARY_ID)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    # Without the row (a database run_migrations has not seeded), seeding
+    # it from the tables already counts this change, unless another writer
+    # seeded it first
+    if db.execute(statement).rowcount == 0 and not seed_summary(db):
+        db.execute(statement)
+
+    if users > 0 or connections > 0:
+        now = datetime.now(timezone.utc)
+        _add_to_rollups(db, {
+            (bucket, bucket_start(now, bucket)): (max(users, 0), max(connections, 0))
+            for bucket in ROLLUP_BUCKETS
+        })
+
+
+def bucket_start(value: datetime, bucket: str) -> datetime:
+    """
+    Start of the hour or day `value` falls in, as a naive UTC datetime
+    (naive values are taken to be UTC already).
+    """
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    value = value.replace(minute=0, second=0, microsecond=0)
+    return value.replace(hour=0) if bucket == "day" else value
+
+
+def _dialect_insert(db: Session):
+    # Both dialects in use support INSERT ... ON CONFLICT DO UPDATE
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+def _add_to_rollups(db: Session, counts: Dict[Tuple[str, datetime], Tuple[int, int]]) -> None:
+    # Upserts {(bucket, bucket_start): (new users, new connections)}, adding
+    # to whatever the rows already hold
+    rollup = models.StatsRollup
+    rows = [
+        {"bucket": bucket, "bucket_start": start, "new_users": new_users, "new_connections": new_connections}
+        for (bucket, start), (new_users, new_connections) in counts.items()
+    ]
+    for offset in range(0, len(rows), ROLLUP_BATCH_SIZE):
+        statement = _dialect_insert(db)(rollup).values(rows[offset:offset + ROLLUP_BATCH_SIZE])
+        db.execute(statement.on_conflict_do_update(
+            index_elements=[rollup.bucket, rollup.bucket_start],
+            set_={
+                "new_users": rollup.new_users + statement.excluded.new_users,
+                "new_connections": rollup.new_connections + statement.excluded.new_connections,
+            },
+        ))
+
+
+def rebuild_rollups(db: Session, chunk_size: int = 10_000) -> int:
+    """
+    Recomputes stats_rollup from the users and connections tables in one
+    streamed pass over each (`chunk_size` rows per fetch); only the per
+    bucket totals are held in memory. Deleted rows are gone from the tables,
+    so they are not counted. Returns the number of rollup rows written.
+    """
+    counts: Dict[Tuple[str, datetime], List[int]] = {}
 
-    # Calculate average connections per user
-    average_connections_per_user = total_connections / total_users
+    def tally(timestamps: Iterable[Optional[datetime]], position: int) -> None:
+        for value in timestamps:
+            if value is None:
+                continue
+            for bucket in ROLLUP_BUCKETS:
+                counts.setdefault((bucket, bucket_start(value, bucket)), [0, 0])[position] += 1
 
-    return average_connections_per_user
+    stream = lambda column: db.execute(select(column).execution_options(yield_per=chunk_size)).scalars()
+    tally(stream(models.User.created_at), 0)
+    tally(stream(models.Connection.connection_made_at), 1)
 
+    db.execute(delete(models.StatsRollup))
+    _add_to_rollups(db, {key: tuple(value) for key, value in counts.items()})
+    db.commit()
+    return len(counts)
 
-def get_statistics(db: Session) -> dict:
-    user_count = db.query(func.count(models.User.id)).scalar()
 
-    connection_count = db.query(func.count(models.Connection.id)).scalar()
+def get_timeseries(db: Session, bucket: str, start: datetime, end: datetime) -> List[dict]:
+    """
+    New users and connections per bucket from the bucket holding `start`
+    up to and including the one holding `end`. Buckets without activity
+    are returned with zero counts.
+    """
+    first, last = bucket_start(start, bucket), bucket_start(end, bucket)
+    rollup = models.StatsRollup
+    stored = {
+        row.bucket_start: row for row in db.execute(
+            select(rollup.bucket_start, rollup.new_users, rollup.new_connections)
+            .where(rollup.bucket == bucket, rollup.bucket_start.between(first, last))
+        )
+    }
+    points, current, step = [], first, ROLLUP_BUCKETS[bucket]
+    while current <= last:
+        row = stored.get(current)
+        points.append({
+            "bucket_start": current.replace(tzinfo=timezone.utc),
+            "new_users": row.new_users if row else 0,
+            "new_connections": row.new_connections if row else 0,
+        })
+        current += step
+    return points
+
+
+def reconcile_statistics(db: Session) -> Dict[str, Tuple[object, object]]:
+    """
+    Rebuilds the summary counters from the underlying tables.
+    Returns the fields that had drifted as {field: (stored, actual)}; a
+    missing summary row is simply seeded and reports no drift.
+    """
+    actual = compute_statistics_counters(db)
+    summary = db.get(models.StatsSummary, SUMMARY_ID)
+    if summary is None:
+        seed_summary(db)
+        db.commit()
+        return {}
+
+    drift = {}
+    for field, value in actual.items():
+        stored = getattr(summary, field)
+        if stored != value:
+            drift[field] = (stored, value)
+            setattr(summary, field, value)
+    db.commit()
+    return drift
 
-    last_connection = db.query(models.Connection.connection_made_at).order_by(models.Connection.connection_made_at.desc()).first()
 
-    # Extract the datetime value from the tuple if last_connection is not None
-    last_connection_datetime = last_connection[0] if last_connection else None
+def get_average_connections_per_user(db: Session) -> float:
+    """
+    Calculate the average number of connections per user.
+    Considers both initiated and received connections.
+    """
+    summary = _get_summary(db)
+    if summary.user_count == 0:
+        return 0.0  # Avoid division by zero if there are no users
 
+    # Every connection counts once for each of its two users
+    return 2 * summary.connection_count / summary.user_count
 
-    # Calculate the average connections per user using the subquery
-    average_connections_per_user = get_average_connections_per_user(db)
 
-    
+def get_statistics(db: Session) -> dict:
+    """
+    Reads the statistics from the stats_summary row, a single primary key
+    lookup regardless of table sizes.
+    """
+    summary = _get_summary(db)
+    average_connections_per_user = 2 * summary.connection_count / summary.user_count if summary.user_count else 0.0
 
     return {
-        'user_count': user_count,
-        'connection_count': connection_count,
+        'user_count': summary.user_count,
+        'connection_count': summary.connection_count,
         'average_connections_per_user': average_connections_per_user,
-        'last_connection': last_connection_datetime,
-    }
\ No newline at end of file
+        'last_connection': summary.last_connection_at,
+    }
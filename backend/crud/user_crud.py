@@ -1,117 +1,737 @@
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func
-import backend.models.models as models
+from sqlalchemy.orm import Session, joinedload, aliased
+from sqlalchemy import func, select, insert, delete, literal, or_, and_, tuple_, values, column, Row
+from sqlalchemy.exc import IntegrityError
+import models.models as models
 import schemas
-from typing import List
+import crud.statistics_crud as statistics_crud
+import core.cache as response_cache
+import core.graph_store as graph_store
+from core.cache import USERS_TAG, STATS_TAG, CONNECTIONS_TAG, user_tag, possible_tag
+from core.config import settings
+from typing import Dict, Iterator, List, Optional, Tuple
 from uuid import UUID
+from collections import namedtuple
+from datetime import datetime, timezone
+import base64
+import uuid
+import binascii
+import re
 
 
 
 
 def create_user(db: Session, user: schemas.UserCreate):
-    db_user = models.User(name=user.name, email=user.email)
+    db_user = models.User(id=uuid.uuid4(), name=user.name, email=user.email)
     db.add(db_user)
+    db.add_all(models.UserSearchTerm(**row) for row in search_term_rows(db_user.id, user.name, user.email))
+    statistics_crud.apply_statistics_delta(db, users=1)
     db.commit()
     db.refresh(db_user)
+    # A new user is a candidate in everybody's possible connections
+    response_cache.cache.invalidate(USERS_TAG, STATS_TAG)
     return db_user
 
+# Rows per INSERT ... executemany and per transaction in the bulk imports
+BULK_BATCH_SIZE = 1000
+# Pairs of ids per query in get_mutual_counts
+MUTUAL_CHUNK_SIZE = 500
+
+def create_users_batch(db: Session, batch: List[Tuple[int, schemas.UserCreate]]) -> dict:
+    """
+    Inserts one batch of (index, user) pairs in a single transaction.
+    Emails that are repeated in the batch or already taken are reported in
+    `errors` instead of failing the batch. Returns
+    {"created": [{"index", "id"}], "errors": [{"index", "detail"}]}.
+    """
+    errors = []
+    candidates, seen_emails = [], set()
+    for index, user in batch:
+        if user.email in seen_emails:
+            errors.append({"index": index, "detail": "Duplicate email in batch."})
+            continue
+        seen_emails.add(user.email)
+        # Ids and timestamps are generated here so no RETURNING round trip is needed
+        candidates.append((index, {"id": uuid.uuid4(), "name": user.name, "email": user.email, "created_at": datetime.now(timezone.utc)}))
+
+    # One query finds every email of the batch that is already in use
+    taken = set(db.scalars(select(models.User.email).where(models.User.email.in_(seen_emails)))) if seen_emails else set()
+    pending = []
+    for index, row in candidates:
+        if row["email"] in taken:
+            errors.append({"index": index, "detail": "Email is already in use."})
+        else:
+            pending.append((index, row))
+
+    def insert_rows(rows):
+        db.execute(insert(models.User), rows)
+        db.execute(insert(models.UserSearchTerm), [
+            term_row for row in rows for term_row in search_term_rows(row["id"], row["name"], row["email"])
+        ])
+
+    created = _insert_batch(db, pending, insert_rows, "Email is already in use.", errors)
+    if created:
+        statistics_crud.apply_statistics_delta(db, users=len(created))
+    db.commit()
+    if created:
+        response_cache.cache.invalidate(USERS_TAG, STATS_TAG)
+    return {"created": created, "errors": sorted(errors, key=lambda error: error["index"])}
+
+def _insert_batch(db: Session, pending: List[Tuple[int, dict]], insert_rows, conflict_detail: str, errors: List[dict]) -> List[dict]:
+    """
+    Runs `insert_rows(rows)` for all the pending (index, row) pairs at once.
+    If a concurrent writer got in between the checks and the insert, the
+    batch is retried row by row in savepoints so only the conflicting rows
+    fail. Returns the created [{"index", "id"}].
+    """
+    if not pending:
+        return []
+    try:
+        with db.begin_nested():
+            insert_rows([row for _, row in pending])
+        return [{"index": index, "id": row["id"]} for index, row in pending]
+    except IntegrityError:
+        pass
+
+    created = []
+    for index, row in pending:
+        try:
+            with db.begin_nested():
+                insert_rows([row])
+            created.append({"index": index, "id": row["id"]})
+        except IntegrityError:
+            errors.append({"index": index, "detail": conflict_detail})
+    return created
+
+def create_connections_batch(db: Session, batch: List[Tuple[int, schemas.ConnectionCreate]]) -> dict:
+    """
+    Inserts one batch of (index, connection) pairs and their adjacency rows in
+    a single transaction. Self connections, unknown users, pairs repeated in
+    the batch (in either direction) and existing connections are reported in
+    `errors`. Same return shape as create_users_batch.
+    """
+    errors = []
+    candidates, seen_pairs = [], set()
+    for index, connection in batch:
+        user_id_1, user_id_2 = connection.user_id, connection.connected_user_id
+        if user_id_1 == user_id_2:
+            errors.append({"index": index, "detail": "A user cannot connect to themselves."})
+            continue
+        pair = frozenset((user_id_1, user_id_2))
+        if pair in seen_pairs:
+            errors.append({"index": index, "detail": "Duplicate connection in batch."})
+            continue
+        seen_pairs.add(pair)
+        candidates.append((index, user_id_1, user_id_2))
+
+    user_ids = {user_id for _, user_id_1, user_id_2 in candidates for user_id in (user_id_1, user_id_2)}
+    existing_users = set(db.scalars(select(models.User.id).where(models.User.id.in_(user_ids)))) if user_ids else set()
+    pairs = [(user_id_1, user_id_2) for _, user_id_1, user_id_2 in candidates]
+    # The adjacency table has both directions, so one tuple IN covers them
+    connected = {
+        (row.user_id, row.neighbor_id) for row in db.execute(
+            select(models.UserAdjacency.user_id, models.UserAdjacency.neighbor_id)
+            .where(tuple_(models.UserAdjacency.user_id, models.UserAdjacency.neighbor_id).in_(pairs))
+        )
+    } if pairs else set()
+
+    pending = []
+    for index, user_id_1, user_id_2 in candidates:
+        missing = next((user_id for user_id in (user_id_1, user_id_2) if user_id not in existing_users), None)
+        if missing is not None:
+            errors.append({"index": index, "detail": f"User with id {missing} does not exist."})
+        elif (user_id_1, user_id_2) in connected:
+            errors.append({"index": index, "detail": "Connection already exists between these users."})
+        else:
+            pending.append((index, {"id": uuid.uuid4(), "user_id": user_id_1, "connected_user_id": user_id_2}))
+
+    def insert_rows(rows):
+        db.execute(insert(models.Connection), rows)
+        db.execute(insert(models.UserAdjacency), [
+            {"user_id": user_id, "neighbor_id": neighbor_id, "connection_id": row["id"]}
+            for row in rows
+            for user_id, neighbor_id in ((row["user_id"], row["connected_user_id"]), (row["connected_user_id"], row["user_id"]))
+        ])
+
+    created = _insert_batch(db, pending, insert_rows, "Connection already exists between these users.", errors)
+    if created:
+        statistics_crud.apply_statistics_delta(db, connections=len(created))
+    db.commit()
+    if created:
+        # Bumping USERS_TAG drops every cached possible-connections list in one
+        # step, instead of looking up the neighbors of every endpoint
+        created_ids = {entry["id"] for entry in created}
+        endpoints = {user_id for _, row in pending if row["id"] in created_ids for user_id in (row["user_id"], row["connected_user_id"])}
+        response_cache.cache.invalidate(STATS_TAG, USERS_TAG, *(user_tag(user_id) for user_id in endpoints))
+        graph_store.store.sync_edges(db, [(row["user_id"], row["connected_user_id"]) for _, row in pending if row["id"] in created_ids])
+    return {"created": created, "errors": sorted(errors, key=lambda error: error["index"])}
+
 def get_all_users(db: Session):
     return db.query(models.User).all()
 
 
+def encode_user_cursor(user) -> str:
+    """
+    Builds an opaque cursor pointing right after the given user in
+    (created_at, id) order.
+    """
+    raw = f"{user.created_at.isoformat()}|{user.id.hex}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_user_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    """
+    Inverse of encode_user_cursor. Raises ValueError on malformed cursors.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, user_id = raw.split("|")
+        return datetime.fromisoformat(created_at), UUID(user_id)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+
+# The columns of schemas.User, selected as plain rows by the list endpoints
+# so no ORM objects are built for data that is only serialized
+USER_ROW_COLUMNS = (models.User.id, models.User.name, models.User.email, models.User.created_at)
+
+def _users_page(db: Session, entities, limit: int, cursor: Optional[str]):
+    query = db.query(*entities)
+    if cursor:
+        created_at, user_id = decode_user_cursor(cursor)
+        query = query.filter(or_(
+            models.User.created_at > created_at,
+            and_(models.User.created_at == created_at, models.User.id > user_id),
+        ))
+    # Fetch one extra row to know whether there is a next page
+    users = query.order_by(models.User.created_at, models.User.id).limit(limit + 1).all()
+    if len(users) > limit:
+        users = users[:limit]
+        return users, encode_user_cursor(users[-1])
+    return users, None
+
+def get_users_page(db: Session, limit: int = 100, cursor: Optional[str] = None) -> Tuple[List[models.User], Optional[str]]:
+    """
+    Returns at most `limit` users ordered by (created_at, id) starting after
+    `cursor`, plus the cursor for the next page (None on the last page).
+    Uses a keyset predicate so every page is a single index range scan,
+    regardless of how deep into the table it is.
+    """
+    return _users_page(db, (models.User,), limit, cursor)
+
+def get_user_rows_page(db: Session, limit: int = 100, cursor: Optional[str] = None) -> Tuple[List[Row], Optional[str]]:
+    """
+    Same as get_users_page, with USER_ROW_COLUMNS rows instead of User models.
+    """
+    return _users_page(db, USER_ROW_COLUMNS, limit, cursor)
+
+def iter_users_statement(chunk_size: int = 1000):
+    return (
+        select(*USER_ROW_COLUMNS)
+        .order_by(models.User.created_at, models.User.id)
+        .execution_options(yield_per=chunk_size)
+    )
+
+def iter_users(db: Session, chunk_size: int = 1000) -> Iterator[Row]:
+    """
+    Streams every user as a lightweight row in (created_at, id) order.
+    Rows are pulled from the database cursor `chunk_size` at a time instead
+    of materializing the whole table.
+    """
+    yield from db.execute(iter_users_statement(chunk_size))
+
+
 def get_user_by_email(db: Session, email: str):
     return db.query(models.User).filter(models.User.email == email).first()
 
 def get_user_by_id(db: Session, user_id: UUID):
     return db.query(models.User).filter(models.User.id == user_id).first()
 
+
+# Longest term stored (and longest query word searched)
+SEARCH_TERM_MAX_LENGTH = 64
+# Words of a query beyond this are ignored
+SEARCH_MAX_WORDS = 5
+
+def search_terms(name: str, email: str) -> List[str]:
+    """
+    The lowercased terms a user can be found by: every word of the name,
+    split on whitespace and again on punctuation ("o'brien", "o", "brien"),
+    the whole email and its domain.
+    """
+    name, email = name.lower(), email.lower()
+    terms = set(name.split()) | set(re.findall(r"\w+", name)) | {email, email.rpartition("@")[2]}
+    return sorted({term[:SEARCH_TERM_MAX_LENGTH] for term in terms if term})
+
+def search_term_rows(user_id: UUID, name: str, email: str) -> List[dict]:
+    return [{"term": term, "user_id": user_id} for term in search_terms(name, email)]
+
+def _replace_search_terms(db: Session, user_id: UUID, name: str, email: str) -> None:
+    db.execute(delete(models.UserSearchTerm).where(models.UserSearchTerm.user_id == user_id))
+    db.execute(insert(models.UserSearchTerm), search_term_rows(user_id, name, email))
+
+def encode_search_cursor(term: str, user_id: UUID) -> str:
+    raw = f"{term}|{user_id.hex}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_search_cursor(cursor: str) -> Tuple[str, UUID]:
+    """
+    Inverse of encode_search_cursor. Raises ValueError on malformed cursors.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        term, user_id = raw.rsplit("|", 1)
+        return term, UUID(user_id)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+
+def _prefix_range(column, prefix: str):
+    # prefix <= term < prefix with its last character incremented: a range
+    # scan on the index, unlike LIKE. Only a prefix match under byte order,
+    # which is why user_search_terms.term uses the "C" collation on PostgreSQL
+    return and_(column >= prefix, column < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+
+def search_user_rows(db: Session, query: str, limit: int = 20, cursor: Optional[str] = None) -> Tuple[List[Row], Optional[str]]:
+    """
+    Returns at most `limit` users with a term starting with every word of
+    `query` (case-insensitive), as USER_ROW_COLUMNS rows, plus the cursor for
+    the next page (None on the last page).
+
+    The longest word drives a range scan of user_search_terms in (term,
+    user_id) order; the other words are checked per candidate through
+    ix_user_search_terms_user_id_term. A user matching the driving word
+    through several terms is listed at the first one only. Nothing is
+    sorted, so a page costs the same for "a" as for a full email.
+    """
+    words = sorted({word[:SEARCH_TERM_MAX_LENGTH] for word in query.lower().split()}, key=len, reverse=True)[:SEARCH_MAX_WORDS]
+    if not words:
+        return [], None
+    terms = models.UserSearchTerm
+    earlier = aliased(models.UserSearchTerm)
+    statement = (
+        select(*USER_ROW_COLUMNS, terms.term)
+        .join(models.User, models.User.id == terms.user_id)
+        .where(_prefix_range(terms.term, words[0]))
+        .where(~select(earlier.term).where(
+            earlier.user_id == terms.user_id,
+            earlier.term >= words[0],
+            earlier.term < terms.term,
+        ).exists())
+    )
+    for word in words[1:]:
+        other = aliased(models.UserSearchTerm)
+        statement = statement.where(select(other.term).where(other.user_id == terms.user_id, _prefix_range(other.term, word)).exists())
+    if cursor:
+        term, user_id = decode_search_cursor(cursor)
+        statement = statement.where(or_(terms.term > term, and_(terms.term == term, terms.user_id > user_id)))
+    # Fetch one extra row to know whether there is a next page
+    rows = db.execute(statement.order_by(terms.term, terms.user_id).limit(limit + 1)).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_search_cursor(rows[-1].term, rows[-1].id)
+    return rows, None
+
+def backfill_search_terms(db: Session, chunk_size: int = BULK_BATCH_SIZE) -> int:
+    """
+    Populates user_search_terms for databases created before the table
+    existed, reading the users `chunk_size` at a time through the keyset
+    pages. Does nothing if the table already has rows. Returns the number of
+    terms written.
+    """
+    if db.query(models.UserSearchTerm.user_id).first() is not None:
+        return 0
+    written, cursor = 0, None
+    while True:
+        users, cursor = get_user_rows_page(db, chunk_size, cursor)
+        rows = [row for user in users for row in search_term_rows(user.id, user.name, user.email)]
+        if rows:
+            db.execute(insert(models.UserSearchTerm), rows)
+            written += len(rows)
+        if cursor is None:
+            break
+    db.commit()
+    return written
+
 def create_connection(db: Session, user_id_1: UUID, user_id_2: UUID):
-    db_connection = models.Connection(user_id=user_id_1, connected_user_id=user_id_2)
+    """
+    Creates a connection and its two adjacency rows in one transaction.
+    Raises IntegrityError if the users are already connected in either
+    direction.
+    """
+    db_connection = models.Connection(id=uuid.uuid4(), user_id=user_id_1, connected_user_id=user_id_2)
     db.add(db_connection)
+    db.add_all(_adjacency_rows(db_connection.id, user_id_1, user_id_2))
+    statistics_crud.apply_statistics_delta(db, connections=1)
     db.commit()
+    graph_store.store.sync_edges(db, [(user_id_1, user_id_2)])
     db.refresh(db_connection)
+    _invalidate_connection(db, user_id_1, user_id_2)
     return db_connection
 
+def _adjacency_rows(connection_id: UUID, user_id_1: UUID, user_id_2: UUID) -> List[models.UserAdjacency]:
+    return [
+        models.UserAdjacency(user_id=user_id_1, neighbor_id=user_id_2, connection_id=connection_id),
+        models.UserAdjacency(user_id=user_id_2, neighbor_id=user_id_1, connection_id=connection_id),
+    ]
+
+def get_neighbor_ids(db: Session, user_id: UUID) -> List[UUID]:
+    neighbor_ids = graph_store.store.neighbor_ids(user_id)
+    if neighbor_ids is not None:
+        return neighbor_ids
+    return [row[0] for row in db.query(models.UserAdjacency.neighbor_id).filter(models.UserAdjacency.user_id == user_id)]
+
+def _neighbor_ids_within(db: Session, user_id: UUID, limit: int) -> Optional[List[UUID]]:
+    # The user's neighbors, or None if there are more than `limit` of them
+    # (without reading the rest)
+    degree = graph_store.store.degree(user_id)
+    if degree is not None:
+        return get_neighbor_ids(db, user_id) if degree <= limit else None
+    neighbor_ids = [row[0] for row in db.query(models.UserAdjacency.neighbor_id).filter(
+        models.UserAdjacency.user_id == user_id
+    ).limit(limit + 1)]
+    return neighbor_ids if len(neighbor_ids) <= limit else None
+
+def _neighbor_tags(db: Session, user_id: UUID, tag, coarse_tag: str) -> List[str]:
+    # `tag` of every neighbor of the user, or `coarse_tag` alone when they
+    # have more neighbors than CACHE_FANOUT_LIMIT
+    neighbor_ids = _neighbor_ids_within(db, user_id, settings.cache_fanout_limit)
+    if neighbor_ids is None:
+        return [coarse_tag]
+    return [tag(neighbor_id) for neighbor_id in neighbor_ids]
+
+def _invalidate_connection(db: Session, user_id_1: UUID, user_id_2: UUID):
+    # Both neighbor lists change, and so do the mutual-connection counts in
+    # the possible-connections lists of both users and all their neighbors.
+    # Every possible-connections list also carries USERS_TAG, which stands
+    # in for the neighbors' tags past the fan-out limit.
+    response_cache.cache.invalidate(
+        STATS_TAG,
+        user_tag(user_id_1),
+        user_tag(user_id_2),
+        possible_tag(user_id_1),
+        possible_tag(user_id_2),
+        *_neighbor_tags(db, user_id_1, possible_tag, USERS_TAG),
+        *_neighbor_tags(db, user_id_2, possible_tag, USERS_TAG),
+    )
+
+def _user_connections_query(db: Session, user_id: UUID, entities):
+    # A single range scan over the adjacency primary key covers both directions
+    return db.query(*entities).join(
+        models.UserAdjacency,
+        models.UserAdjacency.neighbor_id == models.User.id
+    ).filter(models.UserAdjacency.user_id == user_id)
+
 def get_user_connections(db: Session, user_id: UUID) -> List[models.User]:
     """
     Retrieves connections for a user based on user_id.
     Returns a list of User models representing connected users.
     """
-    # Query to fetch connections where user_id is the initiator
-    connections_initiated = db.query(models.User).join(
-        models.Connection,
-        models.Connection.connected_user_id == models.User.id
-    ).filter(models.Connection.user_id == user_id).all()
-    
-    # Query to fetch connections where user_id is the receiver
-    connections_received = db.query(models.User).join(
-        models.Connection,
-        models.Connection.user_id == models.User.id
-    ).filter(models.Connection.connected_user_id == user_id).all()
-    
-    # Combine and return the list of connected users (remove duplicates)
-    connected_users = list(set(connections_initiated + connections_received))
-    
-    return connected_users
+    return _user_connections_query(db, user_id, (models.User,)).all()
 
+def get_user_connection_rows(db: Session, user_id: UUID) -> List[Row]:
+    """
+    Same as get_user_connections, with USER_ROW_COLUMNS rows instead of User
+    models.
+    """
+    return _user_connections_query(db, user_id, USER_ROW_COLUMNS).all()
 
+def get_user_rows_by_ids(db: Session, user_ids: List[UUID]) -> List[Row]:
+    """
+    USER_ROW_COLUMNS rows of the given users with one IN query, in the
+    order of `user_ids`. Unknown ids are skipped, repeated ones returned once.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    rows = {row.id: row for row in db.execute(select(*USER_ROW_COLUMNS).where(models.User.id.in_(user_ids)))}
+    return [rows[user_id] for user_id in user_ids if user_id in rows]
 
+def get_connection_rows_by_user(db: Session, user_ids: List[UUID]) -> Dict[UUID, List[Row]]:
+    """
+    Neighbor lists (USER_ROW_COLUMNS rows) of many users from one join over
+    the adjacency primary key, grouped while reading the result. Every
+    requested id is a key; unknown users have no connections. The rows also
+    carry the owner of the list as `owner_id`.
+    """
+    adjacency = models.UserAdjacency
+    connections: Dict[UUID, List[Row]] = {user_id: [] for user_id in user_ids}
+    result = db.execute(
+        select(adjacency.user_id.label("owner_id"), *USER_ROW_COLUMNS)
+        .join(models.User, models.User.id == adjacency.neighbor_id)
+        .where(adjacency.user_id.in_(list(connections)))
+        .order_by(adjacency.user_id, adjacency.neighbor_id)
+    )
+    for row in result:
+        connections[row.owner_id].append(row)
+    return connections
 
+def get_degree(db: Session, user_id: UUID) -> int:
+    """
+    Number of connections of a user.
+    """
+    degree = graph_store.store.degree(user_id)
+    if degree is not None:
+        return degree
+    return db.query(func.count()).select_from(models.UserAdjacency).filter(models.UserAdjacency.user_id == user_id).scalar()
 
+def _mutual_connections_query(db: Session, user_id_1: UUID, user_id_2: UUID, entities):
+    # Both neighbor lists are primary key range scans sorted by neighbor id,
+    # so the database intersects them with a merge instead of a hash
+    first, second = aliased(models.UserAdjacency), aliased(models.UserAdjacency)
+    return db.query(*entities).join(
+        first, and_(first.user_id == user_id_1, first.neighbor_id == models.User.id)
+    ).join(
+        second, and_(second.user_id == user_id_2, second.neighbor_id == models.User.id)
+    ).order_by(models.User.id)
 
+def get_mutual_connection_ids(db: Session, user_id_1: UUID, user_id_2: UUID) -> List[UUID]:
+    """
+    Ids of the users connected to both given users, ordered by id.
+    """
+    mutual_ids = graph_store.store.mutual_ids(user_id_1, user_id_2)
+    if mutual_ids is not None:
+        return mutual_ids
+    return [row.id for row in _mutual_connections_query(db, user_id_1, user_id_2, (models.User.id,))]
+
+def get_mutual_connection_rows(db: Session, user_id_1: UUID, user_id_2: UUID) -> List[Row]:
+    """
+    The users connected to both given users, as USER_ROW_COLUMNS rows
+    ordered by id.
+    """
+    if graph_store.store.ready:
+        rows = _users_by_ids(db, get_mutual_connection_ids(db, user_id_1, user_id_2), USER_ROW_COLUMNS)
+        return sorted(rows, key=lambda row: row.id)
+    return _mutual_connections_query(db, user_id_1, user_id_2, USER_ROW_COLUMNS).all()
+
+def get_mutual_counts(db: Session, pairs: List[Tuple[UUID, UUID]]) -> List[int]:
+    """
+    Number of mutual connections for each (user, other user) pair, in the
+    order of `pairs`. Without the graph store, every chunk of pairs is one
+    query: the pairs are sent as a VALUES list, and for each of them the
+    first user's neighbors are probed against the second user's primary
+    key range.
+    """
+    store = graph_store.store
+    if store.ready:
+        return [len(store.mutual_ids(user_id_1, user_id_2)) for user_id_1, user_id_2 in pairs]
+
+    counts: Dict[Tuple[UUID, UUID], int] = {}
+    first, second = aliased(models.UserAdjacency), aliased(models.UserAdjacency)
+    for start in range(0, len(pairs), MUTUAL_CHUNK_SIZE):
+        chunk = list(dict.fromkeys(pairs[start:start + MUTUAL_CHUNK_SIZE]))
+        wanted = values(
+            column("user_id", first.user_id.type),
+            column("other_user_id", second.user_id.type),
+            name="pairs",
+        ).data(chunk).cte("pairs")
+        counts.update(((user_id_1, user_id_2), count) for user_id_1, user_id_2, count in db.execute(
+            select(wanted.c.user_id, wanted.c.other_user_id, func.count())
+            .join(first, first.user_id == wanted.c.user_id)
+            .join(second, and_(second.user_id == wanted.c.other_user_id, second.neighbor_id == first.neighbor_id))
+            .group_by(wanted.c.user_id, wanted.c.other_user_id)
+        ))
+    return [counts.get(pair, 0) for pair in pairs]
+
+def backfill_adjacency(db: Session) -> int:
+    """
+    Populates user_adjacency from connections for databases created before
+    the table existed. Does nothing if the table already has rows. Duplicate
+    legacy edges keep only the connection with the lowest id.
+    Returns the number of adjacency rows written.
+    """
+    if db.query(models.UserAdjacency.user_id).first() is not None:
+        return 0
+
+    c = models.Connection
+    other = aliased(models.Connection)
+    canonical = select(c.user_id, c.connected_user_id, c.id).where(
+        c.user_id != c.connected_user_id,
+        ~select(other.id).where(
+            or_(
+                and_(other.user_id == c.user_id, other.connected_user_id == c.connected_user_id),
+                and_(other.user_id == c.connected_user_id, other.connected_user_id == c.user_id),
+            ),
+            other.id < c.id,
+        ).exists(),
+    )
+    columns = [models.UserAdjacency.user_id, models.UserAdjacency.neighbor_id, models.UserAdjacency.connection_id]
+    forward = db.execute(insert(models.UserAdjacency).from_select(columns, canonical))
+    reverse = db.execute(insert(models.UserAdjacency).from_select(
+        columns,
+        canonical.with_only_columns(c.connected_user_id, c.user_id, c.id),
+    ))
+    db.commit()
+    return forward.rowcount + reverse.rowcount
 
 
 def delete_user(db: Session, user_id: UUID):
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
-    if db_user:
-        db.delete(db_user)
-        db.commit()
-        return True
-    return False
+    """
+    Deletes a user together with every connection they are part of, in
+    either direction, and the matching adjacency rows. Everything runs as
+    set-based DELETEs in one transaction, along with the stats adjustment,
+    so no connection is ever loaded into the session however many the user
+    has. Returns False if the user does not exist.
+    """
+    neighbor_tags = _neighbor_tags(db, user_id, user_tag, CONNECTIONS_TAG)
+    # The foreign keys cascade as well; deleting explicitly also covers
+    # databases created before they did, or SQLite with enforcement off
+    # Both directions of every edge share the connection id
+    db.execute(
+        delete(models.UserAdjacency)
+        .where(models.UserAdjacency.connection_id.in_(
+            select(models.UserAdjacency.connection_id).where(models.UserAdjacency.user_id == user_id)
+        ))
+        .execution_options(synchronize_session=False)
+    )
+    removed_connections = db.execute(
+        delete(models.Connection)
+        .where(or_(models.Connection.user_id == user_id, models.Connection.connected_user_id == user_id))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.execute(delete(models.UserSearchTerm).where(models.UserSearchTerm.user_id == user_id))
+    if not db.execute(delete(models.User).where(models.User.id == user_id)).rowcount:
+        db.rollback()
+        return False
+    statistics_crud.apply_statistics_delta(db, users=-1, connections=-removed_connections)
+    db.commit()
+    graph_store.store.remove_user(user_id)
+    response_cache.cache.invalidate(
+        USERS_TAG,
+        STATS_TAG,
+        user_tag(user_id),
+        possible_tag(user_id),
+        *neighbor_tags,
+    )
+    return True
 
 def get_connection(db: Session, user_id_1: UUID, user_id_2: UUID):
-    # Check if there's a connection from user_id_1 to user_id_2 or from user_id_2 to user_id_1
-    db_connection = db.query(models.Connection).filter(
-        (models.Connection.user_id == user_id_1) & (models.Connection.connected_user_id == user_id_2) |
-        (models.Connection.user_id == user_id_2) & (models.Connection.connected_user_id == user_id_1)
+    if graph_store.store.is_connected(user_id_1, user_id_2) is False:
+        return None
+    # The adjacency table holds both directions, so one primary key lookup
+    # answers whether the two users are connected
+    db_connection = db.query(models.Connection).join(
+        models.UserAdjacency,
+        models.UserAdjacency.connection_id == models.Connection.id
+    ).filter(
+        models.UserAdjacency.user_id == user_id_1,
+        models.UserAdjacency.neighbor_id == user_id_2
     ).first()
     return db_connection
 
 def delete_connection(db: Session, user_id_1: UUID, user_id_2: UUID):
-    db_connection = db.query(models.Connection).filter(
-        models.Connection.user_id == user_id_1,
-        models.Connection.connected_user_id == user_id_2
-    ).first()
-    if db_connection:
-        db.delete(db_connection)
-        db.commit()
-        return True
-    return False
+    """
+    Deletes the connection between two users, whichever of them initiated it,
+    together with both of its adjacency rows.
+    """
+    connection_id = db.query(models.UserAdjacency.connection_id).filter(
+        models.UserAdjacency.user_id == user_id_1,
+        models.UserAdjacency.neighbor_id == user_id_2
+    ).scalar()
+    if connection_id is None:
+        return False
+    db.execute(delete(models.UserAdjacency).where(models.UserAdjacency.connection_id == connection_id))
+    db.execute(delete(models.Connection).where(models.Connection.id == connection_id))
+    statistics_crud.apply_statistics_delta(db, connections=-1)
+    db.commit()
+    graph_store.store.sync_edges(db, [(user_id_1, user_id_2)])
+    _invalidate_connection(db, user_id_1, user_id_2)
+    return True
 
 def modify_user(db: Session, user_id: UUID, updated_user: schemas.UserCreate):
     db_user = db.query(models.User).filter(models.User.id == user_id).first()
     if db_user:
         db_user.name = updated_user.name
+        _replace_search_terms(db, user_id, db_user.name, db_user.email)
         db.commit()
         db.refresh(db_user)
+        # The name also shows up in neighbor lists and possible connections
+        response_cache.cache.invalidate(
+            USERS_TAG,
+            user_tag(user_id),
+            *_neighbor_tags(db, user_id, user_tag, CONNECTIONS_TAG),
+        )
         return db_user
     return None
 
 
-def get_possible_users_to_connect(db: Session, user_id: UUID) -> List[models.User]:
-    # Query to fetch user IDs that the current user is already connected with as initiator
-    connected_user_ids_initiator = db.query(models.Connection.connected_user_id).filter(models.Connection.user_id == user_id).all()
-    connected_user_ids_initiator = {id[0] for id in connected_user_ids_initiator}  # Convert to set for O(1) lookup
+def _possible_users_query(db: Session, user_id: UUID, entities, limit: int, offset: int) -> list:
+    adjacency = models.UserAdjacency
+    first_hop = aliased(models.UserAdjacency)
+    second_hop = aliased(models.UserAdjacency)
+
+    def connected(column):
+        # Primary key probe on (user_id, neighbor_id)
+        return select(adjacency.user_id).where(adjacency.user_id == user_id, adjacency.neighbor_id == column).exists()
 
-    # Query to fetch user IDs that the current user is already connected with as receiver
-    connected_user_ids_receiver = db.query(models.Connection.user_id).filter(models.Connection.connected_user_id == user_id).all()
-    connected_user_ids_receiver = {id[0] for id in connected_user_ids_receiver}  # Convert to set for O(1) lookup
+    # Friends-of-friends ranked by mutual connections: only the two-hop
+    # neighborhood is grouped and sorted, never the whole users table
+    mutual_count = func.count().label("mutual_count")
+    ranked = select(second_hop.neighbor_id.label("candidate_id"), mutual_count).select_from(first_hop).join(
+        second_hop, second_hop.user_id == first_hop.neighbor_id
+    ).where(
+        first_hop.user_id == user_id,
+    ).group_by(second_hop.neighbor_id).having(
+        # Once per candidate rather than once per path to them
+        and_(second_hop.neighbor_id != user_id, ~connected(second_hop.neighbor_id))
+    )
+    page = ranked.order_by(mutual_count.desc(), second_hop.neighbor_id).limit(limit).offset(offset).subquery()
+    rows = db.query(*entities, page.c.mutual_count).join(
+        page, page.c.candidate_id == models.User.id
+    ).order_by(page.c.mutual_count.desc(), models.User.id).all()
+    if len(rows) == limit:
+        return rows
 
-    # Combine connected user IDs from both initiator and receiver perspectives
-    connected_user_ids = connected_user_ids_initiator.union(connected_user_ids_receiver)
+    # The rest of the page comes from the users without mutual connections,
+    # walked in id order along the primary key
+    skip = 0
+    if not rows:
+        skip = max(offset - db.scalar(select(func.count()).select_from(ranked.subquery())), 0)
+    friend_of_friend = select(second_hop.user_id).join(
+        first_hop, and_(first_hop.user_id == user_id, first_hop.neighbor_id == second_hop.user_id)
+    ).where(second_hop.neighbor_id == models.User.id).exists()
+    fill = db.query(*entities, literal(0).label("mutual_count")).filter(
+        models.User.id != user_id,
+        ~connected(models.User.id),
+        ~friend_of_friend,
+    ).order_by(models.User.id).offset(skip).limit(limit - len(rows)).all()
+    return rows + fill
 
-    # Fetch possible users to connect with
-    possible_users = db.query(models.User).filter(models.User.id != user_id, ~models.User.id.in_(connected_user_ids)).all()
+def _users_by_ids(db: Session, user_ids: List[UUID], entities, chunk_size: int = 500) -> list:
+    # Primary key lookups, a chunk of ids per query
+    result = []
+    for start in range(0, len(user_ids), chunk_size):
+        chunk = user_ids[start:start + chunk_size]
+        result.extend(db.query(*entities).filter(models.User.id.in_(chunk)).all())
+    return result
 
-    return possible_users
+# Shape of the rows returned by get_possible_user_rows
+PossibleUserRow = namedtuple("PossibleUserRow", ["id", "name", "email", "created_at", "mutual_count"])
 
+def _possible_users_from_store(db: Session, user_id: UUID, entities, limit: int, offset: int) -> Optional[list]:
+    # The graph store ranks the friends-of-friends in memory. Pages reaching
+    # past them, into the users without mutual connections, go to SQL.
+    ranked = graph_store.store.top_candidates(user_id, offset + limit)
+    if ranked is None or len(ranked) < offset + limit:
+        return None
+    page = ranked[offset:]
+    found = {row.id: row for row in _users_by_ids(db, [candidate for candidate, _ in page], entities)}
+    return [(found[candidate], count) for candidate, count in page if candidate in found]
+
+def get_possible_users_to_connect(db: Session, user_id: UUID, limit: int = 20, offset: int = 0) -> List[Tuple[models.User, int]]:
+    """
+    Returns up to `limit` users the given user is not connected with, paired
+    with how many connections they have in common. Friends-of-friends with
+    the most mutual connections come first, ties are broken by id.
+    The ranked page comes from a grouped two-hop join over the adjacency
+    table; only when it runs short are users without mutual connections
+    added, in id order along the primary key.
+    """
+    rows = _possible_users_from_store(db, user_id, (models.User,), limit, offset)
+    if rows is None:
+        rows = _possible_users_query(db, user_id, (models.User,), limit, offset)
+    return [(user, count) for user, count in rows]
+
+def get_possible_user_rows(db: Session, user_id: UUID, limit: int = 20, offset: int = 0) -> List[Row]:
+    """
+    Same as get_possible_users_to_connect, as USER_ROW_COLUMNS rows with an
+    extra `mutual_count` column.
+    """
+    ranked = _possible_users_from_store(db, user_id, USER_ROW_COLUMNS, limit, offset)
+    if ranked is not None:
+        return [PossibleUserRow(*row, count) for row, count in ranked]
+    return _possible_users_query(db, user_id, USER_ROW_COLUMNS, limit, offset)
@@ -1,17 +1,168 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
+import anyio
+from contextlib import nullcontext
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.orm import sessionmaker
+from typing import Dict, Optional
+from core.config import Settings, settings
+from db.replicas import PIN_COOKIE, ReadRouter
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./database.db"
+SQLALCHEMY_DATABASE_URL = settings.database_url
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+
+def _is_memory_sqlite(url) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+def engine_options(url: str, config: Settings = settings, is_async: bool = False) -> dict:
+    """
+    Keyword arguments for create_engine/create_async_engine built from the
+    pool and timeout settings.
+    """
+    parsed = make_url(url)
+    options = {}
+    connect_args = {}
+    if parsed.get_backend_name() == "sqlite":
+        if not is_async:
+            connect_args["check_same_thread"] = False
+        # busy_timeout is set by the connect hook; the driver-level timeout
+        # covers the window before it runs
+        connect_args["timeout"] = config.sqlite_busy_timeout_ms / 1000
+    elif parsed.get_backend_name() == "postgresql":
+        if parsed.get_driver_name() == "asyncpg":
+            connect_args["server_settings"] = {"statement_timeout": str(config.db_statement_timeout_ms)}
+        else:
+            connect_args["options"] = f"-c statement_timeout={config.db_statement_timeout_ms}"
+
+    # In-memory SQLite uses a single shared connection, pool sizing does not apply
+    if not _is_memory_sqlite(parsed):
+        options.update(
+            pool_size=config.db_pool_size,
+            max_overflow=config.db_max_overflow,
+            pool_timeout=config.db_pool_timeout,
+            pool_recycle=config.db_pool_recycle,
+        )
+    options["pool_pre_ping"] = config.db_pool_pre_ping
+    options["connect_args"] = connect_args
+    return options
+
+def install_sqlite_pragmas(engine, config: Settings = settings) -> None:
+    """
+    Applies the SQLite pragmas on every new DBAPI connection. WAL lets readers
+    run concurrently with the single writer instead of serializing everyone
+    on the rollback journal.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(f"PRAGMA busy_timeout={int(config.sqlite_busy_timeout_ms)}")
+            if not _is_memory_sqlite(engine.url):
+                cursor.execute(f"PRAGMA journal_mode={config.sqlite_journal_mode}")
+                cursor.execute(f"PRAGMA mmap_size={int(config.sqlite_mmap_size)}")
+            cursor.execute(f"PRAGMA synchronous={config.sqlite_synchronous}")
+            cursor.execute(f"PRAGMA cache_size={int(config.sqlite_cache_size)}")
+            cursor.execute(f"PRAGMA foreign_keys={'ON' if config.sqlite_foreign_keys else 'OFF'}")
+        finally:
+            cursor.close()
+
+def pool_capacity(url, config: Settings = settings) -> Optional[int]:
+    """
+    Number of connections the sync engine can hand out at once, or None when
+    it is not bounded (in-memory SQLite, or an unlimited overflow).
+    """
+    if _is_memory_sqlite(make_url(url)) or config.db_max_overflow < 0:
+        return None
+    return config.db_pool_size + config.db_max_overflow
+
+def build_engine(url: str = SQLALCHEMY_DATABASE_URL, config: Settings = settings):
+    engine = create_engine(url, **engine_options(url, config))
+    install_sqlite_pragmas(engine, config)
+    return engine
+
+
+engine = build_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-Base = declarative_base()
+# Read replicas (DATABASE_REPLICA_URLS), see db.replicas
+router = ReadRouter(
+    SessionLocal,
+    [sessionmaker(autocommit=False, autoflush=False, bind=build_engine(url)) for url in settings.database_replica_urls],
+    check_interval=settings.replica_check_interval_seconds,
+    pin_seconds=settings.read_your_writes_seconds,
+)
+
+def configure_read_router(new_router: ReadRouter) -> ReadRouter:
+    """Swaps the process-wide read router (used by tests). Returns the previous one."""
+    global router
+    previous, router = router, new_router
+    return previous
+
+# Sync routes run in the threadpool, and so does their response validation.
+# If requests waited for a pooled connection inside a worker thread, a burst
+# larger than the pool could block every worker on checkout while the
+# requests holding the connections wait for a worker to serialize their
+# response. Sessions are therefore only handed out while a connection is
+# free, and the waiting happens on the event loop. Each engine (primary and
+# replicas) has its own slots.
+_session_slots: Dict[Engine, anyio.Semaphore] = {}
+
+def _get_session_slots(bind: Engine):
+    capacity = pool_capacity(bind.url)
+    if bind not in _session_slots and capacity is not None:
+        _session_slots[bind] = anyio.Semaphore(capacity)
+    return _session_slots.get(bind)
+
+async def _session(factory: sessionmaker):
+    async with _get_session_slots(factory.kw["bind"]) or nullcontext():
+        db = factory()
+        try:
+            yield db
+        finally:
+            await run_in_threadpool(db.close)
+
+async def get_db():
+    """Session on the primary."""
+    async for db in _session(router.primary):
+        yield db
+
+async def get_write_db(request: Request):
+    """
+    Session on the primary for routes that write. A successful response
+    pins the client's reads to the primary for a while (see db.replicas).
+    """
+    request.state.db_write = True
+    async for db in _session(router.primary):
+        yield db
+
+async def get_read_db(request: Request):
+    """Session for routes that only read: a healthy replica, or the primary."""
+    if router.check_due():
+        await run_in_threadpool(router.check)
+    async for db in _session(router.choose(request.cookies.get(PIN_COOKIE))):
+        yield db
+
+
+# Async engine, only built when the async path is used so that the async
+# driver (aiosqlite for SQLite) stays an optional dependency
+_async_engine = None
+_AsyncSessionLocal = None
+
+def get_async_sessionmaker():
+    global _async_engine, _AsyncSessionLocal
+    if _AsyncSessionLocal is None:
+        from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+        url = settings.resolved_async_database_url()
+        _async_engine = create_async_engine(url, **engine_options(url, is_async=True))
+        install_sqlite_pragmas(_async_engine.sync_engine)
+        # Objects must stay readable after commit without an implicit (sync) refresh
+        _AsyncSessionLocal = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+    return _AsyncSessionLocal
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_async_db():
+    async with get_async_sessionmaker()() as db:
         yield db
-    finally:
-        db.close()
@@ -0,0 +1,145 @@
+"""
+Idempotent schema steps that bring an existing database up to date with the
+models. `create_all` only creates missing tables, so indexes added to a
+table that already exists, and data written in an older format, are
+handled here. Every step can run again safely.
+
+They run in the application's lifespan hook (MIGRATE_ON_STARTUP) or
+explicitly with `python -m scripts.migrate`. With MIGRATE_ON_STARTUP off,
+the application only checks that the schema exists (check_schema).
+"""
+from typing import List
+
+from sqlalchemy import delete, inspect, or_, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+import models.models as models
+from db.uuid_storage import legacy_uuid_columns
+
+# Rows written through the server default (CURRENT_TIMESTAMP) have second
+# precision, rows written by the application have microseconds. SQLite
+# compares the stored text, so both have to use the same format for the
+# (created_at, id) keyset to work.
+_SQLITE_TIMESTAMP_LENGTH = len("2024-01-01 10:00:00")
+
+
+def ensure_indexes(connection: Connection) -> None:
+    """Creates every index declared on the models that is missing."""
+    for table in models.Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+def normalize_timestamps(connection: Connection) -> int:
+    """
+    Rewrites second-precision users.created_at values in the format the
+    application stores (with microseconds). Only needed on SQLite, where
+    timestamps are text. Returns the number of rows changed.
+    """
+    if connection.dialect.name != "sqlite":
+        return 0
+    result = connection.execute(
+        text("UPDATE users SET created_at = created_at || '.000000' WHERE length(created_at) = :length"),
+        {"length": _SQLITE_TIMESTAMP_LENGTH},
+    )
+    return result.rowcount
+
+def delete_orphaned_connections(connection: Connection) -> int:
+    """
+    Deletes the connections, and their adjacency rows, that point at a user
+    who no longer exists. Older versions deleted users without their
+    connections; with foreign keys enforced, those rows would make the
+    adjacency backfill fail, and they inflate the statistics. Returns the
+    number of connections deleted.
+    """
+    user = models.User
+    c = models.Connection
+    adjacency = models.UserAdjacency
+
+    def missing(user_id):
+        return ~select(user.id).where(user.id == user_id).exists()
+
+    result = connection.execute(delete(c).where(or_(missing(c.user_id), missing(c.connected_user_id))))
+    # Leftovers of the rows above, when foreign keys were not enforced
+    connection.execute(delete(adjacency).where(or_(
+        missing(adjacency.user_id),
+        missing(adjacency.neighbor_id),
+        ~select(c.id).where(c.id == adjacency.connection_id).exists(),
+    )))
+    return result.rowcount
+
+def ensure_search_term_collation(connection: Connection) -> bool:
+    """
+    Switches user_search_terms.term to the "C" collation on PostgreSQL
+    databases that created it with the default one, under which the prefix
+    ranges of the search are not prefix matches. Rebuilds the primary key
+    index. Returns whether the column was changed.
+    """
+    if connection.dialect.name != "postgresql":
+        return False
+    collation = connection.execute(text(
+        "SELECT collation_name FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = 'user_search_terms' AND column_name = 'term'"
+    )).scalar()
+    if collation == "C":
+        return False
+    connection.execute(text('ALTER TABLE user_search_terms ALTER COLUMN term TYPE VARCHAR COLLATE "C"'))
+    return True
+
+def missing_tables(engine: Engine) -> List[str]:
+    """Tables declared on the models that the database does not have."""
+    existing = set(inspect(engine).get_table_names())
+    return [table.name for table in models.Base.metadata.sorted_tables if table.name not in existing]
+
+def check_uuid_storage(engine: Engine) -> None:
+    """
+    Refuses SQLite databases that still store ids as hex text: the models
+    write 16-byte ids, which would never match the stored ones. Converting
+    rewrites the whole file, so it is a separate step.
+    """
+    legacy = legacy_uuid_columns(engine)
+    if legacy:
+        raise RuntimeError(
+            f"Database stores ids as text ({', '.join(legacy[:3])}{', ...' if len(legacy) > 3 else ''}). "
+            "Stop the application and run `python -m scripts.convert_uuids --replace`."
+        )
+
+def check_schema(engine: Engine) -> None:
+    """
+    Fails fast when the database was never migrated. A couple of catalog
+    queries, cheap enough for every worker's startup; indexes and data
+    upgrades are left to run_migrations.
+    """
+    missing = missing_tables(engine)
+    if missing:
+        raise RuntimeError(
+            f"Database schema is out of date (missing tables: {', '.join(missing)}). "
+            "Run `python -m scripts.migrate` or set MIGRATE_ON_STARTUP=1."
+        )
+    check_uuid_storage(engine)
+
+def run_migrations(engine: Engine) -> None:
+    # Imported here: the CRUD layer pulls in the caches and the graph store
+    from crud.statistics_crud import rebuild_rollups, reconcile_statistics, seed_summary
+    from crud.user_crud import backfill_adjacency, backfill_search_terms
+
+    check_uuid_storage(engine)
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        ensure_indexes(connection)
+        normalize_timestamps(connection)
+        ensure_search_term_collation(connection)
+        orphans = delete_orphaned_connections(connection)
+    # Only after the indexes exist: the backfill looks up every connection's
+    # duplicates through ix_connections_user_id_connected_user_id
+    with Session(bind=engine) as db:
+        backfill_adjacency(db)
+        backfill_search_terms(db)
+        if orphans:
+            reconcile_statistics(db)
+        # Seeded here once, so reading the statistics never has to write
+        seed_summary(db)
+        db.commit()
+        # Databases from before stats_rollup existed get their history once
+        if db.query(models.StatsRollup.bucket).first() is None:
+            rebuild_rollups(db)
@@ -0,0 +1,143 @@
+"""
+Read/write session routing (DATABASE_REPLICA_URLS).
+
+Routes that only read take their session from `db.database.get_read_db`,
+routes that write from `get_write_db`. Reads go to a healthy replica,
+round robin, and to the primary when:
+
+- no replica is configured or none is healthy. Replicas are checked with
+  `SELECT 1` every REPLICA_CHECK_INTERVAL_SECONDS, and taken out as soon as
+  one of their queries fails to reach the database;
+- the client wrote within the last READ_YOUR_WRITES_SECONDS. A successful
+  request that used a write session gets a cookie pinning the client's
+  reads to the primary for that long, so it sees its own write whatever the
+  replication lag. The cookie carries a timestamp, so the pin holds across
+  workers. Pinned clients also skip the response cache, whose entries may
+  have been loaded from a replica (core.cache.get_cache). Browsers on
+  another origin only send the cookie back with credentialed requests
+  (`withCredentials` in the frontend).
+"""
+import itertools
+import threading
+import time
+from typing import Callable, Dict, Optional, Sequence
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+
+# Cookie holding the time (seconds since the epoch) until which reads go to the primary
+PIN_COOKIE = "db_pin_until"
+
+
+class ReadRouter:
+    """Picks the session factory for a read: one of the replicas, or the primary."""
+
+    def __init__(
+        self,
+        primary: sessionmaker,
+        replicas: Sequence[sessionmaker] = (),
+        check_interval: float = 5.0,
+        pin_seconds: float = 5.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.check_interval = check_interval
+        self.pin_seconds = pin_seconds
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._healthy: Dict[int, bool] = {index: True for index in range(len(self.replicas))}
+        self._next_check = clock() + check_interval
+        self._turn = itertools.count()
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self.pinned_reads = 0
+        for index, replica in enumerate(self.replicas):
+            self._watch(index, replica.kw["bind"])
+
+    def _watch(self, index: int, engine: Engine) -> None:
+        # A replica whose connection drops is out until the next check, not
+        # after failing requests for the rest of the interval
+        @event.listens_for(engine, "handle_error")
+        def _on_error(context):
+            if context.is_disconnect or context.connection is None:
+                self._healthy[index] = False
+
+    def check_due(self) -> bool:
+        return bool(self.replicas) and self.clock() >= self._next_check
+
+    def check(self) -> None:
+        """Probes every replica with SELECT 1. Blocking; run it off the event loop."""
+        with self._lock:
+            if self.clock() < self._next_check:
+                return
+            self._next_check = self.clock() + self.check_interval
+        for index, replica in enumerate(self.replicas):
+            try:
+                with replica.kw["bind"].connect() as connection:
+                    connection.execute(text("SELECT 1"))
+                self._healthy[index] = True
+            except Exception:
+                self._healthy[index] = False
+
+    def is_pinned(self, pin_cookie: Optional[str]) -> bool:
+        if not pin_cookie:
+            return False
+        try:
+            pinned_until = float(pin_cookie)
+        except ValueError:
+            return False
+        now = time.time()
+        # A forged far-future value pins for one window at most
+        return now < pinned_until <= now + self.pin_seconds
+
+    def pins(self, pin_cookie: Optional[str]) -> bool:
+        """Whether this client's reads are held on the primary instead of the replicas."""
+        return bool(self.replicas) and self.is_pinned(pin_cookie)
+
+    def choose(self, pin_cookie: Optional[str] = None) -> sessionmaker:
+        if not self.replicas:
+            return self.primary
+        if self.is_pinned(pin_cookie):
+            self.pinned_reads += 1
+            return self.primary
+        healthy = [index for index in range(len(self.replicas)) if self._healthy[index]]
+        if not healthy:
+            self.primary_reads += 1
+            return self.primary
+        self.replica_reads += 1
+        return self.replicas[healthy[next(self._turn) % len(healthy)]]
+
+    def metrics(self) -> dict:
+        return {
+            "replicas": len(self.replicas),
+            "healthy": sum(self._healthy.values()),
+            "replica_reads": self.replica_reads,
+            "primary_reads": self.primary_reads,
+            "pinned_reads": self.pinned_reads,
+        }
+
+
+class ReadYourWritesMiddleware:
+    """
+    Pure ASGI middleware setting PIN_COOKIE on successful responses to
+    requests that took a write session (get_write_db marks them in
+    request.state).
+    """
+    def __init__(self, app, pin_seconds: float = 5.0):
+        self.app = app
+        self.pin_seconds = pin_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and message["status"] < 400 and scope.get("state", {}).get("db_write"):
+                cookie = f"{PIN_COOKIE}={time.time() + self.pin_seconds:.3f}; Max-Age={max(1, round(self.pin_seconds))}; Path=/; HttpOnly; SameSite=Lax"
+                message = {**message, "headers": [*message.get("headers", []), (b"set-cookie", cookie.encode())]}
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,114 @@
+"""
+Conversion between the two ways ids have been stored on SQLite: 32-character
+hex text (before models.types.GUID) and 16-byte BLOBs (GUID).
+
+A BLOB key is half the size of the text one, and every edge row carries
+three of them plus one per index entry, so converting shrinks the file and
+lets more of the tables and indexes stay in the page cache. SQLite cannot
+change a column's type in place, so the conversion copies every table into
+a new file, streaming `batch_size` rows at a time. It is run with
+`python -m scripts.convert_uuids` while the application is stopped.
+
+PostgreSQL always used its native uuid type and needs none of this.
+"""
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from sqlalchemy import MetaData, create_engine, inspect, insert, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateTable
+
+import models.models as models
+from models.types import GUID, LegacyUUID
+
+# Declared type of a GUID column in SQLite DDL
+_SQLITE_GUID_TYPE = "BLOB"
+
+
+def legacy_uuid_columns(engine: Engine) -> List[str]:
+    """
+    "table.column" for every id column of an SQLite database that is still
+    declared as text (created before GUID). Empty for up-to-date databases,
+    missing tables and other backends.
+    """
+    if engine.dialect.name != "sqlite":
+        return []
+    legacy = []
+    inspector = inspect(engine)
+    existing = set(inspector.get_table_names())
+    with engine.connect() as connection:
+        for table in models.Base.metadata.sorted_tables:
+            if table.name not in existing:
+                continue
+            declared = {row[1]: row[2].upper() for row in connection.exec_driver_sql(f"PRAGMA table_info({table.name})")}
+            legacy.extend(
+                f"{table.name}.{column.name}"
+                for column in table.columns
+                if isinstance(column.type, GUID) and declared.get(column.name, _SQLITE_GUID_TYPE) != _SQLITE_GUID_TYPE
+            )
+    return legacy
+
+def legacy_metadata() -> MetaData:
+    """The models' tables with the id columns typed as they used to be stored."""
+    metadata = MetaData()
+    for table in models.Base.metadata.sorted_tables:
+        copy = table.to_metadata(metadata)
+        for column in copy.columns:
+            if isinstance(column.type, GUID):
+                column.type = LegacyUUID()
+    return metadata
+
+def copy_tables(source: Engine, source_metadata: MetaData, target: Engine, target_metadata: MetaData, batch_size: int = 5000) -> Dict[str, Tuple[int, int]]:
+    """
+    Creates the target schema in an empty database and copies every table
+    of the source into it, parents before children, `batch_size` rows per
+    read and per INSERT. Rows whose key or foreign key could not be read
+    back as an id (see LegacyUUID) are skipped. Returns
+    {table: (copied, skipped)}.
+    """
+    existing = set(inspect(source).get_table_names())
+    counts = {}
+    with source.connect() as reader, target.begin() as writer:
+        # Indexes are built once the rows are in, which is much faster than
+        # maintaining them row by row
+        for table in target_metadata.sorted_tables:
+            writer.execute(CreateTable(table))
+        for table in source_metadata.sorted_tables:
+            if table.name not in existing:
+                continue
+            target_table = target_metadata.tables[table.name]
+            required = [
+                column.name for column in table.columns
+                if isinstance(column.type, (GUID, LegacyUUID)) and (column.primary_key or column.foreign_keys or not column.nullable)
+            ]
+            copied = skipped = 0
+            result = reader.execute(select(table).execution_options(yield_per=batch_size))
+            for rows in result.mappings().partitions():
+                batch = [row for row in rows if all(row[name] is not None for name in required)]
+                skipped += len(rows) - len(batch)
+                if batch:
+                    writer.execute(insert(target_table), batch)
+                    copied += len(batch)
+            counts[table.name] = (copied, skipped)
+        for table in target_metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(writer)
+    return counts
+
+def convert_database(source_path: Path, target_path: Path, batch_size: int = 5000, to_legacy: bool = False) -> Dict[str, Tuple[int, int]]:
+    """
+    Writes a copy of the SQLite database at `source_path` with 16-byte ids
+    to `target_path` (which must not exist). `to_legacy` converts the other
+    way, back to hex text. Same return value as copy_tables.
+    """
+    if target_path.exists():
+        raise FileExistsError(f"{target_path} already exists.")
+    source = create_engine(f"sqlite:///{source_path}")
+    target = create_engine(f"sqlite:///{target_path}")
+    try:
+        if to_legacy:
+            return copy_tables(source, models.Base.metadata, target, legacy_metadata(), batch_size)
+        return copy_tables(source, legacy_metadata(), target, models.Base.metadata, batch_size)
+    finally:
+        source.dispose()
+        target.dispose()
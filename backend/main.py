@@ -1,27 +1,100 @@
-from fastapi import FastAPI, Depends, HTTPException
-from sqlalchemy.orm import Session
-import crud  # Import the CRUD operations
-import backend.models.models as models
-import schemas
-from db.database import engine, get_db
-from typing import List
+"""
+Application entry point.
+
+`create_app` builds the FastAPI application; `app` is the instance uvicorn
+serves (`uvicorn main:app`). Nothing here touches the database at import
+time: schema work happens in the lifespan hook, before the first request,
+or ahead of the deploy with `python -m scripts.migrate`.
+
+Production (one migration run, then several workers):
+    python -m scripts.migrate
+    MIGRATE_ON_STARTUP=0 CACHE_BACKEND=redis CACHE_URL=redis://cache:6379/0 \
+        uvicorn main:app --host 0.0.0.0 --workers 4 --loop uvloop --http httptools
+
+Several workers need CACHE_BACKEND=redis, or none. The default in-process
+cache keeps its invalidation state per process: a write handled by one
+worker would not invalidate the others, which would keep serving (and
+answering 304 for) stale users, connections and stats for up to
+CACHE_TTL_SECONDS. The Docker image runs one worker unless WEB_CONCURRENCY
+says otherwise.
+"""
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from routes.users import router as user_router
+from fastapi.middleware.gzip import GZipMiddleware
+from sqlalchemy.engine import Engine
+
+from core.config import Settings, settings
+from core.graph_store import load_graph_store
+from core.metrics import MetricsMiddleware, instrument_engine
+from core.write_queue import start_write_queue, stop_write_queue
+from db.database import SessionLocal, engine
+from db.migrations import check_schema, run_migrations
+from db.replicas import ReadYourWritesMiddleware
+from routes.export import router as export_router
 from routes.stats import router as stats_router
+from routes.users import router as user_router
+
+
+def create_app(config: Settings = settings, db_engine: Engine = engine, session_factory=SessionLocal) -> FastAPI:
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        # Schema upgrades (missing tables and indexes, the adjacency backfill)
+        # run once per process before serving. Multi-worker deployments run
+        # `python -m scripts.migrate` instead and only check the schema here
+        if config.migrate_on_startup:
+            await run_in_threadpool(run_migrations, db_engine)
+        else:
+            await run_in_threadpool(check_schema, db_engine)
+        # Streams the connections into the graph store before serving, when enabled
+        await run_in_threadpool(load_graph_store, session_factory)
+        # Applies what the previous run left in the journal, then takes new writes (WRITE_BEHIND_ENABLED)
+        start_write_queue(session_factory, config)
+        yield
+        # Journals and applies the writes still queued
+        await run_in_threadpool(stop_write_queue)
+
+    app = FastAPI(lifespan=lifespan)
+
+    # Set up CORS middleware
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],  # Allows all origins
+        allow_credentials=True,
+        allow_methods=["*"],  # Allows all methods
+        allow_headers=["*"],  # Allows all headers
+        expose_headers=["X-Next-Cursor", "ETag"],  # Lets the frontend read the pagination cursor and the validator
+    )
+
+    if config.database_replica_urls:
+        # Keeps a client's reads on the primary for a moment after it wrote
+        app.add_middleware(ReadYourWritesMiddleware, pin_seconds=config.read_your_writes_seconds)
+
+    if config.gzip_enabled:
+        # Small bodies are sent as is; compressing them costs more than it saves
+        app.add_middleware(GZipMiddleware, minimum_size=config.gzip_minimum_size)
 
+    # Optional parts are only imported when enabled
+    if config.metrics_enabled:
+        # Registered on the Engine class so the lazily created async engine is covered too
+        instrument_engine(Engine)
+        app.add_middleware(MetricsMiddleware, profiling=config.profiling_enabled)
+        from routes.metrics import router as metrics_router
+        app.include_router(metrics_router)
 
-models.Base.metadata.create_all(bind=engine)
+    if config.db_async:
+        # Included first so their async handlers take precedence on shared paths
+        from routes.async_users import router as async_user_router
+        from routes.async_stats import router as async_stats_router
+        app.include_router(async_user_router)
+        app.include_router(async_stats_router)
 
-app = FastAPI()
+    app.include_router(user_router)
+    app.include_router(stats_router)
+    app.include_router(export_router)
+    return app
 
-# Set up CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # Allows all origins
-    allow_credentials=True,
-    allow_methods=["*"],  # Allows all methods
-    allow_headers=["*"],  # Allows all headers
-)
 
-app.include_router(user_router)
-app.include_router(stats_router)  # Include the stats router
+app = create_app()
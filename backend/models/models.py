@@ -1,31 +1,142 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, create_engine, UniqueConstraint
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, create_engine, UniqueConstraint, Index
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
 from sqlalchemy.sql import func
-from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy import event
 
+from models.types import GUID
+
 import uuid
+from datetime import datetime, timezone
 
 
 Base = declarative_base()
 
 class User(Base):
     __tablename__ = 'users'
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
+    id = Column(GUID(), primary_key=True, default=uuid.uuid4, index=True)
     name = Column(String, index=True, nullable=False)
     email = Column(String, index=True, unique=True, nullable=False)  
-    created_at = Column(DateTime(timezone=True), server_default=func.now())  
+    # Python-side default so every row is stored with the same precision; keyset
+    # pagination compares against this column and needs a consistent format.
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), server_default=func.now())  
+    # Edges go away with the user through ON DELETE CASCADE (and the bulk
+    # deletes in user_crud.delete_user), never by loading them one by one
     connections = relationship("Connection", 
                                foreign_keys="Connection.user_id", 
-                               back_populates="owner")
+                               back_populates="owner",
+                               passive_deletes=True)
+
+    __table_args__ = (
+        # Backs the (created_at, id) keyset used to page through users
+        Index('ix_users_created_at_id', 'created_at', 'id'),
+    )
 
 class Connection(Base):
     __tablename__ = 'connections'
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
-    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'))
-    connected_user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'))
-    connection_made_at = Column(DateTime(timezone=True), server_default=func.now())  
+    id = Column(GUID(), primary_key=True, default=uuid.uuid4, index=True)
+    user_id = Column(GUID(), ForeignKey('users.id', ondelete='CASCADE'))
+    connected_user_id = Column(GUID(), ForeignKey('users.id', ondelete='CASCADE'))
+    connection_made_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)  
     owner = relationship("User", 
                          foreign_keys=[user_id], 
                          back_populates="connections")
+
+    __table_args__ = (
+        Index('ix_connections_user_id_connected_user_id', 'user_id', 'connected_user_id'),
+        # Lets deleting a user find the connections others made to them
+        Index('ix_connections_connected_user_id', 'connected_user_id'),
+    )
+
+class UserAdjacency(Base):
+    """
+    Materialized, symmetric view of `connections`: every connection between
+    A and B is stored as both (A, B) and (B, A). The composite primary key
+    turns neighbor lookups and membership checks into a single index scan and
+    makes the database reject duplicate edges in either direction.
+    """
+    __tablename__ = 'user_adjacency'
+    user_id = Column(GUID(), ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    neighbor_id = Column(GUID(), ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    connection_id = Column(GUID(), ForeignKey('connections.id', ondelete='CASCADE'), nullable=False, index=True)
+
+    __table_args__ = (
+        # The primary key covers user_id; deleting a user also has to find
+        # (or, with foreign keys enforced, check) the rows pointing at them
+        Index('ix_user_adjacency_neighbor_id', 'neighbor_id'),
+    )
+
+class UserSearchTerm(Base):
+    """
+    Lowercased words of every user's name and email (see
+    user_crud.search_terms), kept in sync by the user CRUD functions. The
+    primary key orders the terms, so a prefix search is one index range scan
+    that stops after a page of matches however many users there are.
+    Prefix ranges only hold under byte order: SQLite's default BINARY
+    collation, and "C" on PostgreSQL, whose default collations sort by
+    language rules.
+    """
+    __tablename__ = 'user_search_terms'
+    term = Column(String().with_variant(String(collation="C"), "postgresql"), primary_key=True)
+    user_id = Column(GUID(), ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+
+    __table_args__ = (
+        # Replacing a user's terms, and checking the other words of a
+        # multi-word query against a candidate, look up by user
+        Index('ix_user_search_terms_user_id_term', 'user_id', 'term'),
+    )
+
+class StatsSummary(Base):
+    """
+    Single-row table with the running totals behind /stats. The CRUD write
+    functions update it in the same transaction as the change they make, so
+    reading statistics never has to scan users or connections.
+    """
+    __tablename__ = 'stats_summary'
+    id = Column(Integer, primary_key=True, default=1)
+    user_count = Column(Integer, nullable=False, default=0)
+    connection_count = Column(Integer, nullable=False, default=0)
+    last_connection_at = Column(DateTime(timezone=True))
+
+class StatsRollup(Base):
+    """
+    New users and new connections per time bucket ("hour" or "day", starting
+    on UTC boundaries). The CRUD create functions add to the current bucket
+    in the same transaction as the write, so /stats/timeseries reads a range
+    of primary key entries instead of scanning users and connections.
+    Deletes do not take anything back: a bucket counts what was created in
+    it.
+    """
+    __tablename__ = 'stats_rollup'
+    bucket = Column(String, primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    new_users = Column(Integer, nullable=False, default=0)
+    new_connections = Column(Integer, nullable=False, default=0)
+
+class ConnectionOperation(Base):
+    """
+    Journal of the connection creates and deletes accepted in write-behind
+    mode (core.write_queue). A request is acknowledged once its row is
+    committed here; the queue worker applies pending rows in order, in
+    batches, and records the outcome on the row.
+    """
+    __tablename__ = 'connection_operations'
+    # Application order
+    seq = Column(Integer, primary_key=True, autoincrement=True)
+    id = Column(GUID(), unique=True, nullable=False, default=uuid.uuid4)
+    # Client-supplied Idempotency-Key; a retried request gets the first operation back
+    idempotency_key = Column(String, unique=True)
+    kind = Column(String, nullable=False)
+    # Not foreign keys: the journal outlives the users it mentions
+    user_id = Column(GUID(), nullable=False)
+    connected_user_id = Column(GUID(), nullable=False)
+    status = Column(String, nullable=False, default="pending")
+    detail = Column(String)
+    # Marks the rows a worker took in its current transaction
+    claim = Column(String)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    applied_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        Index('ix_connection_operations_status_seq', 'status', 'seq'),
+    )
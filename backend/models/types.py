@@ -0,0 +1,71 @@
+"""
+Column types shared by the models.
+"""
+import uuid
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.types import LargeBinary, TypeDecorator, UserDefinedType
+
+
+class GUID(TypeDecorator):
+    """
+    UUID column stored compactly on every backend: the native 16-byte uuid
+    type on PostgreSQL, a 16-byte BLOB elsewhere (SQLite). Values go in and
+    come out as uuid.UUID, so the models and schemas never see the storage
+    format.
+
+    Databases created before this type stored ids as 32-character hex text;
+    `python -m scripts.convert_uuids` rewrites them (see db.uuid_storage).
+    """
+    impl = LargeBinary(16)
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "postgresql":
+            return dialect.type_descriptor(postgresql.UUID(as_uuid=True))
+        return dialect.type_descriptor(LargeBinary(16))
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if not isinstance(value, uuid.UUID):
+            value = uuid.UUID(str(value))
+        return value if dialect.name == "postgresql" else value.bytes
+
+    def process_result_value(self, value, dialect):
+        if value is None or isinstance(value, uuid.UUID):
+            return value
+        return uuid.UUID(bytes=bytes(value))
+
+
+class _LegacyUUIDColumn(UserDefinedType):
+    # Declared as "UUID", which SQLite gives numeric affinity, without any
+    # conversion of its own
+    cache_ok = True
+
+    def get_col_spec(self, **kw):
+        return "UUID"
+
+
+class LegacyUUID(TypeDecorator):
+    """
+    How ids were stored before GUID: 32 hex characters in a column declared
+    "UUID". Only used to read and write databases in that format (see
+    db.uuid_storage). SQLite turned the text of ids made only of digits and
+    one "e" into numbers; those cannot be recovered and read as None.
+    """
+    impl = _LegacyUUIDColumn
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return (value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))).hex
+
+    def process_result_value(self, value, dialect):
+        if not isinstance(value, str):
+            return None
+        try:
+            return uuid.UUID(value)
+        except ValueError:
+            return None
@@ -0,0 +1,38 @@
+"""
+async def version of routes.stats, used when DB_ASYNC is on.
+"""
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+import crud.async_statistics_crud as crud
+import schemas
+from db.database import get_async_db
+from core.metrics import ProfiledRoute
+from core.cache import ResponseCache, STATS_TAG, get_cache
+from core.conditional import not_modified, validator_headers
+
+router = APIRouter(
+    prefix="/stats",
+    tags=["stats"],
+    route_class=ProfiledRoute,
+)
+
+@router.get("/", response_model=schemas.Stats)
+async def get_stats(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    cache: ResponseCache = Depends(get_cache),
+):
+    etag = cache.etag("stats", [STATS_TAG])
+    unchanged = not_modified(request, etag)
+    if unchanged:
+        return unchanged
+    response.headers.update(validator_headers(etag))
+
+    async def load():
+        return schemas.Stats(**await crud.get_statistics(db)).model_dump(mode="json")
+
+    try:
+        return await cache.aget_or_load("stats", [STATS_TAG], load)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Failed to retrieve statistics")
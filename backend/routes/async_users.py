@@ -0,0 +1,253 @@
+"""
+async def versions of the routes in routes.users, used when DB_ASYNC is on.
+
+This router is included ahead of the sync one, so it takes over the paths it
+defines; anything it does not define keeps being served by routes.users.
+"""
+import asyncio
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+import crud.async_user_crud as crud
+import crud.operation_crud as operation_crud
+import schemas
+from db.database import get_async_db
+from core.metrics import ProfiledRoute
+from core.cache import ResponseCache, CONNECTIONS_TAG, USERS_TAG, get_cache, possible_tag, user_tag
+from core.conditional import not_modified, validator_headers
+from core.serialization import FastJSONResponse, dumps, possible_row_to_json, user_row_to_json
+from core.write_queue import WriteQueue, get_write_queue
+from routes.users import NDJSON_MEDIA_TYPE, operation_accepted
+from typing import List, Optional
+from uuid import UUID
+
+router = APIRouter(
+    prefix="/users",
+    tags=["users"],
+    route_class=ProfiledRoute,
+)
+
+
+@router.post("/", response_model=schemas.User)
+async def create_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
+    # Manual validation for name
+    if not user.name or not user.name.strip():
+        raise HTTPException(status_code=400, detail="Username cannot be empty.")
+
+    # Manual validation for email
+    if not user.email or not user.email.strip():
+        raise HTTPException(status_code=400, detail="Email cannot be empty.")
+    if '@' not in user.email:
+        raise HTTPException(status_code=400, detail="Invalid email address.")
+
+    # Check if an email already exists
+    existing_user = await crud.get_user_by_email(db=db, email=user.email)
+    if existing_user:
+        raise HTTPException(status_code=400, detail="Email is already in use.")
+
+    try:
+        db_user = await crud.create_user(db=db, user=user)
+        return {"id": db_user.id, "name": db_user.name, "email": db_user.email}
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail="Could not create the user.")
+
+
+@router.get("/", response_model=List[schemas.User])
+async def get_users(
+    request: Request,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    cache: ResponseCache = Depends(get_cache),
+):
+    if NDJSON_MEDIA_TYPE in request.headers.get("accept", ""):
+        return StreamingResponse(_stream_users(db), media_type=NDJSON_MEDIA_TYPE)
+
+    etag = cache.etag(f"users:{limit}:{cursor}", [USERS_TAG])
+    unchanged = not_modified(request, etag)
+    if unchanged:
+        return unchanged
+    try:
+        rows, next_cursor = await crud.get_user_rows_page(db=db, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Could not retrieve users.")
+    headers = validator_headers(etag)
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    return FastJSONResponse([user_row_to_json(row) for row in rows], headers=headers)
+
+
+async def _stream_users(db: AsyncSession):
+    async with AsyncSession(bind=db.bind) as stream_db:
+        async for row in crud.iter_users(stream_db):
+            yield dumps(user_row_to_json(row)) + b"\n"
+
+
+# Declared before /{user_id}, which would otherwise take the path
+@router.get("/search", response_model=List[schemas.User])
+async def search_users(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    try:
+        rows, next_cursor = await crud.search_user_rows(db=db, query=q, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Could not search users.")
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return FastJSONResponse([user_row_to_json(row) for row in rows], headers=headers)
+
+
+@router.get("/{user_id}", response_model=schemas.UserDetail)
+async def read_user(user_id: UUID, db: AsyncSession = Depends(get_async_db), cache: ResponseCache = Depends(get_cache)):
+    async def load():
+        user = await crud.get_user_by_id(db=db, user_id=user_id)
+        if not user:
+            return None
+        detail = schemas.UserDetail.model_validate(user)
+        detail.connection_count = await crud.get_degree(db=db, user_id=user_id)
+        return detail.model_dump(mode="json")
+
+    user = await cache.aget_or_load(f"user:{user_id}", [user_tag(user_id), CONNECTIONS_TAG], load)
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
+
+
+async def _enqueue(queue: WriteQueue, kind: str, user_id_1: UUID, user_id_2: UUID, idempotency_key: Optional[str]):
+    try:
+        operation_id = await asyncio.wrap_future(queue.submit(kind, user_id_1, user_id_2, idempotency_key))
+    except Exception as e:
+        raise HTTPException(status_code=503, detail="Could not queue the operation.")
+    return operation_accepted(operation_id)
+
+
+@router.post("/connect", response_model=schemas.Connection, responses={202: {"model": schemas.OperationAccepted}})
+async def create_connection(
+    connection_create: schemas.ConnectionCreate,
+    db: AsyncSession = Depends(get_async_db),
+    queue: Optional[WriteQueue] = Depends(get_write_queue),
+    idempotency_key: Optional[str] = Header(None),
+):
+    user_id_1 = connection_create.user_id
+    user_id_2 = connection_create.connected_user_id
+
+    # Check if both users exist
+    if not await crud.get_user_by_id(db=db, user_id=user_id_1):
+        raise HTTPException(status_code=404, detail=f"User with id {user_id_1} does not exist.")
+    if not await crud.get_user_by_id(db=db, user_id=user_id_2):
+        raise HTTPException(status_code=404, detail=f"User with id {user_id_2} does not exist.")
+
+    if user_id_1 == user_id_2:
+        raise HTTPException(status_code=400, detail="A user cannot connect to themselves.")
+
+    if queue is not None:
+        if await crud.get_connection(db=db, user_id_1=user_id_1, user_id_2=user_id_2):
+            raise HTTPException(status_code=400, detail="Connection already exists between these users.")
+        return await _enqueue(queue, operation_crud.CREATE, user_id_1, user_id_2, idempotency_key)
+
+    try:
+        return await crud.create_connection(db=db, user_id_1=user_id_1, user_id_2=user_id_2)
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Connection already exists between these users.")
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Could not create the connection. Error: {e}")
+
+
+@router.get("/{user_id}/connections", response_model=List[schemas.User])
+async def read_user_connections(
+    user_id: UUID,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    cache: ResponseCache = Depends(get_cache),
+):
+    tags = [user_tag(user_id), CONNECTIONS_TAG]
+    etag = cache.etag(f"connections:{user_id}", tags)
+    unchanged = not_modified(request, etag)
+    if unchanged:
+        return unchanged
+
+    async def load():
+        return [user_row_to_json(row) for row in await crud.get_user_connection_rows(user_id=user_id, db=db)]
+
+    return FastJSONResponse(await cache.aget_or_load(f"connections:{user_id}", tags, load), headers=validator_headers(etag))
+
+
+@router.delete("/{user_id}")
+async def delete_user(user_id: UUID, db: AsyncSession = Depends(get_async_db)):
+    try:
+        result = await crud.delete_user(db=db, user_id=user_id)
+    except Exception:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail="Could not delete the user.")
+    if not result:
+        raise HTTPException(status_code=404, detail="User not found")
+    return {"message": "User deleted successfully"}
+
+
+@router.put("/{user_id}")
+async def modify_user(user_id: UUID, user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
+    try:
+        updated_user = await crud.modify_user(db=db, user_id=user_id, updated_user=user)
+    except Exception:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail="Could not update the user.")
+    if not updated_user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return {"id": updated_user.id, "name": updated_user.name}
+
+
+@router.get("/{user_id}/possible_connections", response_model=List[schemas.PossibleConnection])
+async def get_possible_connections(
+    user_id: UUID,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_async_db),
+    cache: ResponseCache = Depends(get_cache),
+):
+    async def load():
+        rows = await crud.get_possible_user_rows(db=db, user_id=user_id, limit=limit, offset=offset)
+        return [possible_row_to_json(row) for row in rows]
+
+    try:
+        return FastJSONResponse(await cache.aget_or_load(
+            f"possible:{user_id}:{limit}:{offset}",
+            [possible_tag(user_id), USERS_TAG],
+            load,
+        ))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Could not retrieve possible connections.")
+
+
+@router.delete("/connections/{user_id_1}/{user_id_2}", status_code=204, responses={202: {"model": schemas.OperationAccepted}})
+async def delete_user_connection(
+    user_id_1: UUID,
+    user_id_2: UUID,
+    db: AsyncSession = Depends(get_async_db),
+    queue: Optional[WriteQueue] = Depends(get_write_queue),
+    idempotency_key: Optional[str] = Header(None),
+):
+    """
+    Delete a connection between two users.
+    """
+    if queue is not None:
+        if not await crud.get_connection(db=db, user_id_1=user_id_1, user_id_2=user_id_2):
+            raise HTTPException(status_code=404, detail="Connection not found")
+        return await _enqueue(queue, operation_crud.DELETE, user_id_1, user_id_2, idempotency_key)
+
+    try:
+        success = await crud.delete_connection(db=db, user_id_1=user_id_1, user_id_2=user_id_2)
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail="Could not delete the connection.")
+    if not success:
+        raise HTTPException(status_code=404, detail="Connection not found")
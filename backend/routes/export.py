@@ -0,0 +1,107 @@
+"""
+Bulk export of the social graph.
+
+Each export is one streamed scan (crud.export_crud) on its own session, on
+a replica when there is one (get_read_db). The generators below are plain
+iterators, which Starlette advances in the threadpool, so the event loop
+keeps serving while an export runs; at most EXPORT_MAX_CONCURRENT run at
+once per process, further requests get 429.
+"""
+import threading
+import weakref
+from typing import Callable, Iterator, Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+import crud.export_crud as crud
+from db.database import get_read_db
+from core.config import settings
+from core.export import CSV_MEDIA_TYPE, EDGE_LIST_MEDIA_TYPE, EdgeListEncoder, csv_lines
+from core.metrics import ProfiledRoute
+from core.serialization import connection_row_to_json, dumps, user_row_to_json
+from routes.users import NDJSON_MEDIA_TYPE
+
+router = APIRouter(
+    prefix="/export",
+    tags=["export"],
+    route_class=ProfiledRoute,
+)
+
+_slots = threading.BoundedSemaphore(max(1, settings.export_max_concurrent))
+
+USER_CSV_HEADER = ("id", "name", "email", "created_at")
+CONNECTION_CSV_HEADER = ("id", "user_id", "connected_user_id", "connection_made_at")
+
+
+def _export_response(db: Session, encode: Callable[[Session], Iterator[bytes]], media_type: str, filename: str) -> StreamingResponse:
+    if not _slots.acquire(blocking=False):
+        raise HTTPException(status_code=429, detail="Too many exports running, retry later.", headers={"Retry-After": "10"})
+
+    def stream():
+        # Use a dedicated session on the same bind so the stream does not
+        # depend on when the request-scoped session gets closed.
+        try:
+            with Session(bind=db.get_bind()) as stream_db:
+                yield from encode(stream_db)
+        finally:
+            release()
+
+    iterator = stream()
+    # Also frees the slot when the client leaves before the stream started
+    release = weakref.finalize(iterator, _slots.release)
+    return StreamingResponse(
+        iterator,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+def _users_ndjson(db: Session) -> Iterator[bytes]:
+    for rows in crud.iter_user_chunks(db, settings.export_chunk_size):
+        yield b"".join(dumps(user_row_to_json(row)) + b"\n" for row in rows)
+
+def _users_csv(db: Session) -> Iterator[bytes]:
+    yield csv_lines((), header=USER_CSV_HEADER)
+    for rows in crud.iter_user_chunks(db, settings.export_chunk_size):
+        yield csv_lines((row.id, row.name, row.email, row.created_at) for row in rows)
+
+def _connections_ndjson(db: Session) -> Iterator[bytes]:
+    for rows in crud.iter_connection_chunks(db, settings.export_chunk_size):
+        yield b"".join(dumps(connection_row_to_json(row)) + b"\n" for row in rows)
+
+def _connections_csv(db: Session) -> Iterator[bytes]:
+    yield csv_lines((), header=CONNECTION_CSV_HEADER)
+    for rows in crud.iter_connection_chunks(db, settings.export_chunk_size):
+        yield csv_lines((row.id, row.user_id, row.connected_user_id, row.connection_made_at) for row in rows)
+
+def _edge_list(db: Session) -> Iterator[bytes]:
+    encoder = EdgeListEncoder()
+    for rows in crud.iter_edge_list_chunks(db, settings.export_chunk_size):
+        yield encoder.encode(rows)
+    yield encoder.footer()
+
+
+@router.get("/users")
+def export_users(format: Literal["ndjson", "csv"] = Query("ndjson"), db: Session = Depends(get_read_db)):
+    """
+    Streams every user, as NDJSON (the objects of GET /users) or as CSV
+    with a header row. Rows are in no particular order.
+    """
+    if format == "csv":
+        return _export_response(db, _users_csv, CSV_MEDIA_TYPE, "users.csv")
+    return _export_response(db, _users_ndjson, NDJSON_MEDIA_TYPE, "users.ndjson")
+
+
+@router.get("/edges")
+def export_edges(format: Literal["ndjson", "csv", "binary"] = Query("ndjson"), db: Session = Depends(get_read_db)):
+    """
+    Streams every connection, as NDJSON, as CSV with a header row, or as
+    the binary edge list described in core.export: the user ids, then one
+    pair of int32 user indexes per connection, ready to be memory-mapped.
+    """
+    if format == "binary":
+        return _export_response(db, _edge_list, EDGE_LIST_MEDIA_TYPE, "edges.bin")
+    if format == "csv":
+        return _export_response(db, _connections_csv, CSV_MEDIA_TYPE, "edges.csv")
+    return _export_response(db, _connections_ndjson, NDJSON_MEDIA_TYPE, "edges.ndjson")
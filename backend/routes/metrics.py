@@ -0,0 +1,30 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+import schemas
+from core.metrics import metrics
+from typing import List
+
+# Content type of the Prometheus text exposition format
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+router = APIRouter(
+    prefix="/metrics",
+    tags=["metrics"],
+)
+
+
+@router.get("", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Request latency, per-request SQL statement counts and times, and query
+    totals in the Prometheus text format.
+    """
+    return PlainTextResponse(metrics.render(), media_type=PROMETHEUS_MEDIA_TYPE)
+
+
+@router.get("/slow_queries", response_model=List[schemas.SlowQuery])
+async def get_slow_queries():
+    """
+    The most recent statements slower than SLOW_QUERY_MS, newest last.
+    """
+    return metrics.slow_query_samples()
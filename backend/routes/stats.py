@@ -1,18 +1,83 @@
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import datetime, timezone
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
+from typing import Literal, Optional
 import crud.statistics_crud as crud
 import schemas
-from db.database import get_db
+from db.database import get_read_db
+from core.metrics import ProfiledRoute
+from core.cache import ResponseCache, STATS_TAG, get_cache
+from core.conditional import not_modified, validator_headers
+from core.graph_store import GraphStore, get_graph_store
 
 router = APIRouter(
     prefix="/stats",
     tags=["stats"],
+    route_class=ProfiledRoute,
 )
 
+# Buckets returned by one /stats/timeseries request, and by default
+MAX_TIMESERIES_POINTS = 1000
+DEFAULT_TIMESERIES_POINTS = 48
+
 @router.get("/", response_model=schemas.Stats)
-def get_stats(db: Session = Depends(get_db)):
+def get_stats(request: Request, response: Response, db: Session = Depends(get_read_db), cache: ResponseCache = Depends(get_cache)):
+    etag = cache.etag("stats", [STATS_TAG])
+    unchanged = not_modified(request, etag)
+    if unchanged:
+        return unchanged
+    response.headers.update(validator_headers(etag))
     try:
-        stats = crud.get_statistics(db)
-        return schemas.Stats(**stats)
+        return cache.get_or_load(
+            "stats",
+            [STATS_TAG],
+            lambda: schemas.Stats(**crud.get_statistics(db)).model_dump(mode="json"),
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail="Failed to retrieve statistics")
+
+
+@router.get("/timeseries", response_model=schemas.Timeseries)
+def get_timeseries(
+    bucket: Literal["hour", "day"] = "hour",
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    db: Session = Depends(get_read_db),
+    cache: ResponseCache = Depends(get_cache),
+):
+    """
+    New users and new connections per hour or day, from the rollup table.
+    `to` defaults to now and `from` to DEFAULT_TIMESERIES_POINTS buckets
+    earlier; both are rounded down to a bucket boundary (UTC).
+    """
+    step = crud.ROLLUP_BUCKETS[bucket]
+    end = end or datetime.now(timezone.utc)
+    start = start or end - step * (DEFAULT_TIMESERIES_POINTS - 1)
+    first, last = crud.bucket_start(start, bucket), crud.bucket_start(end, bucket)
+    if first > last:
+        raise HTTPException(status_code=400, detail="`from` must not be after `to`.")
+    if (last - first) // step + 1 > MAX_TIMESERIES_POINTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_TIMESERIES_POINTS} buckets per request.")
+
+    try:
+        return cache.get_or_load(
+            f"timeseries:{bucket}:{first.isoformat()}:{last.isoformat()}",
+            [STATS_TAG],
+            lambda: schemas.Timeseries(bucket=bucket, points=crud.get_timeseries(db, bucket, first, last)).model_dump(mode="json"),
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Failed to retrieve the time series")
+
+
+@router.get("/cache", response_model=schemas.CacheStats)
+def get_cache_stats(cache: ResponseCache = Depends(get_cache)):
+    return cache.metrics()
+
+
+@router.get("/graph", response_model=schemas.GraphStoreStats)
+def get_graph_store_stats(store: GraphStore = Depends(get_graph_store)):
+    """
+    Size of the in-memory graph store (GRAPH_STORE_ENABLED), including the
+    approximate memory per edge.
+    """
+    return store.memory_usage()
@@ -1,28 +1,53 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 import crud.user_crud as crud 
+import crud.graph_crud as graph_crud
+import crud.operation_crud as operation_crud
 import schemas
-from db.database import get_db
-from typing import List
+from db.database import get_read_db, get_write_db
+from core.metrics import ProfiledRoute
+from core.serialization import FastJSONResponse, dumps, possible_row_to_json, user_row_to_json
+from core.cache import ResponseCache, CONNECTIONS_TAG, USERS_TAG, get_cache, possible_tag, user_tag
+from core.conditional import not_modified, validator_headers
+from core.write_queue import WriteQueue, get_write_queue
+from typing import AsyncIterator, Callable, List, Optional, Tuple, Union
 from uuid import UUID
 
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+# Pairs accepted by one POST /users/mutual_counts request
+MAX_MUTUAL_PAIRS = 1000
+# Ids accepted by one POST /users/batch_get or /users/connections/batch request
+MAX_BATCH_IDS = 1000
+
 router = APIRouter(
     prefix="/users",
     tags=["users"],
+    route_class=ProfiledRoute,
 )
 
 
-@router.post("/", response_model=schemas.User)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+def _validate_new_user(user: schemas.UserCreate) -> Optional[str]:
     # Manual validation for name
     if not user.name or not user.name.strip():
-        raise HTTPException(status_code=400, detail="Username cannot be empty.")
-    
+        return "Username cannot be empty."
+
     # Manual validation for email
     if not user.email or not user.email.strip():
-        raise HTTPException(status_code=400, detail="Email cannot be empty.")
+        return "Email cannot be empty."
     if '@' not in user.email:
-        raise HTTPException(status_code=400, detail="Invalid email address.")
+        return "Invalid email address."
+    return None
+
+
+@router.post("/", response_model=schemas.User)
+def create_user(user: schemas.UserCreate, db: Session = Depends(get_write_db)):
+    error = _validate_new_user(user)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
     
     # Check if an email already exists
     existing_user = crud.get_user_by_email(db=db, email=user.email)
@@ -37,25 +62,219 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail="Could not create the user.")
 
 
+
+async def _read_bulk_rows(request: Request, model) -> AsyncIterator[Tuple[int, Union[object, str]]]:
+    """
+    Yields (index, row) for every item of a JSON array body, or of an NDJSON
+    body (`Content-Type: application/x-ndjson`) as it streams in, so large
+    imports are never held in memory as a whole. Items that fail to parse
+    are yielded as an error message instead of a model instance.
+    """
+    def parse(raw):
+        try:
+            if isinstance(raw, bytes):
+                return model.model_validate_json(raw)
+            return model.model_validate(raw)
+        except ValidationError as e:
+            return f"Invalid row: {e.errors()[0]['msg']}"
+
+    if NDJSON_MEDIA_TYPE in request.headers.get("content-type", ""):
+        index, buffer = 0, b""
+        async for chunk in request.stream():
+            *lines, buffer = (buffer + chunk).split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield index, parse(line)
+                    index += 1
+        if buffer.strip():
+            yield index, parse(buffer)
+        return
+
+    try:
+        items = await request.json()
+    except ValueError:
+        items = None
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Request body must be a JSON array or NDJSON.")
+    for index, item in enumerate(items):
+        yield index, parse(item)
+
+
+async def _bulk_import(
+    rows: AsyncIterator[Tuple[int, Union[object, str]]],
+    create_batch: Callable[[Session, list], dict],
+    db: Session,
+    validate: Callable[[object], Optional[str]] = lambda row: None,
+) -> dict:
+    """
+    Feeds the parsed rows to `create_batch` BULK_BATCH_SIZE at a time and
+    merges the per-batch results. Batches run in the threadpool, one after
+    the other, while the body keeps being read on the event loop.
+    """
+    result = {"created": [], "errors": []}
+
+    async def flush(batch):
+        outcome = await run_in_threadpool(create_batch, db, batch)
+        result["created"].extend(outcome["created"])
+        result["errors"].extend(outcome["errors"])
+
+    batch = []
+    async for index, row in rows:
+        error = row if isinstance(row, str) else validate(row)
+        if error:
+            result["errors"].append({"index": index, "detail": error})
+            continue
+        batch.append((index, row))
+        if len(batch) >= crud.BULK_BATCH_SIZE:
+            await flush(batch)
+            batch = []
+    if batch:
+        await flush(batch)
+
+    result["errors"].sort(key=lambda error: error["index"])
+    return result
+
+
+@router.post("/bulk", response_model=schemas.BulkResult)
+async def bulk_create_users(request: Request, db: Session = Depends(get_write_db)):
+    """
+    Creates many users from a JSON array or an NDJSON stream. Rows are
+    written in batches; invalid or conflicting rows are reported in `errors`
+    by their position in the input and do not stop the others.
+    """
+    try:
+        return await _bulk_import(_read_bulk_rows(request, schemas.UserCreate), crud.create_users_batch, db, _validate_new_user)
+    except HTTPException:
+        raise
+    except Exception as e:
+        await run_in_threadpool(db.rollback)
+        raise HTTPException(status_code=500, detail="Could not import the users.")
+
+
+@router.post("/connect/bulk", response_model=schemas.BulkResult)
+async def bulk_create_connections(request: Request, db: Session = Depends(get_write_db)):
+    """
+    Creates many connections from a JSON array or an NDJSON stream, with the
+    same batching and per-row error reporting as POST /users/bulk.
+    """
+    try:
+        return await _bulk_import(_read_bulk_rows(request, schemas.ConnectionCreate), crud.create_connections_batch, db)
+    except HTTPException:
+        raise
+    except Exception as e:
+        await run_in_threadpool(db.rollback)
+        raise HTTPException(status_code=500, detail="Could not import the connections.")
+
     
 @router.get("/", response_model=List[schemas.User])
-def get_users(db: Session = Depends(get_db)):
+def get_users(
+    request: Request,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    cache: ResponseCache = Depends(get_cache),
+):
+    """
+    Returns one page of users. The cursor for the next page is sent in the
+    `X-Next-Cursor` header. Clients sending `Accept: application/x-ndjson`
+    get every user streamed as newline-delimited JSON instead. Pages carry
+    an ETag; a request repeating it gets 304 without a query.
+    """
+    if NDJSON_MEDIA_TYPE in request.headers.get("accept", ""):
+        return StreamingResponse(_stream_users(db), media_type=NDJSON_MEDIA_TYPE)
+
+    etag = cache.etag(f"users:{limit}:{cursor}", [USERS_TAG])
+    unchanged = not_modified(request, etag)
+    if unchanged:
+        return unchanged
     try:
-        users = crud.get_all_users(db=db)
-        return users
+        rows, next_cursor = crud.get_user_rows_page(db=db, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail="Could not retrieve users.")
+    headers = validator_headers(etag)
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    return FastJSONResponse([user_row_to_json(row) for row in rows], headers=headers)
+
+
+def _stream_users(db: Session):
+    # Use a dedicated session on the same bind so the stream does not depend
+    # on when the request-scoped session gets closed.
+    with Session(bind=db.get_bind()) as stream_db:
+        for row in crud.iter_users(stream_db):
+            yield dumps(user_row_to_json(row)) + b"\n"
     
 
-@router.get("/{user_id}", response_model=schemas.User)
-def read_user(user_id: UUID, db: Session = Depends(get_db)):
-    user = crud.get_user_by_id(db=db, user_id=user_id)
+@router.get("/search", response_model=List[schemas.User])
+def search_users(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+):
+    """
+    Users with a name word or email starting with every word of `q`, for
+    typeahead. The cursor for the next page is sent in the `X-Next-Cursor`
+    header.
+    """
+    try:
+        rows, next_cursor = crud.search_user_rows(db=db, query=q, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Could not search users.")
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return FastJSONResponse([user_row_to_json(row) for row in rows], headers=headers)
+
+
+@router.get("/{user_id}", response_model=schemas.UserDetail)
+def read_user(user_id: UUID, db: Session = Depends(get_read_db), cache: ResponseCache = Depends(get_cache)):
+    def load():
+        user = crud.get_user_by_id(db=db, user_id=user_id)
+        if not user:
+            return None
+        detail = schemas.UserDetail.model_validate(user)
+        detail.connection_count = crud.get_degree(db=db, user_id=user_id)
+        return detail.model_dump(mode="json")
+
+    # The connection count also changes when a neighbor is deleted
+    user = cache.get_or_load(f"user:{user_id}", [user_tag(user_id), CONNECTIONS_TAG], load)
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
     return user
+
+
+def operation_accepted(operation_id: UUID) -> JSONResponse:
+    """202 response for an operation taken by the write-behind queue."""
+    return JSONResponse(
+        status_code=202,
+        content={"operation_id": str(operation_id)},
+        headers={"Location": f"/users/connections/operations/{operation_id}"},
+    )
+
+def _enqueue(queue: WriteQueue, kind: str, user_id_1: UUID, user_id_2: UUID, idempotency_key: Optional[str]) -> JSONResponse:
+    try:
+        # Returns once the operation is committed to the journal
+        operation_id = queue.submit(kind, user_id_1, user_id_2, idempotency_key).result()
+    except Exception as e:
+        raise HTTPException(status_code=503, detail="Could not queue the operation.")
+    return operation_accepted(operation_id)
+
     
-@router.post("/connect", response_model=schemas.Connection)
-def create_connection(connection_create: schemas.ConnectionCreate, db: Session = Depends(get_db)):
+@router.post("/connect", response_model=schemas.Connection, responses={202: {"model": schemas.OperationAccepted}})
+def create_connection(
+    connection_create: schemas.ConnectionCreate,
+    db: Session = Depends(get_write_db),
+    queue: Optional[WriteQueue] = Depends(get_write_queue),
+    idempotency_key: Optional[str] = Header(None),
+):
+    """
+    Connects two users. In write-behind mode (WRITE_BEHIND_ENABLED) the
+    connection is queued instead and the response is 202 with the id of the
+    operation; an Idempotency-Key header makes retries return the same one.
+    """
     user_id_1 = connection_create.user_id
     user_id_2 = connection_create.connected_user_id
 
@@ -68,67 +287,267 @@ def create_connection(connection_create: schemas.ConnectionCreate, db: Session =
     if not user2:
         raise HTTPException(status_code=404, detail=f"User with id {user_id_2} does not exist.")
     
-    # Check if the connection already exists
-    existing_connection = crud.get_connection(db=db, user_id_1=user_id_1, user_id_2=user_id_2)
-    if existing_connection:
-        raise HTTPException(status_code=400, detail="Connection already exists between these users.")
+    if user_id_1 == user_id_2:
+        raise HTTPException(status_code=400, detail="A user cannot connect to themselves.")
+
+    if queue is not None:
+        if crud.get_connection(db=db, user_id_1=user_id_1, user_id_2=user_id_2):
+            raise HTTPException(status_code=400, detail="Connection already exists between these users.")
+        return _enqueue(queue, operation_crud.CREATE, user_id_1, user_id_2, idempotency_key)
 
     try:
-        # Proceed to create the connection using the modified function signature
+        # Duplicates are rejected by the adjacency primary key, so there is no
+        # check-then-insert window for concurrent requests to slip through
         db_connection = crud.create_connection(db=db, user_id_1=user_id_1, user_id_2=user_id_2)
         return db_connection
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Connection already exists between these users.")
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Could not create the connection. Error: {e}")
 
 @router.get("/{user_id}/connections", response_model=List[schemas.User])
-def read_user_connections(user_id: UUID, db: Session = Depends(get_db)):
-    return crud.get_user_connections(user_id=user_id, db=db)
+def read_user_connections(
+    user_id: UUID,
+    request: Request,
+    db: Session = Depends(get_read_db),
+    cache: ResponseCache = Depends(get_cache),
+):
+    tags = [user_tag(user_id), CONNECTIONS_TAG]
+    etag = cache.etag(f"connections:{user_id}", tags)
+    unchanged = not_modified(request, etag)
+    if unchanged:
+        return unchanged
+    return FastJSONResponse(cache.get_or_load(
+        f"connections:{user_id}",
+        tags,
+        lambda: [user_row_to_json(row) for row in crud.get_user_connection_rows(user_id=user_id, db=db)],
+    ), headers=validator_headers(etag))
 
 
 @router.delete("/{user_id}")
-def delete_user(user_id: UUID, db: Session = Depends(get_db)):
+def delete_user(user_id: UUID, db: Session = Depends(get_write_db)):
     try:
         result = crud.delete_user(db=db, user_id=user_id)
-        if result:
-            return {"message": "User deleted successfully"}
-        else:
-            raise HTTPException(status_code=404, detail="User not found")
     except:
         db.rollback()
         raise HTTPException(status_code=500, detail="Could not delete the user.")
+    if not result:
+        raise HTTPException(status_code=404, detail="User not found")
+    return {"message": "User deleted successfully"}
 
 
 @router.put("/{user_id}")
-def modify_user(user_id: UUID, user: schemas.UserCreate, db: Session = Depends(get_db)):
+def modify_user(user_id: UUID, user: schemas.UserCreate, db: Session = Depends(get_write_db)):
     try:
         updated_user = crud.modify_user(db=db, user_id=user_id, updated_user=user)
-        if updated_user:
-            return {"id": updated_user.id, "name": updated_user.name}
-        else:
-            raise HTTPException(status_code=404, detail="User not found")
     except:
         db.rollback()
         raise HTTPException(status_code=500, detail="Could not update the user.")
+    if not updated_user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return {"id": updated_user.id, "name": updated_user.name}
+
 
+@router.get("/{user_id}/possible_connections", response_model=List[schemas.PossibleConnection])
+def get_possible_connections(
+    user_id: UUID,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_read_db),
+    cache: ResponseCache = Depends(get_cache),
+):
+    def load():
+        rows = crud.get_possible_user_rows(db=db, user_id=user_id, limit=limit, offset=offset)
+        return [possible_row_to_json(row) for row in rows]
 
-@router.get("/{user_id}/possible_connections", response_model=List[schemas.User])
-def get_possible_connections(user_id: UUID, db: Session = Depends(get_db)):
     try:
-        possible_users = crud.get_possible_users_to_connect(db=db, user_id=user_id)
-        return possible_users
+        return FastJSONResponse(cache.get_or_load(
+            f"possible:{user_id}:{limit}:{offset}",
+            [possible_tag(user_id), USERS_TAG],
+            load,
+        ))
     except Exception as e:
         raise HTTPException(status_code=500, detail="Could not retrieve possible connections.")
 
-@router.delete("/connections/{user_id_1}/{user_id_2}", status_code=204)
-def delete_user_connection(user_id_1: UUID, user_id_2: UUID, db: Session = Depends(get_db)):
+@router.get("/{user_id}/mutual/{other_user_id}", response_model=List[schemas.User])
+def read_mutual_connections(
+    user_id: UUID,
+    other_user_id: UUID,
+    db: Session = Depends(get_read_db),
+    cache: ResponseCache = Depends(get_cache),
+):
     """
-    Delete a connection between two users.
+    Returns the users connected to both users, ordered by id.
     """
+    for requested_id in (user_id, other_user_id):
+        if not crud.get_user_by_id(db=db, user_id=requested_id):
+            raise HTTPException(status_code=404, detail=f"User with id {requested_id} does not exist.")
+
+    def load():
+        rows = crud.get_mutual_connection_rows(db=db, user_id_1=user_id, user_id_2=other_user_id)
+        return [user_row_to_json(row) for row in rows]
+
     try:
-        success = crud.delete_connection(db=db, user_id_1=user_id_1, user_id_2=user_id_2)
-        if not success:
+        return FastJSONResponse(cache.get_or_load(
+            f"mutual:{user_id}:{other_user_id}",
+            [user_tag(user_id), user_tag(other_user_id), CONNECTIONS_TAG],
+            load,
+        ))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Could not retrieve mutual connections.")
+
+
+@router.post("/mutual_counts", response_model=List[schemas.MutualCount])
+def read_mutual_counts(request: schemas.MutualCountsRequest, db: Session = Depends(get_read_db)):
+    """
+    Returns the number of mutual connections of every pair, in request
+    order. Unknown users have no connections, so their counts are 0.
+    """
+    if len(request.pairs) > MAX_MUTUAL_PAIRS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_MUTUAL_PAIRS} pairs per request.")
+
+    pairs = [(pair.user_id, pair.other_user_id) for pair in request.pairs]
+    try:
+        counts = crud.get_mutual_counts(db=db, pairs=pairs)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Could not count mutual connections.")
+    return FastJSONResponse([
+        {"user_id": str(user_id), "other_user_id": str(other_user_id), "mutual_connections": count}
+        for (user_id, other_user_id), count in zip(pairs, counts)
+    ])
+
+
+def _check_batch_size(user_ids: schemas.UserIds) -> None:
+    if len(user_ids.ids) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_IDS} ids per request.")
+
+
+@router.post("/batch_get", response_model=schemas.UserBatch)
+def read_users_batch(user_ids: schemas.UserIds, db: Session = Depends(get_read_db)):
+    """
+    Returns many users with one query, in request order. Ids that do not
+    exist are listed in `missing`.
+    """
+    _check_batch_size(user_ids)
+    try:
+        rows = crud.get_user_rows_by_ids(db=db, user_ids=user_ids.ids)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Could not retrieve the users.")
+    found = {row.id for row in rows}
+    return FastJSONResponse({
+        "users": [user_row_to_json(row) for row in rows],
+        "missing": [str(user_id) for user_id in dict.fromkeys(user_ids.ids) if user_id not in found],
+    })
+
+
+@router.post("/connections/batch", response_model=schemas.ConnectionsBatch)
+def read_connections_batch(user_ids: schemas.UserIds, db: Session = Depends(get_read_db)):
+    """
+    Returns the connections of many users with one query, keyed by user id.
+    Unknown users have an empty list.
+    """
+    _check_batch_size(user_ids)
+    try:
+        connections = crud.get_connection_rows_by_user(db=db, user_ids=user_ids.ids)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Could not retrieve the connections.")
+    return FastJSONResponse({"connections": {
+        str(user_id): [user_row_to_json(row) for row in rows] for user_id, rows in connections.items()
+    }})
+
+
+@router.get("/{user_id}/path/{other_user_id}", response_model=schemas.UserPath)
+def get_path(
+    user_id: UUID,
+    other_user_id: UUID,
+    max_depth: int = Query(graph_crud.MAX_PATH_DEPTH, ge=1, le=graph_crud.MAX_PATH_DEPTH),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Returns a shortest chain of connections between two users. `degrees` is
+    the number of hops (the degrees of separation). Searches that reach
+    MAX_VISITED users without an answer get 422.
+    """
+    for requested_id in (user_id, other_user_id):
+        if not crud.get_user_by_id(db=db, user_id=requested_id):
+            raise HTTPException(status_code=404, detail=f"User with id {requested_id} does not exist.")
+
+    try:
+        path = graph_crud.find_path(
+            db=db, source_id=user_id, target_id=other_user_id, max_depth=max_depth, max_visited=graph_crud.MAX_VISITED,
+        )
+    except graph_crud.SearchLimitExceeded as e:
+        raise HTTPException(status_code=422, detail=f"Search limit exceeded: {e}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Could not search for a path.")
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"No path found within {max_depth} hops.")
+    return {"degrees": len(path) - 1, "users": graph_crud.get_users_by_ids(db=db, user_ids=path)}
+
+
+@router.get("/{user_id}/network", response_model=schemas.Network)
+def get_network(
+    user_id: UUID,
+    depth: int = Query(2, ge=1, le=graph_crud.MAX_NETWORK_DEPTH),
+    limit: int = Query(1000, ge=1, le=graph_crud.MAX_VISITED),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Returns the ids of the users within `depth` hops, grouped by distance.
+    At most `limit` users are returned; `truncated` tells whether the walk
+    stopped because of it.
+    """
+    if not crud.get_user_by_id(db=db, user_id=user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+
+    try:
+        levels, truncated = graph_crud.get_network(db=db, user_id=user_id, depth=depth, max_users=limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Could not retrieve the network.")
+    return {
+        "user_id": user_id,
+        "size": sum(len(level) for level in levels),
+        "truncated": truncated,
+        "levels": [{"degree": degree, "user_ids": level} for degree, level in enumerate(levels, start=1)],
+    }
+
+
+@router.get("/connections/operations/{operation_id}", response_model=schemas.ConnectionOperation)
+def read_connection_operation(operation_id: UUID, db: Session = Depends(get_read_db)):
+    """
+    State of an operation accepted in write-behind mode: pending until the
+    queue applies it, then applied or failed (with the reason in `detail`).
+    """
+    operation = operation_crud.get_operation(db=db, operation_id=operation_id)
+    if operation is None:
+        raise HTTPException(status_code=404, detail="Operation not found")
+    return operation
+
+
+@router.delete("/connections/{user_id_1}/{user_id_2}", status_code=204, responses={202: {"model": schemas.OperationAccepted}})
+def delete_user_connection(
+    user_id_1: UUID,
+    user_id_2: UUID,
+    db: Session = Depends(get_write_db),
+    queue: Optional[WriteQueue] = Depends(get_write_queue),
+    idempotency_key: Optional[str] = Header(None),
+):
+    """
+    Delete a connection between two users. Queued in write-behind mode, like
+    POST /users/connect.
+    """
+    if queue is not None:
+        if not crud.get_connection(db=db, user_id_1=user_id_1, user_id_2=user_id_2):
             raise HTTPException(status_code=404, detail="Connection not found")
+        return _enqueue(queue, operation_crud.DELETE, user_id_1, user_id_2, idempotency_key)
+
+    try:
+        success = crud.delete_connection(db=db, user_id_1=user_id_1, user_id_2=user_id_2)
     except Exception as e:
+        db.rollback()
         raise HTTPException(status_code=500, detail="Could not delete the connection.")
+    if not success:
+        raise HTTPException(status_code=404, detail="Connection not found")
     return {"detail": "Connection deleted successfully"}
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, validator
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
 from uuid import UUID  # Import UUID
 
 class UserBase(BaseModel):
@@ -31,8 +31,111 @@ class User(UserBase):
     class Config:
         from_attributes = True
 
+class UserDetail(User):
+    connection_count: int = 0
+
+class PossibleConnection(User):
+    mutual_connections: int = 0
+
+class OperationAccepted(BaseModel):
+    operation_id: UUID
+
+class ConnectionOperation(ConnectionBase):
+    id: UUID
+    kind: str  # "create" or "delete"
+    status: str  # "pending", "applied" or "failed"
+    detail: Optional[str] = None
+    created_at: datetime
+    applied_at: Optional[datetime] = None
+    class Config:
+        from_attributes = True
+
+class UserPair(BaseModel):
+    user_id: UUID
+    other_user_id: UUID
+
+class MutualCountsRequest(BaseModel):
+    pairs: List[UserPair]
+
+class MutualCount(UserPair):
+    mutual_connections: int
+
+class UserIds(BaseModel):
+    ids: List[UUID]
+
+class UserBatch(BaseModel):
+    users: List[User]
+    # Requested ids that do not exist
+    missing: List[UUID]
+
+class ConnectionsBatch(BaseModel):
+    # Neighbor list of every requested user id
+    connections: Dict[UUID, List[User]]
+
+class UserPath(BaseModel):
+    degrees: int
+    users: List[User]
+
+class NetworkLevel(BaseModel):
+    degree: int
+    user_ids: List[UUID]
+
+class Network(BaseModel):
+    user_id: UUID
+    size: int
+    truncated: bool
+    levels: List[NetworkLevel]
+
+class BulkCreated(BaseModel):
+    index: int
+    id: UUID
+
+class BulkError(BaseModel):
+    index: int
+    detail: str
+
+class BulkResult(BaseModel):
+    created: List[BulkCreated] = []
+    errors: List[BulkError] = []
+
 class Stats(BaseModel):
     user_count: int
     connection_count: int
     average_connections_per_user: float
     last_connection: Optional[datetime] = None  
+
+class TimeseriesPoint(BaseModel):
+    bucket_start: datetime
+    new_users: int
+    new_connections: int
+
+class Timeseries(BaseModel):
+    bucket: str
+    points: List[TimeseriesPoint]
+
+class CacheStats(BaseModel):
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+    invalidations: int
+    entries: int
+    # Loads run on a miss, and requests that shared another request's load
+    loads: int
+    coalesced: int
+    # Keys with the most coalesced requests
+    coalesced_by_key: Dict[str, int]
+
+class GraphStoreStats(BaseModel):
+    ready: bool
+    users: int
+    edges: int
+    memory_bytes: int
+    bytes_per_edge: float
+    load_seconds: Optional[float] = None
+
+class SlowQuery(BaseModel):
+    sql: str
+    duration_ms: float
+    path: Optional[str] = None
+    at: float
@@ -0,0 +1,66 @@
+"""
+Rewrites an SQLite database created before ids were stored as 16-byte
+BLOBs (see db.uuid_storage). The converted copy is written next to the
+database; with --replace it then takes its place and the original is kept
+as `<name>.text-ids.bak`. Stop the application first.
+
+Usage (from the backend directory):
+    python -m scripts.convert_uuids --replace
+    python -m scripts.convert_uuids --database other.db --output converted.db
+"""
+import argparse
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+
+from db.database import SQLALCHEMY_DATABASE_URL
+from db.uuid_storage import convert_database, legacy_uuid_columns
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", type=Path, help="SQLite file to convert (default: the DATABASE_URL one)")
+    parser.add_argument("--output", type=Path, help="where to write the converted copy (default: <database>.converted)")
+    parser.add_argument("--replace", action="store_true", help="swap the converted copy in place of the database")
+    parser.add_argument("--batch-size", type=int, default=5000, help="rows read and inserted at a time")
+    args = parser.parse_args()
+
+    database = args.database
+    if database is None:
+        url = make_url(SQLALCHEMY_DATABASE_URL)
+        if url.get_backend_name() != "sqlite" or not url.database or url.database == ":memory:":
+            print("DATABASE_URL is not an SQLite file; only SQLite stored ids as text.")
+            return 1
+        database = Path(url.database)
+    engine = create_engine(f"sqlite:///{database}")
+    legacy = legacy_uuid_columns(engine)
+    engine.dispose()
+    if not legacy:
+        print(f"{database} already stores ids as 16-byte BLOBs.")
+        return 0
+
+    output = args.output or database.with_name(database.name + ".converted")
+    counts = convert_database(database, output, args.batch_size)
+    for table, (copied, skipped) in counts.items():
+        print(f"{table}: {copied} rows" + (f", {skipped} skipped (unreadable ids)" if skipped else ""))
+    if any(skipped for _, skipped in counts.values()):
+        print("Some rows were skipped; run `python -m scripts.reconcile_stats` on the converted database.")
+
+    if args.replace:
+        if database.with_name(database.name + "-wal").exists():
+            print(f"{database} is still open elsewhere (it has a -wal file); wrote {output} without replacing it.")
+            return 1
+        backup = database.with_name(database.name + ".text-ids.bak")
+        database.rename(backup)
+        output.rename(database)
+        print(f"Converted {database}; the original is kept as {backup}.")
+    else:
+        print(f"Wrote {output}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,24 @@
+"""
+Brings the database up to date with the models: missing tables and
+indexes, legacy timestamp formats and the user_adjacency backfill. Every
+step is idempotent.
+
+Usage (from the backend directory):
+    python -m scripts.migrate
+"""
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from db.database import engine
+from db.migrations import run_migrations
+
+
+def main() -> int:
+    run_migrations(engine)
+    print("Database is up to date.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
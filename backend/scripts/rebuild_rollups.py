@@ -0,0 +1,26 @@
+"""
+Recomputes the stats_rollup table behind /stats/timeseries from the users
+and connections tables, streaming over each of them once.
+
+Usage (from the backend directory):
+    python -m scripts.rebuild_rollups
+"""
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import models.models as models
+from crud.statistics_crud import rebuild_rollups
+from db.database import engine, SessionLocal
+
+
+def main() -> int:
+    models.Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        written = rebuild_rollups(db)
+    print(f"Wrote {written} rollup row(s).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
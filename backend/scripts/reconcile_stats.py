@@ -0,0 +1,32 @@
+"""
+Rebuilds the /stats counters from the users and connections tables and
+reports any drift from the incrementally maintained values.
+
+Usage (from the backend directory):
+    python -m scripts.reconcile_stats
+"""
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import models.models as models
+from crud.statistics_crud import reconcile_statistics
+from db.database import engine, SessionLocal
+
+
+def main() -> int:
+    models.Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        drift = reconcile_statistics(db)
+
+    if not drift:
+        print("Statistics counters are in sync.")
+        return 0
+    for field, (stored, actual) in drift.items():
+        print(f"{field}: stored={stored} actual={actual}")
+    print(f"Repaired {len(drift)} drifted counter(s).")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
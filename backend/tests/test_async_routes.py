@@ -0,0 +1,107 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+import asyncio
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+import schemas
+from models.models import Base
+from core.cache import LRUCache, ResponseCache, configure_cache
+import crud.async_user_crud as async_user_crud
+import crud.async_statistics_crud as async_statistics_crud
+from db.database import get_async_db
+from routes.async_stats import router as async_stats_router
+from routes.async_users import router as async_user_router
+from routes.users import router as user_router
+
+
+@pytest.fixture
+def database_path(tmp_path):
+    # A file database so the async driver and the fixtures see the same data
+    path = tmp_path / "async.db"
+    Base.metadata.create_all(create_engine(f"sqlite:///{path}"))
+    return path
+
+@pytest.fixture
+def async_sessionmaker_(database_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{database_path}", poolclass=NullPool)
+    return async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+@pytest.fixture
+def client(async_sessionmaker_):
+    previous = configure_cache(ResponseCache(LRUCache()))
+    app = FastAPI()
+    app.include_router(async_user_router)
+    app.include_router(async_stats_router)
+    app.include_router(user_router)
+
+    async def override_get_async_db():
+        async with async_sessionmaker_() as db:
+            yield db
+
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    yield TestClient(app)
+    configure_cache(previous)
+
+
+def test_async_crud_round_trip(async_sessionmaker_):
+    # Given two users created through the async CRUD functions
+    async def scenario():
+        async with async_sessionmaker_() as db:
+            a = await async_user_crud.create_user(db, schemas.UserCreate(name="A", email="a@example.com"))
+            b = await async_user_crud.create_user(db, schemas.UserCreate(name="B", email="b@example.com"))
+            # When connecting them
+            await async_user_crud.create_connection(db, a.id, b.id)
+            connections = await async_user_crud.get_user_connections(db, a.id)
+            stats = await async_statistics_crud.get_statistics(db)
+            return b, connections, stats
+
+    b, connections, stats = asyncio.run(scenario())
+    # Then reads see the writes
+    assert [user.id for user in connections] == [b.id]
+    assert stats["user_count"] == 2
+    assert stats["connection_count"] == 1
+
+def test_async_routes_serve_users_and_stats(client):
+    # Given users created over the async routes
+    a = client.post("/users/", json={"name": "A", "email": "a@example.com"}).json()
+    b = client.post("/users/", json={"name": "B", "email": "b@example.com"}).json()
+    # When connecting them and reading back
+    response = client.post("/users/connect", json={"user_id": a["id"], "connected_user_id": b["id"]})
+    assert response.status_code == 200
+    # Then the async read endpoints return the same shapes as the sync ones
+    assert [user["id"] for user in client.get(f"/users/{a['id']}/connections").json()] == [b["id"]]
+    assert client.get(f"/users/{b['id']}").json()["email"] == "b@example.com"
+    assert client.get("/stats/").json()["connection_count"] == 1
+    lines = client.get("/users/", headers={"Accept": "application/x-ndjson"}).text.splitlines()
+    assert len(lines) == 2
+
+def test_async_routes_report_missing_rows(client):
+    # When deleting a user that does not exist
+    response = client.delete("/users/00000000-0000-0000-0000-000000000000")
+    # Then the request fails with a 404
+    assert response.status_code == 404
+
+def test_failed_connection_delete_rolls_back(client, async_sessionmaker_, monkeypatch):
+    # Given a delete that fails halfway through its transaction
+    db = async_sessionmaker_()
+
+    async def override_get_async_db():
+        yield db
+
+    async def failing_delete(db, user_id_1, user_id_2):
+        await db.execute(text("SELECT 1"))
+        raise RuntimeError("database went away")
+
+    client.app.dependency_overrides[get_async_db] = override_get_async_db
+    monkeypatch.setattr(async_user_crud, "delete_connection", failing_delete)
+    response = client.delete("/users/connections/00000000-0000-0000-0000-000000000001/00000000-0000-0000-0000-000000000002")
+    # Then the request fails and leaves the session usable
+    assert response.status_code == 500
+    assert not db.in_transaction()
+    asyncio.run(db.close())
@@ -0,0 +1,90 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+import uuid
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from fastapi.testclient import TestClient
+
+from models.models import Base, User
+from crud.user_crud import create_connection, get_connection_rows_by_user, get_user_rows_by_ids
+from db.database import get_read_db, get_write_db
+from main import app
+from routes.users import MAX_BATCH_IDS
+
+# Setup a test database (in-memory SQLite shared across threads for the API client)
+engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def db_session():
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture
+def client(db_session):
+    app.dependency_overrides[get_read_db] = app.dependency_overrides[get_write_db] = lambda: db_session
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+@pytest.fixture
+def graph(db_session):
+    # a knows b and c, b knows d
+    users = {name: User(name=name, email=f"{name}@example.com") for name in "abcd"}
+    db_session.add_all(users.values())
+    db_session.commit()
+    for x, y in [("a", "b"), ("c", "a"), ("b", "d")]:
+        create_connection(db_session, users[x].id, users[y].id)
+    return {name: user.id for name, user in users.items()}
+
+@pytest.fixture
+def statements():
+    executed = []
+    listener = lambda conn, cursor, statement, *args: executed.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    yield executed
+    event.remove(engine, "before_cursor_execute", listener)
+
+
+def test_rows_by_ids_in_one_query(db_session, graph, statements):
+    # When resolving users in a given order, with a repeat and an unknown id
+    ids = [graph["c"], graph["a"], uuid.uuid4(), graph["c"]]
+    rows = get_user_rows_by_ids(db_session, ids)
+    # Then the known ones come back once each, in that order, from one statement
+    assert [row.name for row in rows] == ["c", "a"]
+    assert len(statements) == 1
+
+def test_connections_grouped_by_user(db_session, graph, statements):
+    # When reading the neighbor lists of several users at once
+    unknown = uuid.uuid4()
+    connections = get_connection_rows_by_user(db_session, [graph["a"], graph["d"], unknown])
+    # Then every user gets their own list, from one statement
+    assert sorted(row.name for row in connections[graph["a"]]) == ["b", "c"]
+    assert [row.name for row in connections[graph["d"]]] == ["b"]
+    assert connections[unknown] == []
+    assert len(statements) == 1
+
+def test_batch_endpoints(client, graph):
+    a, d = graph["a"], graph["d"]
+    unknown = uuid.uuid4()
+    # batch_get returns the users in request order and lists the unknown ids
+    response = client.post("/users/batch_get", json={"ids": [str(d), str(unknown), str(a)]})
+    assert response.status_code == 200
+    assert [user["name"] for user in response.json()["users"]] == ["d", "a"]
+    assert response.json()["missing"] == [str(unknown)]
+    # connections/batch returns one list per requested user
+    response = client.post("/users/connections/batch", json={"ids": [str(a), str(d)]})
+    body = response.json()["connections"]
+    assert sorted(user["name"] for user in body[str(a)]) == ["b", "c"]
+    assert [user["name"] for user in body[str(d)]] == ["b"]
+    # And oversized batches are rejected
+    too_many = {"ids": [str(uuid.uuid4()) for _ in range(MAX_BATCH_IDS + 1)]}
+    assert client.post("/users/batch_get", json=too_many).status_code == 400
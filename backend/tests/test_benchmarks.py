@@ -0,0 +1,30 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from collections import Counter
+
+from benchmarks.common import power_law_edges, summarize
+from benchmarks.compare import compare_results
+
+
+def test_power_law_edges_are_skewed_and_simple():
+    # When generating a graph with an average degree of 10
+    edges = power_law_edges(2000, 10, exponent=2.5, seed=1)
+    degrees = Counter(user for edge in edges for user in edge)
+    # Then it has the requested size without self loops or duplicates
+    assert len(edges) == 2000 * 10 // 2
+    assert all(a < b for a, b in edges)
+    assert len(set(edges)) == len(edges)
+    # And a few hubs are far above the median degree
+    ordered = sorted(degrees.values())
+    assert ordered[-1] > 20 * ordered[len(ordered) // 2]
+
+def test_compare_flags_regressions():
+    # Given two runs where one case got slower and the other faster
+    before = {"fast": summarize([0.010] * 100, 1.0), "slow": summarize([0.010] * 100, 1.0)}
+    after = {"fast": summarize([0.008] * 100, 0.8), "slow": summarize([0.020] * 100, 2.0)}
+    # When comparing them
+    rows = {row["name"]: row for row in compare_results(before, after, threshold=0.10)}
+    # Then only the slower case is reported
+    assert rows["slow"]["regressed"] is True
+    assert rows["fast"]["regressed"] is False
@@ -0,0 +1,118 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+import json
+import pytest
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from fastapi.testclient import TestClient
+
+import schemas
+from models.models import Base, Connection, User, UserAdjacency
+from crud.statistics_crud import get_statistics
+from crud.user_crud import create_connections_batch, create_users_batch
+from db.database import get_read_db, get_write_db
+from main import app
+
+# Setup a test database (in-memory SQLite shared across threads for the API client)
+DATABASE_URL = "sqlite:///:memory:"
+engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def db_session():
+    # Create the database tables
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture
+def client(db_session):
+    app.dependency_overrides[get_read_db] = app.dependency_overrides[get_write_db] = lambda: db_session
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+def test_create_users_batch_reports_conflicts(db_session):
+    # Given an existing user
+    db_session.add(User(name="Taken", email="taken@example.com"))
+    db_session.commit()
+    # When importing a batch with a taken email and a repeated one
+    batch = list(enumerate([
+        schemas.UserCreate(name="A", email="a@example.com"),
+        schemas.UserCreate(name="Taken again", email="taken@example.com"),
+        schemas.UserCreate(name="A again", email="a@example.com"),
+    ]))
+    result = create_users_batch(db_session, batch)
+    # Then only the new email is created and the others are reported by index
+    assert [entry["index"] for entry in result["created"]] == [0]
+    assert result["errors"] == [
+        {"index": 1, "detail": "Email is already in use."},
+        {"index": 2, "detail": "Duplicate email in batch."},
+    ]
+    assert get_statistics(db_session)["user_count"] == 2
+
+def test_create_connections_batch_writes_adjacency(db_session):
+    # Given three users
+    users = [User(name=f"User {i}", email=f"user{i}@example.com") for i in range(3)]
+    db_session.add_all(users)
+    db_session.commit()
+    a, b, c = (user.id for user in users)
+    # When importing connections including a reversed duplicate and a self loop
+    batch = list(enumerate(schemas.ConnectionCreate(user_id=x, connected_user_id=y) for x, y in [(a, b), (b, c), (b, a), (c, c)]))
+    result = create_connections_batch(db_session, batch)
+    # Then each distinct edge is stored once with both adjacency directions
+    assert [entry["index"] for entry in result["created"]] == [0, 1]
+    assert [error["index"] for error in result["errors"]] == [2, 3]
+    assert db_session.query(func.count(Connection.id)).scalar() == 2
+    assert db_session.query(func.count()).select_from(UserAdjacency).scalar() == 4
+    # And importing the same edge again is reported as existing
+    again = create_connections_batch(db_session, [(0, schemas.ConnectionCreate(user_id=c, connected_user_id=b))])
+    assert again["errors"] == [{"index": 0, "detail": "Connection already exists between these users."}]
+    assert get_statistics(db_session)["connection_count"] == 2
+
+def test_bulk_users_endpoint_accepts_ndjson(client, db_session):
+    # Given an NDJSON body with one invalid line
+    lines = [
+        json.dumps({"name": "A", "email": "a@example.com"}),
+        json.dumps({"name": "B", "email": "not-an-email"}),
+        json.dumps({"name": "C"}),
+        json.dumps({"name": "D", "email": "d@example.com"}),
+    ]
+    # When posting it
+    response = client.post("/users/bulk", content="\n".join(lines), headers={"Content-Type": "application/x-ndjson"})
+    # Then valid rows are created and the rest are reported by line
+    assert response.status_code == 200
+    body = response.json()
+    assert [entry["index"] for entry in body["created"]] == [0, 3]
+    assert [error["index"] for error in body["errors"]] == [1, 2]
+    assert body["errors"][0]["detail"] == "Invalid email address."
+
+def test_bulk_connections_endpoint_accepts_json_array(client, db_session):
+    # Given users created through the bulk endpoint
+    created = client.post("/users/bulk", json=[{"name": f"User {i}", "email": f"user{i}@example.com"} for i in range(3)]).json()["created"]
+    a, b, c = (entry["id"] for entry in created)
+    # When connecting them, including an unknown user
+    unknown = "00000000-0000-0000-0000-000000000000"
+    response = client.post("/users/connect/bulk", json=[
+        {"user_id": a, "connected_user_id": b},
+        {"user_id": a, "connected_user_id": unknown},
+        {"user_id": c, "connected_user_id": a},
+    ])
+    # Then the known pairs are connected and the unknown user is reported
+    body = response.json()
+    assert [entry["index"] for entry in body["created"]] == [0, 2]
+    assert body["errors"] == [{"index": 1, "detail": f"User with id {unknown} does not exist."}]
+    assert {user["id"] for user in client.get(f"/users/{a}/connections").json()} == {b, c}
+
+def test_bulk_endpoint_rejects_non_array_body(client):
+    # When posting a JSON object instead of an array
+    response = client.post("/users/bulk", json={"name": "A", "email": "a@example.com"})
+    # Then the request fails as a whole
+    assert response.status_code == 400
@@ -0,0 +1,219 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from fastapi.testclient import TestClient
+
+import schemas
+import crud.user_crud as user_crud
+from models.models import Base
+from core.cache import CONNECTIONS_TAG, LRUCache, ResponseCache, SharedCache, configure_cache, user_tag
+from core.conditional import etag_matches
+from core.config import Settings
+from crud.user_crud import create_connection, create_user, delete_user
+from db.database import get_read_db, get_write_db
+from main import app
+
+# Setup a test database (in-memory SQLite shared across threads for the API client)
+engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+class FakeRedis:
+    """Local stand-in for the shared cache server."""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def incr(self, key):
+        self.data[key] = str(int(self.data.get(key, 0)) + 1)
+        return int(self.data[key])
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    """Queues commands and runs them on execute, counting round trips."""
+
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def incr(self, key):
+        self.commands.append(key)
+
+    def execute(self):
+        self.client.round_trips = getattr(self.client, "round_trips", 0) + 1
+        return [self.client.incr(key) for key in self.commands]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(params=["memory", "shared"])
+def cache(request):
+    backend = LRUCache(max_entries=100, ttl=60) if request.param == "memory" else SharedCache(FakeRedis(), ttl=60)
+    previous = configure_cache(ResponseCache(backend))
+    yield backend
+    configure_cache(previous)
+
+@pytest.fixture
+def db_session():
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture
+def client(db_session):
+    app.dependency_overrides[get_read_db] = app.dependency_overrides[get_write_db] = lambda: db_session
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+def test_lru_cache_evicts_least_recently_used():
+    # Given a cache holding two entries
+    cache = LRUCache(max_entries=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    # When a third entry is added
+    cache.set("c", 3)
+    # Then the least recently used one is evicted
+    assert cache.get("b") != 2
+    assert cache.get("a") == 1
+    assert cache.evictions == 1
+
+def test_lru_cache_expires_entries():
+    # Given an entry with a ten second TTL
+    clock = FakeClock()
+    cache = LRUCache(max_entries=10, ttl=10, clock=clock)
+    cache.set("a", 1)
+    # When the TTL elapses
+    clock.now = 11
+    # Then the entry is gone
+    assert cache.get("a") != 1
+    assert cache.expirations == 1
+
+def test_read_endpoints_hit_cache_until_write(client, db_session, cache):
+    # Given a user with one connection
+    a = create_user(db_session, schemas.UserCreate(name="A", email="a@example.com"))
+    b = create_user(db_session, schemas.UserCreate(name="B", email="b@example.com"))
+    c = create_user(db_session, schemas.UserCreate(name="C", email="c@example.com"))
+    create_connection(db_session, a.id, b.id)
+    # When reading the same connections twice
+    first = client.get(f"/users/{a.id}/connections").json()
+    second = client.get(f"/users/{a.id}/connections").json()
+    # Then the second read is served from the cache
+    assert first == second
+    assert cache.hits == 1
+    # And a new connection invalidates exactly the affected user
+    create_connection(db_session, a.id, c.id)
+    assert {user["id"] for user in client.get(f"/users/{a.id}/connections").json()} == {str(b.id), str(c.id)}
+
+def test_stats_endpoint_invalidated_by_writes(client, db_session, cache):
+    # Given cached statistics
+    create_user(db_session, schemas.UserCreate(name="A", email="a@example.com"))
+    assert client.get("/stats/").json()["user_count"] == 1
+    # When another user is created
+    create_user(db_session, schemas.UserCreate(name="B", email="b@example.com"))
+    # Then the statistics are recomputed
+    assert client.get("/stats/").json()["user_count"] == 2
+
+def test_cache_metrics_endpoint(client, cache):
+    # When reading the cache counters
+    response = client.get("/stats/cache")
+    # Then hits, misses and evictions are reported
+    assert response.status_code == 200
+    assert {"hits", "misses", "evictions", "invalidations"} <= response.json().keys()
+
+def test_shared_cache_bumps_tags_in_one_round_trip():
+    # Given the shared backend
+    client = FakeRedis()
+    cache = SharedCache(client, ttl=60)
+    # When a write invalidates several tags
+    cache.bump(["a", "b", "c"])
+    # Then they are incremented together
+    assert client.round_trips == 1
+    assert cache.versions(["a", "b", "c"]) == (1, 1, 1)
+
+def test_high_degree_delete_uses_coarse_tag(client, db_session, cache, monkeypatch):
+    # Given a hub with more connections than the fan-out limit, and a cached neighbor list
+    monkeypatch.setattr(user_crud, "settings", Settings(cache_fanout_limit=2))
+    hub = create_user(db_session, schemas.UserCreate(name="Hub", email="hub@example.com"))
+    spokes = [create_user(db_session, schemas.UserCreate(name=f"S{i}", email=f"s{i}@example.com")) for i in range(3)]
+    for spoke in spokes:
+        create_connection(db_session, hub.id, spoke.id)
+    assert [user["id"] for user in client.get(f"/users/{spokes[0].id}/connections").json()] == [str(hub.id)]
+    before = cache.versions([CONNECTIONS_TAG, user_tag(spokes[1].id)])
+    # When the hub is deleted
+    delete_user(db_session, hub.id)
+    # Then one coarse tag is bumped instead of one per neighbor, and the list is fresh
+    after = cache.versions([CONNECTIONS_TAG, user_tag(spokes[1].id)])
+    assert (after[0] - before[0], after[1] - before[1]) == (1, 0)
+    assert client.get(f"/users/{spokes[0].id}/connections").json() == []
+
+@pytest.mark.parametrize("path", ["/users/?limit=10", "/users/{a}/connections", "/stats/"])
+def test_conditional_requests_skip_the_query(client, db_session, cache, monkeypatch, path):
+    # Given a response with a validator
+    a = create_user(db_session, schemas.UserCreate(name="A", email="a@example.com"))
+    b = create_user(db_session, schemas.UserCreate(name="B", email="b@example.com"))
+    url = path.format(a=a.id)
+    first = client.get(url)
+    etag = first.headers["etag"]
+    assert first.status_code == 200 and first.headers["cache-control"] == "no-cache"
+    # When the client revalidates while the database is unreachable
+    monkeypatch.setattr(db_session, "execute", lambda *args, **kwargs: pytest.fail("query ran"))
+    revalidated = client.get(url, headers={"If-None-Match": f'"other", {etag}'})
+    # Then it is told its copy is current, without a body
+    assert revalidated.status_code == 304 and revalidated.content == b"" and revalidated.headers["etag"] == etag
+    monkeypatch.undo()
+    # And after writes that change the response, the validator changes
+    create_connection(db_session, a.id, b.id)
+    create_user(db_session, schemas.UserCreate(name="C", email="c@example.com"))
+    changed = client.get(url, headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+
+def test_etag_matching():
+    assert etag_matches('W/"abc"', 'W/"abc"') and etag_matches('"abc"', 'W/"abc"')
+    assert etag_matches('"x", W/"abc"', 'W/"abc"') and etag_matches("*", 'W/"abc"')
+    assert not etag_matches(None, 'W/"abc"') and not etag_matches('"abcd"', 'W/"abc"')
+
+def test_in_process_validators_expire_with_the_cache_ttl():
+    # Other workers' writes do not bump this process's versions, so the
+    # validator must not outlive what the cache would serve
+    cache = ResponseCache(LRUCache(), etag_window=30)
+    assert cache.etag("stats", ["stats"], clock=lambda: 10) == cache.etag("stats", ["stats"], clock=lambda: 20)
+    assert cache.etag("stats", ["stats"], clock=lambda: 10) != cache.etag("stats", ["stats"], clock=lambda: 40)
+    shared = ResponseCache(SharedCache(FakeRedis()), etag_window=30)
+    assert shared.etag("stats", ["stats"], clock=lambda: 10) == shared.etag("stats", ["stats"], clock=lambda: 40)
+
+def test_large_responses_are_compressed(client, db_session, cache):
+    # Given enough users for the page to pass the size threshold
+    for i in range(30):
+        create_user(db_session, schemas.UserCreate(name=f"User {i}", email=f"user{i}@example.com"))
+    # Then the page is gzipped and the small stats body is not
+    page = client.get("/users/", headers={"Accept-Encoding": "gzip"})
+    assert page.headers["content-encoding"] == "gzip" and len(page.json()) == 30
+    assert "content-encoding" not in client.get("/stats/", headers={"Accept-Encoding": "gzip"}).headers
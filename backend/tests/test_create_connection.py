@@ -3,7 +3,7 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 import pytest
 import uuid
-from backend.models.models import User, Base
+from models.models import User, Base
 from crud.user_crud import create_connection
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
@@ -9,7 +9,7 @@ from fastapi.testclient import TestClient
 from main import app
 from fastapi import HTTPException
 
-from backend.models.models import Base, User
+from models.models import Base, User
 import schemas
 from crud.user_crud import create_user
 
@@ -0,0 +1,52 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from sqlalchemy import text
+
+from core.config import Settings
+from db.database import build_engine, engine_options, pool_capacity
+
+
+def test_settings_from_env(monkeypatch):
+    # Given database settings in the environment
+    monkeypatch.setenv("DATABASE_URL", "postgresql://app@db/app")
+    monkeypatch.setenv("DB_POOL_SIZE", "7")
+    monkeypatch.setenv("DB_POOL_PRE_PING", "false")
+    # When loading the settings
+    config = Settings.from_env()
+    # Then they override the defaults and the async URL follows the sync one
+    assert config.db_pool_size == 7
+    assert config.db_pool_pre_ping is False
+    assert config.resolved_async_database_url() == "postgresql+asyncpg://app@db/app"
+
+def test_engine_options_for_postgres():
+    # Given a PostgreSQL URL
+    options = engine_options("postgresql://app@db/app", Settings(db_pool_size=3, db_statement_timeout_ms=1500))
+    # Then the pool is sized and the statement timeout is sent on connect
+    assert options["pool_size"] == 3
+    assert options["connect_args"]["options"] == "-c statement_timeout=1500"
+
+def test_sqlite_pragmas_applied_on_connect(tmp_path):
+    # Given an engine on a SQLite file
+    engine = build_engine(f"sqlite:///{tmp_path / 'pragmas.db'}", Settings(sqlite_busy_timeout_ms=1234))
+    # When opening a connection
+    with engine.connect() as connection:
+        pragma = lambda name: connection.execute(text(f"PRAGMA {name}")).scalar()
+        # Then the connect-time pragmas are in effect
+        assert pragma("journal_mode") == "wal"
+        assert pragma("synchronous") == 1  # NORMAL
+        assert pragma("busy_timeout") == 1234
+        assert pragma("cache_size") == -64000
+
+def test_in_memory_sqlite_skips_pool_sizing():
+    # Given an in-memory SQLite URL
+    options = engine_options("sqlite:///:memory:", Settings())
+    # Then no pool sizing is passed (it uses a single shared connection)
+    assert "pool_size" not in options
+
+def test_pool_capacity_bounds_sessions():
+    # Given a pooled file database and an in-memory one
+    config = Settings(db_pool_size=4, db_max_overflow=2)
+    # Then sessions are bounded by pool plus overflow, and unbounded in memory
+    assert pool_capacity("sqlite:///./app.db", config) == 6
+    assert pool_capacity("sqlite:///:memory:", config) is None
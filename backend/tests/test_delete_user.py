@@ -0,0 +1,67 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+import uuid
+import pytest
+from sqlalchemy import create_engine, delete, func
+from sqlalchemy.orm import sessionmaker
+
+import schemas
+from models.models import Base, Connection, User, UserAdjacency
+from crud.statistics_crud import get_statistics, reconcile_statistics
+from crud.user_crud import create_connection, create_user, delete_user, get_user_connections
+from db.database import install_sqlite_pragmas
+
+
+@pytest.fixture
+def db_session():
+    # Create an in-memory SQLite database with the app's pragmas (foreign keys on)
+    engine = create_engine("sqlite:///:memory:")
+    install_sqlite_pragmas(engine)
+    Base.metadata.create_all(engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+@pytest.fixture
+def users(db_session):
+    return [create_user(db_session, schemas.UserCreate(name=f"User {i}", email=f"user{i}@example.com")) for i in range(4)]
+
+
+def test_delete_user_removes_edges_in_both_directions(db_session, users):
+    # Given a user who made one connection and received two
+    a, b, c, d = users
+    create_connection(db_session, a.id, b.id)
+    create_connection(db_session, c.id, a.id)
+    create_connection(db_session, d.id, a.id)
+    create_connection(db_session, b.id, c.id)
+    # When deleting them
+    assert delete_user(db_session, a.id) is True
+    # Then none of their connections or adjacency rows are left behind
+    assert db_session.query(func.count(Connection.id)).scalar() == 1
+    assert db_session.query(UserAdjacency).filter(
+        (UserAdjacency.user_id == a.id) | (UserAdjacency.neighbor_id == a.id)
+    ).count() == 0
+    assert [user.id for user in get_user_connections(db_session, b.id)] == [c.id]
+    # And the counters were adjusted in the same step
+    stats = get_statistics(db_session)
+    assert (stats["user_count"], stats["connection_count"]) == (3, 1)
+    assert reconcile_statistics(db_session) == {}
+
+def test_delete_unknown_user(db_session, users):
+    # Given an id nobody has, then nothing is deleted
+    assert delete_user(db_session, uuid.uuid4()) is False
+    assert get_statistics(db_session)["user_count"] == 4
+
+def test_foreign_keys_cascade(db_session, users):
+    # Given a connection, when the user row is removed without the CRUD layer
+    a, b, _, _ = users
+    create_connection(db_session, a.id, b.id)
+    db_session.execute(delete(User).where(User.id == b.id))
+    db_session.commit()
+    # Then the database removes the edges itself
+    assert db_session.query(func.count(Connection.id)).scalar() == 0
+    assert db_session.query(func.count(UserAdjacency.user_id)).scalar() == 0
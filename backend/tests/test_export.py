@@ -0,0 +1,111 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+import csv
+import io
+import json
+import mmap
+from dataclasses import replace
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from fastapi.testclient import TestClient
+
+import routes.export as export_routes
+import schemas
+from models.models import Base
+from core.export import EdgeListEncoder, read_edge_list
+from crud.user_crud import create_connection, create_user
+from db.database import get_read_db, get_write_db
+from main import app
+
+# Setup a test database (in-memory SQLite shared across threads for the API client)
+engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def db_session():
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture
+def graph(db_session):
+    # Four users, one of them without connections, and three connections
+    users = [create_user(db_session, schemas.UserCreate(name=f"User {i}", email=f"user{i}@example.com")) for i in range(4)]
+    ids = [user.id for user in users]
+    for a, b in ((0, 1), (1, 2), (2, 0)):
+        create_connection(db_session, ids[a], ids[b])
+    return ids
+
+@pytest.fixture
+def client(db_session, monkeypatch):
+    # Small chunks so every export spans several of them
+    monkeypatch.setattr(export_routes, "settings", replace(export_routes.settings, export_chunk_size=2))
+    app.dependency_overrides[get_read_db] = app.dependency_overrides[get_write_db] = lambda: db_session
+    try:
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_export_users(client, graph):
+    lines = client.get("/export/users").text.splitlines()
+    assert sorted(json.loads(line)["id"] for line in lines) == sorted(map(str, graph))
+
+    response = client.get("/export/users", params={"format": "csv"})
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert sorted(row["email"] for row in rows) == [f"user{i}@example.com" for i in range(4)]
+
+    assert client.get("/export/users", params={"format": "binary"}).status_code == 422
+
+def test_export_edges(client, graph):
+    expected = sorted((str(graph[a]), str(graph[b])) for a, b in ((0, 1), (1, 2), (2, 0)))
+    lines = [json.loads(line) for line in client.get("/export/edges").text.splitlines()]
+    assert sorted((line["user_id"], line["connected_user_id"]) for line in lines) == expected
+
+    rows = list(csv.DictReader(io.StringIO(client.get("/export/edges", params={"format": "csv"}).text)))
+    assert sorted((row["user_id"], row["connected_user_id"]) for row in rows) == expected
+    assert all(row["connection_made_at"] for row in rows)
+
+def test_export_edge_list(client, graph, tmp_path):
+    response = client.get("/export/edges", params={"format": "binary"})
+    assert response.status_code == 200
+    path = tmp_path / "edges.bin"
+    path.write_bytes(response.content)
+    # When the file is memory-mapped
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        edges = read_edge_list(mapped)
+        # Then the ids are every user, in id order, and the pairs index into them
+        assert edges.node_count == 4 and edges.edge_count == 3
+        assert [edges.user_id(index) for index in range(4)] == sorted(graph)
+        pairs = edges.pairs.tolist()
+        assert list(zip(pairs[::2], pairs[1::2])) == sorted(zip(pairs[::2], pairs[1::2]))
+        found = sorted((edges.user_id(pairs[i]), edges.user_id(pairs[i + 1])) for i in range(0, len(pairs), 2))
+        del edges, pairs
+    assert found == sorted((graph[a], graph[b]) for a, b in ((0, 1), (1, 2), (2, 0)))
+
+def test_edge_list_checks():
+    # Users have to come before the connections, in index order
+    with pytest.raises(RuntimeError):
+        EdgeListEncoder().encode([(0, None, 1, None)])
+    with pytest.raises(ValueError):
+        read_edge_list(EdgeListEncoder().footer()[:-1])
+    assert read_edge_list(EdgeListEncoder().footer()).edge_count == 0
+
+def test_export_concurrency_limit(client, graph, monkeypatch):
+    # Given every export slot taken
+    monkeypatch.setattr(export_routes, "_slots", export_routes.threading.BoundedSemaphore(1))
+    export_routes._slots.acquire()
+    # Then further exports are turned away until one finishes
+    assert client.get("/export/users").status_code == 429
+    export_routes._slots.release()
+    assert client.get("/export/users").status_code == 200
+    assert client.get("/export/users").status_code == 200
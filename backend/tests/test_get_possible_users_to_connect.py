@@ -0,0 +1,74 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from models.models import Base, User
+from crud.user_crud import create_connection, get_possible_users_to_connect
+
+
+@pytest.fixture
+def db_session():
+    # Create an in-memory SQLite database for testing
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+@pytest.fixture
+def graph(db_session):
+    # me - f1, me - f2, f1 - fof, f2 - fof, f1 - other_fof, and an unrelated stranger
+    names = ["me", "f1", "f2", "fof", "other_fof", "stranger"]
+    users = {name: User(name=name, email=f"{name}@example.com") for name in names}
+    db_session.add_all(users.values())
+    db_session.commit()
+    for a, b in [("me", "f1"), ("me", "f2"), ("f1", "fof"), ("f2", "fof"), ("f1", "other_fof")]:
+        create_connection(db_session, users[a].id, users[b].id)
+    return users
+
+
+def test_possible_users_ranked_by_mutual_connections(db_session, graph):
+    # When retrieving possible connections for "me"
+    result = get_possible_users_to_connect(db_session, graph["me"].id)
+    # Then existing neighbors and "me" are excluded and friends-of-friends come first
+    assert [(user.name, mutual) for user, mutual in result] == [
+        ("fof", 2),
+        ("other_fof", 1),
+        ("stranger", 0),
+    ]
+
+def test_possible_users_pagination(db_session, graph):
+    # When paging one candidate at a time
+    first = get_possible_users_to_connect(db_session, graph["me"].id, limit=1)
+    second = get_possible_users_to_connect(db_session, graph["me"].id, limit=1, offset=1)
+    # Then the pages follow the ranking
+    assert [user.name for user, _ in first] == ["fof"]
+    assert [user.name for user, _ in second] == ["other_fof"]
+
+def test_possible_users_without_connections(db_session, graph):
+    # Given a user with no connections
+    # Then everybody else is a candidate with zero mutual connections
+    result = get_possible_users_to_connect(db_session, graph["stranger"].id, limit=10)
+    assert len(result) == 5
+    assert all(mutual == 0 for _, mutual in result)
+
+def test_possible_users_pages_past_the_friends_of_friends(db_session, graph):
+    # Given more strangers, sorted by id as the filler pages are
+    strangers = [User(name=f"stranger{i}", email=f"stranger{i}@example.com") for i in range(4)]
+    db_session.add_all(strangers)
+    db_session.commit()
+    expected = sorted([graph["stranger"], *strangers], key=lambda user: user.id)
+    # When one page holds the last friend-of-friend and another lies past them all
+    straddling = get_possible_users_to_connect(db_session, graph["me"].id, limit=3, offset=1)
+    beyond = get_possible_users_to_connect(db_session, graph["me"].id, limit=2, offset=4)
+    # Then the ranking continues into the users without mutual connections, by id
+    assert [(user.id, mutual) for user, mutual in straddling] == [
+        (graph["other_fof"].id, 1), (expected[0].id, 0), (expected[1].id, 0),
+    ]
+    assert [(user.id, mutual) for user, mutual in beyond] == [(expected[2].id, 0), (expected[3].id, 0)]
@@ -0,0 +1,89 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import schemas
+from models.models import Base, User, StatsSummary
+from crud.statistics_crud import get_statistics, reconcile_statistics, seed_summary
+from crud.user_crud import create_connection, create_user, delete_connection, delete_user
+
+
+@pytest.fixture
+def db_session():
+    # Create an in-memory SQLite database for testing
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+@pytest.fixture
+def users(db_session):
+    # Create three users through the CRUD layer so the counters are maintained
+    return [create_user(db_session, schemas.UserCreate(name=f"User {i}", email=f"user{i}@example.com")) for i in range(3)]
+
+
+def test_get_statistics_empty_database(db_session):
+    # Given no users
+    stats = get_statistics(db_session)
+    # Then all counters are zero
+    assert stats == {
+        'user_count': 0,
+        'connection_count': 0,
+        'average_connections_per_user': 0.0,
+        'last_connection': None,
+    }
+
+def test_get_statistics_does_not_write(db_session):
+    # Given a database whose summary row was never seeded
+    db_session.add(User(name="Raw", email="raw@example.com"))
+    db_session.commit()
+    # Then reading computes the counters without inserting the row
+    assert get_statistics(db_session)['user_count'] == 1
+    assert db_session.get(StatsSummary, 1) is None
+    # And seeding is idempotent
+    assert seed_summary(db_session) is True
+    assert seed_summary(db_session) is False
+    assert db_session.get(StatsSummary, 1).user_count == 1
+
+def test_get_statistics_tracks_writes(db_session, users):
+    # Given two connections between three users
+    a, b, c = users
+    create_connection(db_session, a.id, b.id)
+    latest = create_connection(db_session, b.id, c.id)
+    # When reading the statistics
+    stats = get_statistics(db_session)
+    # Then the counters reflect the writes without rescanning the tables
+    assert stats['user_count'] == 3
+    assert stats['connection_count'] == 2
+    assert stats['average_connections_per_user'] == pytest.approx(4 / 3)
+    assert stats['last_connection'] == latest.connection_made_at
+
+def test_get_statistics_after_deletes(db_session, users):
+    # Given a connection that is removed again, and a deleted user
+    a, b, c = users
+    create_connection(db_session, a.id, b.id)
+    delete_connection(db_session, a.id, b.id)
+    delete_user(db_session, c.id)
+    # Then the counters go back down
+    stats = get_statistics(db_session)
+    assert stats['user_count'] == 2
+    assert stats['connection_count'] == 0
+    assert stats['last_connection'] is None
+
+def test_reconcile_statistics_repairs_drift(db_session, users):
+    # Given counters that drifted from the tables (e.g. a raw insert bypassing the CRUD layer)
+    db_session.add(User(name="Raw", email="raw@example.com"))
+    db_session.commit()
+    # When reconciling
+    drift = reconcile_statistics(db_session)
+    # Then the drift is reported and repaired
+    assert drift == {'user_count': (3, 4)}
+    assert db_session.get(StatsSummary, 1).user_count == 4
+    assert reconcile_statistics(db_session) == {}
@@ -1,7 +1,7 @@
 import pytest
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from backend.models.models import Base, User
+from models.models import Base, User
 from crud.user_crud import get_user_by_email
 
 # Setup a test database (in-memory SQLite for simplicity)
@@ -1,6 +1,6 @@
 import pytest
 import uuid
-from backend.models.models import User, Base
+from models.models import User, Base
 from crud.user_crud import get_user_by_id
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
@@ -0,0 +1,96 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+from models.models import Base, User, Connection, UserAdjacency
+from crud.user_crud import (
+    backfill_adjacency,
+    create_connection,
+    delete_connection,
+    get_connection,
+    get_user_connections,
+)
+
+
+@pytest.fixture
+def db_session():
+    # Create an in-memory SQLite database for testing
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+@pytest.fixture
+def users(db_session):
+    # Create and return three sample users
+    users = [User(name=f"User {i}", email=f"user{i}@example.com") for i in range(3)]
+    db_session.add_all(users)
+    db_session.commit()
+    return users
+
+
+def test_get_user_connections_both_directions(db_session, users):
+    # Given A -> B and C -> A
+    a, b, c = users
+    create_connection(db_session, a.id, b.id)
+    create_connection(db_session, c.id, a.id)
+    # When retrieving A's connections
+    connected = get_user_connections(db_session, a.id)
+    # Then both neighbors are returned regardless of who initiated
+    assert {user.id for user in connected} == {b.id, c.id}
+    assert [user.id for user in get_user_connections(db_session, b.id)] == [a.id]
+
+def test_get_connection_is_undirected(db_session, users):
+    # Given A -> B
+    a, b, c = users
+    connection = create_connection(db_session, a.id, b.id)
+    # Then the connection is found from either side and not for unrelated users
+    assert get_connection(db_session, a.id, b.id).id == connection.id
+    assert get_connection(db_session, b.id, a.id).id == connection.id
+    assert get_connection(db_session, a.id, c.id) is None
+
+def test_create_connection_duplicate_is_rejected(db_session, users):
+    # Given A -> B
+    a, b, _ = users
+    create_connection(db_session, a.id, b.id)
+    # When/Then creating B -> A violates the adjacency primary key
+    with pytest.raises(IntegrityError):
+        create_connection(db_session, b.id, a.id)
+    db_session.rollback()
+    assert db_session.query(Connection).count() == 1
+
+def test_delete_connection_from_receiver_side(db_session, users):
+    # Given A -> B
+    a, b, _ = users
+    create_connection(db_session, a.id, b.id)
+    # When B removes the connection
+    assert delete_connection(db_session, b.id, a.id) is True
+    # Then the connection and both adjacency rows are gone
+    assert db_session.query(Connection).count() == 0
+    assert db_session.query(UserAdjacency).count() == 0
+    assert delete_connection(db_session, a.id, b.id) is False
+
+def test_backfill_adjacency_from_legacy_rows(db_session, users):
+    # Given legacy connections written without adjacency rows, including a duplicate edge
+    a, b, c = users
+    db_session.add_all([
+        Connection(user_id=a.id, connected_user_id=b.id),
+        Connection(user_id=b.id, connected_user_id=a.id),
+        Connection(user_id=a.id, connected_user_id=c.id),
+    ])
+    db_session.commit()
+    # When backfilling
+    written = backfill_adjacency(db_session)
+    # Then each undirected edge is materialized once per direction
+    assert written == 4
+    assert {user.id for user in get_user_connections(db_session, a.id)} == {b.id, c.id}
+    # And running it again is a no-op
+    assert backfill_adjacency(db_session) == 0
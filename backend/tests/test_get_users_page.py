@@ -0,0 +1,114 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+import json
+import pytest
+from datetime import datetime
+import uuid
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from fastapi.testclient import TestClient
+
+from models.models import Base, User
+from crud.user_crud import get_users_page, iter_users
+from db.database import get_read_db, get_write_db
+from db.migrations import normalize_timestamps
+from main import app
+
+# Setup a test database (in-memory SQLite shared across threads for the API client)
+DATABASE_URL = "sqlite:///:memory:"
+engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def db_session():
+    # Create the database tables
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture
+def sample_users(db_session):
+    # Five users sharing the same created_at so the id tie-breaker is exercised
+    created_at = datetime(2024, 1, 1, 12, 0, 0)
+    users = [User(name=f"User {i}", email=f"user{i}@example.com", created_at=created_at) for i in range(5)]
+    db_session.add_all(users)
+    db_session.commit()
+    return sorted(users, key=lambda u: u.id.hex)
+
+@pytest.fixture
+def client(db_session):
+    app.dependency_overrides[get_read_db] = app.dependency_overrides[get_write_db] = lambda: db_session
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+def test_get_users_page_walks_all_users_once(db_session, sample_users):
+    # Given five users and a page size of two
+    seen = []
+    cursor = None
+    # When following the cursors until the last page
+    while True:
+        page, cursor = get_users_page(db_session, limit=2, cursor=cursor)
+        seen.extend(user.id for user in page)
+        if cursor is None:
+            break
+    # Then every user is returned exactly once, in id order for equal created_at
+    assert seen == [user.id for user in sample_users]
+
+def test_get_users_page_with_server_default_timestamps(db_session):
+    # Given five legacy rows whose created_at came from CURRENT_TIMESTAMP (second precision)
+    ids = sorted(uuid.uuid4() for _ in range(5))
+    for i, user_id in enumerate(ids):
+        db_session.execute(
+            text("INSERT INTO users (id, name, email, created_at) VALUES (:id, :name, :email, '2024-01-01 10:00:00')"),
+            {"id": user_id.bytes, "name": f"Legacy {i}", "email": f"legacy{i}@example.com"},
+        )
+    db_session.commit()
+    # When the timestamps are normalized and the users paged two at a time
+    assert normalize_timestamps(db_session.connection()) == 5
+    seen, cursor = [], None
+    while True:
+        page, cursor = get_users_page(db_session, limit=2, cursor=cursor)
+        seen.extend(user.id for user in page)
+        if cursor is None:
+            break
+    # Then none of them is skipped
+    assert seen == ids
+
+def test_get_users_page_invalid_cursor(db_session):
+    # Given a cursor that was not produced by the API
+    # When/Then
+    with pytest.raises(ValueError):
+        get_users_page(db_session, limit=2, cursor="not-a-cursor")
+
+def test_iter_users_streams_rows(db_session, sample_users):
+    # When streaming with a chunk size smaller than the table
+    rows = list(iter_users(db_session, chunk_size=2))
+    # Then all users come back in keyset order
+    assert [row.id for row in rows] == [user.id for user in sample_users]
+
+def test_get_users_endpoint_sets_next_cursor(client, sample_users):
+    # When requesting the first page over HTTP
+    response = client.get("/users/", params={"limit": 3})
+    # Then the page is returned with a cursor for the rest
+    assert response.status_code == 200
+    assert len(response.json()) == 3
+    next_page = client.get("/users/", params={"limit": 3, "cursor": response.headers["X-Next-Cursor"]})
+    assert len(next_page.json()) == 2
+    assert "X-Next-Cursor" not in next_page.headers
+
+def test_get_users_endpoint_ndjson_stream(client, sample_users):
+    # When asking for NDJSON
+    response = client.get("/users/", headers={"Accept": "application/x-ndjson"})
+    # Then every user is streamed on its own line
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["id"] for line in lines] == [str(user.id) for user in sample_users]
@@ -0,0 +1,149 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+import random
+import threading
+import uuid
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import schemas
+from models.models import Base, User
+from core.graph_store import GraphStore, configure_graph_store
+from crud.graph_crud import find_path
+from crud.user_crud import (
+    create_connection,
+    create_connections_batch,
+    delete_connection,
+    delete_user,
+    get_connection,
+    get_neighbor_ids,
+    get_possible_user_rows,
+    get_possible_users_to_connect,
+    get_user_connections,
+)
+
+
+@pytest.fixture
+def db_session():
+    # Create an in-memory SQLite database for testing
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+@pytest.fixture
+def store():
+    # A fresh process-wide store, not loaded until a test asks for it
+    store = GraphStore()
+    previous = configure_graph_store(store)
+    yield store
+    configure_graph_store(previous)
+
+@pytest.fixture
+def graph(db_session):
+    # 30 users and a random set of edges between them
+    rng = random.Random(7)
+    users = [User(name=f"User {i}", email=f"user{i}@example.com") for i in range(30)]
+    db_session.add_all(users)
+    db_session.commit()
+    pairs = {tuple(sorted(rng.sample(range(30), 2))) for _ in range(80)}
+    for a, b in sorted(pairs):
+        create_connection(db_session, users[a].id, users[b].id)
+    return users
+
+
+def test_store_answers_like_sql(db_session, store, graph):
+    # Given the answers straight from SQL
+    expected_neighbors = {user.id: sorted(get_neighbor_ids(db_session, user.id)) for user in graph}
+    expected_possible = {user.id: get_possible_users_to_connect(db_session, user.id, limit=5, offset=2) for user in graph}
+    expected_path = find_path(db_session, graph[0].id, graph[29].id)
+    # When the store is loaded
+    store.load(db_session, chunk_size=7)
+    # Then every read gives the same result from memory
+    for user in graph:
+        assert sorted(get_neighbor_ids(db_session, user.id)) == expected_neighbors[user.id]
+        assert store.degree(user.id) == len(expected_neighbors[user.id])
+        assert [(u.id, count) for u, count in get_possible_users_to_connect(db_session, user.id, limit=5, offset=2)] == \
+            [(u.id, count) for u, count in expected_possible[user.id]]
+    a, b = graph[0].id, expected_neighbors[graph[0].id][0]
+    assert store.is_connected(a, b) and get_connection(db_session, a, b) is not None
+    assert store.mutual_ids(a, b) == sorted(set(expected_neighbors[a]) & set(expected_neighbors[b]))
+    assert len(find_path(db_session, graph[0].id, graph[29].id)) == len(expected_path)
+    # And the rows variant carries the same counts
+    rows = get_possible_user_rows(db_session, graph[0].id, limit=5, offset=2)
+    assert [(row.id, row.mutual_count) for row in rows] == [(u.id, count) for u, count in expected_possible[graph[0].id]]
+    assert store.memory_usage()["edges"] == sum(map(len, expected_neighbors.values())) // 2
+
+def test_writes_are_published_to_the_store(db_session, store, graph):
+    # Given a loaded store
+    store.load(db_session)
+    a, b, c = graph[0], graph[1], graph[2]
+    # When connections are made and removed through the CRUD layer
+    delete_connection(db_session, a.id, b.id)
+    create_connection(db_session, a.id, b.id)
+    create_connections_batch(db_session, [(0, schemas.ConnectionCreate(user_id=b.id, connected_user_id=c.id))])
+    delete_user(db_session, graph[3].id)
+    # Then the store matches the database
+    store_view = {user.id: sorted(get_neighbor_ids(db_session, user.id)) for user in graph}
+    configure_graph_store(GraphStore())
+    assert store_view == {user.id: sorted(get_neighbor_ids(db_session, user.id)) for user in graph}
+    assert [user.id for user in get_user_connections(db_session, graph[3].id)] == []
+
+def test_unloaded_store_defers_to_sql(db_session, store, graph):
+    # Given a store that was never loaded
+    a, b = graph[0].id, graph[29].id
+    store.add_edges([(a, b)])
+    # Then it answers nothing and ignored the write, and reads fall back to SQL
+    assert store.neighbor_ids(a) is None and store.is_connected(a, b) is None
+    assert store.memory_usage()["edges"] == 0
+    assert sorted(get_neighbor_ids(db_session, a)) == sorted(user.id for user in get_user_connections(db_session, a))
+
+def test_late_publish_cannot_undo_a_newer_commit(db_session, store, graph):
+    # Given a loaded store and an edge that gets deleted and then made again
+    store.load(db_session)
+    a, b = graph[0].id, get_neighbor_ids(db_session, graph[0].id)[0]
+    published = configure_graph_store(GraphStore())
+    delete_connection(db_session, a, b)
+    create_connection(db_session, a, b)
+    configure_graph_store(published)
+    # When the create is published first and the delete, committed before it, last
+    store.sync_edges(db_session, [(a, b)])  # create
+    store.sync_edges(db_session, [(a, b)])  # delete
+    # Then the store still holds the edge, as the database does
+    assert store.is_connected(a, b) is True
+
+def test_reads_do_not_wait_for_a_publishing_writer(store):
+    # Given a loaded store and a writer whose post-commit read is stuck in the database
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    store.load(db)
+    entered, release = threading.Event(), threading.Event()
+    execute = db.execute
+
+    def stuck_execute(*args, **kwargs):
+        entered.set()
+        release.wait(5)
+        return execute(*args, **kwargs)
+
+    db.execute = stuck_execute
+    a, b = uuid.uuid4(), uuid.uuid4()
+    writer = threading.Thread(target=store.sync_edges, args=(db, [(a, b)]))
+    writer.start()
+    try:
+        assert entered.wait(5)
+        # Then readers are still answered meanwhile
+        answered = threading.Event()
+        threading.Thread(target=lambda: (store.neighbor_ids(a), answered.set()), daemon=True).start()
+        assert answered.wait(1)
+    finally:
+        release.set()
+        writer.join(5)
+        db.close()
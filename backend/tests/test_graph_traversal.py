@@ -0,0 +1,96 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from fastapi.testclient import TestClient
+
+from models.models import Base, User
+import crud.graph_crud as graph_crud
+from crud.graph_crud import SearchLimitExceeded, find_path, get_network
+from crud.user_crud import create_connection
+from db.database import get_read_db, get_write_db
+from main import app
+
+# Setup a test database (in-memory SQLite shared across threads for the API client)
+DATABASE_URL = "sqlite:///:memory:"
+engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def db_session():
+    # Create the database tables
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture
+def users(db_session):
+    # A chain 0-1-2-3-4 with a shortcut 0-5-3, and user 6 left unconnected
+    users = [User(name=f"User {i}", email=f"user{i}@example.com") for i in range(7)]
+    db_session.add_all(users)
+    db_session.commit()
+    for x, y in [(0, 1), (1, 2), (2, 3), (3, 4), (0, 5), (3, 5)]:
+        create_connection(db_session, users[x].id, users[y].id)
+    return users
+
+@pytest.fixture
+def client(db_session):
+    app.dependency_overrides[get_read_db] = app.dependency_overrides[get_write_db] = lambda: db_session
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+def test_find_path_takes_the_shortest_route(db_session, users):
+    # When searching from 0 to 4
+    path = find_path(db_session, users[0].id, users[4].id)
+    # Then the shortcut through 5 is used
+    assert path == [users[i].id for i in (0, 5, 3, 4)]
+    # And the reverse search returns the same path reversed
+    assert find_path(db_session, users[4].id, users[0].id) == path[::-1]
+
+def test_find_path_respects_depth_and_disconnected_users(db_session, users):
+    # Then a path longer than max_depth is not found, nor one to an isolated user
+    assert find_path(db_session, users[0].id, users[4].id, max_depth=2) is None
+    assert find_path(db_session, users[0].id, users[6].id) is None
+    assert find_path(db_session, users[0].id, users[0].id) == [users[0].id]
+
+def test_find_path_stops_at_the_visit_cap(db_session, users, client, monkeypatch):
+    # Once the cap is reached mid-level, the search gives up instead of finishing the level
+    with pytest.raises(SearchLimitExceeded):
+        find_path(db_session, users[0].id, users[4].id, max_visited=3)
+    # And the endpoint tells that apart from "no path"
+    monkeypatch.setattr(graph_crud, "MAX_VISITED", 3)
+    response = client.get(f"/users/{users[0].id}/path/{users[4].id}")
+    assert response.status_code == 422
+    assert "limit" in response.json()["detail"]
+
+def test_get_network_groups_users_by_distance(db_session, users):
+    # When walking two hops around user 0
+    levels, truncated = get_network(db_session, users[0].id, depth=2)
+    # Then direct connections come first and second-degree ones next
+    assert [set(level) for level in levels] == [{users[1].id, users[5].id}, {users[2].id, users[3].id}]
+    assert truncated is False
+    # And the walk stops once the cap is reached
+    levels, truncated = get_network(db_session, users[0].id, depth=3, max_users=3)
+    assert sum(len(level) for level in levels) == 3
+    assert truncated is True
+
+def test_path_and_network_endpoints(client, users):
+    # When requesting the path and the network over the API
+    path = client.get(f"/users/{users[4].id}/path/{users[0].id}").json()
+    network = client.get(f"/users/{users[0].id}/network", params={"depth": 3}).json()
+    # Then the degrees of separation and the network size are reported
+    assert path["degrees"] == 3
+    assert [user["id"] for user in path["users"]] == [str(users[i].id) for i in (4, 3, 5, 0)]
+    assert network["size"] == 5
+    assert [level["degree"] for level in network["levels"]] == [1, 2, 3]
+    # And unreachable users give a 404
+    assert client.get(f"/users/{users[0].id}/path/{users[6].id}").status_code == 404
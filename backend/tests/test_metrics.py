@@ -0,0 +1,95 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+import pytest
+from fastapi import APIRouter, Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from models.models import Base, User
+from core.metrics import Metrics, MetricsMiddleware, ProfiledRoute, RequestStats
+from db.database import get_db, get_read_db, get_write_db
+from main import app
+
+# Setup a test database (in-memory SQLite shared across threads for the API client)
+DATABASE_URL = "sqlite:///:memory:"
+engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def db_session():
+    # Create the database tables
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture
+def client(db_session):
+    app.dependency_overrides[get_read_db] = app.dependency_overrides[get_write_db] = lambda: db_session
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+def test_requests_report_their_queries(client, db_session):
+    # Given a user
+    user = User(name="A", email="a@example.com")
+    db_session.add(user)
+    db_session.commit()
+    # When fetching it through the API
+    response = client.post("/users/connect", json={"user_id": str(user.id), "connected_user_id": str(user.id)})
+    # Then the response says how many statements the request ran
+    assert response.status_code == 400
+    assert 'desc="2 queries"' in response.headers["server-timing"]
+    # And /metrics has the request under its route template
+    body = client.get("/metrics").text
+    assert 'http_request_duration_seconds_count{method="POST",route="/users/connect",status="400"}' in body
+    assert '# TYPE http_request_db_queries histogram' in body
+
+def test_slow_queries_are_sampled():
+    # Given metrics that treat every statement as slow
+    metrics = Metrics(slow_query_seconds=0.0, slow_query_samples=2)
+    # When three statements are observed
+    for index in range(3):
+        metrics.observe_query(f"SELECT {index}", 0.5)
+    # Then only the most recent samples are kept, and all are counted
+    assert [sample["sql"] for sample in metrics.slow_query_samples()] == ["SELECT 1", "SELECT 2"]
+    assert "db_slow_queries_total 3" in metrics.render()
+
+def test_histogram_rendering():
+    # Given one observed request with no queries
+    metrics = Metrics()
+    metrics.observe_request("GET", "/stats/", 200, 0.003, RequestStats())
+    body = metrics.render()
+    # Then buckets are cumulative and end with +Inf
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/stats/",status="200",le="0.0025"} 0' in body
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/stats/",status="200",le="0.005"} 1' in body
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/stats/",status="200",le="+Inf"} 1' in body
+
+def test_profile_header_returns_report(db_session):
+    # Given an app with profiling enabled and a sync endpoint that queries
+    router = APIRouter(route_class=ProfiledRoute)
+
+    @router.get("/work")
+    def work(db: Session = Depends(get_db)):
+        return {"value": db.execute(text("SELECT 1")).scalar()}
+
+    profiled_app = FastAPI()
+    profiled_app.add_middleware(MetricsMiddleware, metrics=Metrics(), profiling=True)
+    profiled_app.include_router(router)
+    profiled_app.dependency_overrides[get_db] = lambda: db_session
+    client = TestClient(profiled_app)
+    # When the request asks for a profile
+    response = client.get("/work", headers={"X-Profile": "tottime"})
+    # Then a pstats report of the endpoint is returned instead of the body
+    assert response.headers["x-profile-status"] == "200"
+    assert "function calls" in response.text
+    assert "work" in response.text
+    # And requests without the header are unaffected
+    assert client.get("/work").json() == {"value": 1}
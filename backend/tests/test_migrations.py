@@ -0,0 +1,89 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+import uuid
+from dataclasses import replace
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import Session, sessionmaker
+
+from models.models import Base, Connection, StatsSummary, User, UserAdjacency
+from core.config import settings
+from crud.statistics_crud import get_statistics
+from crud.user_crud import get_neighbor_ids
+from db.database import install_sqlite_pragmas
+from db.migrations import check_schema, missing_tables, run_migrations
+from main import create_app
+
+
+def test_run_migrations_adds_missing_indexes(tmp_path):
+    # Given a database created before the keyset and adjacency indexes existed
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        for name in ("ix_users_created_at_id", "ix_connections_connected_user_id", "ix_user_adjacency_neighbor_id"):
+            connection.execute(text(f"DROP INDEX {name}"))
+    # When migrating, twice
+    run_migrations(engine)
+    run_migrations(engine)
+    # Then every index declared on the models exists
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        assert {index.name for index in table.indexes} <= existing
+
+def test_run_migrations_backfills_adjacency(tmp_path):
+    # Given connections written before user_adjacency was maintained
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    Base.metadata.create_all(engine)
+    a, b = uuid.uuid4(), uuid.uuid4()
+    with Session(engine) as db:
+        db.add_all([User(id=a, name="A", email="a@example.com"), User(id=b, name="B", email="b@example.com")])
+        db.flush()
+        db.add(Connection(user_id=a, connected_user_id=b))
+        db.commit()
+    # When migrating
+    run_migrations(engine)
+    # Then the edge is readable from both sides, and the stats are seeded
+    with Session(engine) as db:
+        assert get_neighbor_ids(db, a) == [b] and get_neighbor_ids(db, b) == [a]
+        assert db.get(StatsSummary, 1).connection_count == 1
+
+def test_run_migrations_deletes_orphaned_connections(tmp_path):
+    # Given connections left behind by users deleted without them (foreign
+    # keys off, as older versions ran), and stats counting them
+    path = tmp_path / "legacy.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    a, b, gone = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    with Session(engine) as db:
+        db.add_all([User(id=a, name="A", email="a@example.com"), User(id=b, name="B", email="b@example.com")])
+        db.add_all([Connection(user_id=a, connected_user_id=b), Connection(user_id=a, connected_user_id=gone), Connection(user_id=gone, connected_user_id=b)])
+        db.add(StatsSummary(id=1, user_count=3, connection_count=3))
+        db.commit()
+    engine.dispose()
+    # When migrating with foreign keys enforced
+    engine = create_engine(f"sqlite:///{path}")
+    install_sqlite_pragmas(engine)
+    run_migrations(engine)
+    # Then only the connection between existing users is left, and counted
+    with Session(engine) as db:
+        assert db.query(Connection).count() == 1
+        assert db.query(UserAdjacency).count() == 2
+        assert get_neighbor_ids(db, a) == [b]
+        stats = get_statistics(db)
+        assert (stats["user_count"], stats["connection_count"]) == (2, 1)
+
+def test_check_schema_fails_fast_on_an_unmigrated_database(tmp_path):
+    # Given an empty database and an app that does not migrate on startup
+    engine = create_engine(f"sqlite:///{tmp_path / 'empty.db'}")
+    app = create_app(replace(settings, migrate_on_startup=False), engine, sessionmaker(bind=engine))
+    # Then starting it names the missing tables
+    with pytest.raises(RuntimeError, match="missing tables: .*users"):
+        with TestClient(app):
+            pass
+    # And once migrated, the check passes and the app serves
+    run_migrations(engine)
+    check_schema(engine)
+    assert missing_tables(engine) == []
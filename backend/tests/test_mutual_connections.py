@@ -0,0 +1,103 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+import uuid
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from fastapi.testclient import TestClient
+
+from models.models import Base, User
+from core.graph_store import GraphStore, configure_graph_store
+from crud.user_crud import (
+    create_connection,
+    delete_user,
+    get_degree,
+    get_mutual_connection_ids,
+    get_mutual_connection_rows,
+    get_mutual_counts,
+)
+from db.database import get_read_db, get_write_db
+from main import app
+
+# Setup a test database (in-memory SQLite shared across threads for the API client)
+engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def db_session():
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture
+def client(db_session):
+    app.dependency_overrides[get_read_db] = app.dependency_overrides[get_write_db] = lambda: db_session
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+@pytest.fixture(params=["sql", "graph_store"])
+def store(request, db_session):
+    # Every read is checked against SQL and against a loaded graph store
+    store = GraphStore()
+    previous = configure_graph_store(store)
+    yield store if request.param == "graph_store" else None
+    configure_graph_store(previous)
+
+@pytest.fixture
+def graph(db_session, store):
+    # a and b share c and d; a also knows e, b also knows f
+    users = {name: User(name=name, email=f"{name}@example.com") for name in "abcdef"}
+    db_session.add_all(users.values())
+    db_session.commit()
+    for x, y in [("a", "c"), ("a", "d"), ("a", "e"), ("c", "b"), ("b", "d"), ("b", "f")]:
+        create_connection(db_session, users[x].id, users[y].id)
+    if store is not None:
+        store.load(db_session)
+    return users
+
+
+def test_mutual_connections(db_session, graph):
+    # When intersecting the neighbor lists of a and b
+    a, b = graph["a"].id, graph["b"].id
+    expected = sorted([graph["c"].id, graph["d"].id])
+    # Then both lookups return the shared users in id order
+    assert get_mutual_connection_ids(db_session, a, b) == expected
+    assert [row.id for row in get_mutual_connection_rows(db_session, a, b)] == expected
+    assert get_degree(db_session, a) == 3 and get_degree(db_session, graph["f"].id) == 1
+
+def test_mutual_counts_follow_the_requested_pairs(db_session, graph):
+    # Given pairs in no particular order, with a repeat and an unknown user
+    ids = {name: user.id for name, user in graph.items()}
+    pairs = [(ids["a"], ids["b"]), (ids["b"], ids["a"]), (ids["e"], ids["c"]), (ids["a"], ids["b"]),
+             (ids["c"], ids["d"]), (ids["a"], uuid.uuid4())]
+    # Then each pair gets its own count, in request order
+    assert get_mutual_counts(db_session, pairs) == [2, 2, 1, 2, 2, 0]
+
+def test_mutual_after_delete(db_session, graph):
+    # When a shared connection is deleted, then the intersection shrinks
+    delete_user(db_session, graph["c"].id)
+    assert get_mutual_connection_ids(db_session, graph["a"].id, graph["b"].id) == [graph["d"].id]
+    assert get_mutual_counts(db_session, [(graph["a"].id, graph["b"].id)]) == [1]
+
+def test_mutual_endpoints(client, db_session, graph):
+    a, b = graph["a"].id, graph["b"].id
+    # The list endpoint returns the shared users and 404s on unknown ones
+    response = client.get(f"/users/{a}/mutual/{b}")
+    assert response.status_code == 200
+    assert [user["id"] for user in response.json()] == [str(user_id) for user_id in sorted([graph["c"].id, graph["d"].id])]
+    assert client.get(f"/users/{a}/mutual/{uuid.uuid4()}").status_code == 404
+    # The batch endpoint counts every pair in one call
+    response = client.post("/users/mutual_counts", json={"pairs": [
+        {"user_id": str(a), "other_user_id": str(b)},
+        {"user_id": str(graph["e"].id), "other_user_id": str(graph["c"].id)},
+    ]})
+    assert [count["mutual_connections"] for count in response.json()] == [2, 1]
+    # And the profile carries the number of connections
+    assert client.get(f"/users/{a}").json()["connection_count"] == 3
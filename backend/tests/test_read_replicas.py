@@ -0,0 +1,106 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from dataclasses import replace
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from fastapi.testclient import TestClient
+
+from models.models import Base, User
+from core.config import settings
+from db.database import configure_read_router, install_sqlite_pragmas
+from db.replicas import PIN_COOKIE, ReadRouter
+from main import create_app
+
+
+def file_database(path):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    install_sqlite_pragmas(engine)
+    Base.metadata.create_all(engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@pytest.fixture
+def databases(tmp_path):
+    # Two files standing in for a primary and a replica that lags behind it
+    primary, replica = file_database(tmp_path / "primary.db"), file_database(tmp_path / "replica.db")
+    with primary() as db:
+        db.add(User(name="On the primary", email="primary@example.com"))
+        db.commit()
+    with replica() as db:
+        db.add(User(name="On the replica", email="replica@example.com"))
+        db.commit()
+    return primary, replica
+
+@pytest.fixture
+def client():
+    app = create_app(replace(settings, database_replica_urls=("sqlite:///replica.db",), read_your_writes_seconds=5.0))
+    return TestClient(app)
+
+@pytest.fixture
+def route(databases):
+    routers = []
+
+    def install(*args, **kwargs):
+        router = ReadRouter(*args, **kwargs)
+        routers.append(configure_read_router(router))
+        return router
+
+    yield install
+    configure_read_router(routers[0])
+
+def names(client):
+    return sorted(user["name"] for user in client.get("/users/").json())
+
+
+def test_reads_go_to_the_replica_until_the_client_writes(databases, route, client):
+    primary, replica = databases
+    router = route(primary, [replica], pin_seconds=5.0)
+    # Reads are served by the replica
+    assert names(client) == ["On the replica"]
+    # When the client writes, the write goes to the primary and pins its reads there
+    response = client.post("/users/", json={"name": "New", "email": "new@example.com"})
+    assert response.status_code == 200
+    assert PIN_COOKIE in response.cookies
+    assert names(client) == ["New", "On the primary"]
+    # Other clients, and this one once the pin is gone, read from the replica again
+    client.cookies.clear()
+    assert names(client) == ["On the replica"]
+    # Failed writes do not pin
+    assert PIN_COOKIE not in client.post("/users/", json={"name": "New", "email": "new@example.com"}).cookies
+    assert router.metrics()["pinned_reads"] == 1
+
+def test_forged_pins_are_bounded(databases, route):
+    primary, replica = databases
+    router = route(primary, [replica], pin_seconds=5.0)
+    assert router.is_pinned("9999999999") is False
+    assert router.is_pinned("not a time") is False
+
+def test_unhealthy_replicas_fall_back_to_the_primary(databases, route, client, tmp_path):
+    primary, _ = databases
+    broken = sessionmaker(bind=create_engine(f"sqlite:///{tmp_path / 'missing' / 'replica.db'}"))
+    # When the health check finds the replica unreachable
+    router = route(primary, [broken], check_interval=0)
+    # Then reads are served by the primary
+    assert names(client) == ["On the primary"]
+    assert router.metrics()["healthy"] == 0
+
+def test_replicas_failing_between_checks_are_taken_out(databases, route, client, tmp_path):
+    primary, _ = databases
+    broken = sessionmaker(bind=create_engine(f"sqlite:///{tmp_path / 'missing' / 'replica.db'}"))
+    route(primary, [broken], check_interval=3600)
+    # The first read still goes to the replica and fails
+    assert client.get("/users/").status_code == 500
+    # After which the replica is out until the next check
+    assert names(client) == ["On the primary"]
+
+def test_pinned_clients_skip_entries_cached_from_replicas(databases, route, client):
+    primary, replica = databases
+    route(primary, [replica], pin_seconds=5.0)
+    other = TestClient(client.app)
+    # Given a client that just wrote
+    assert client.post("/users/", json={"name": "New", "email": "new@example.com"}).status_code == 200
+    # When another client caches the lagging replica's view of the stats
+    assert other.get("/stats/").json()["user_count"] == 1
+    # Then the writer still reads its own write from the primary
+    assert client.get("/stats/").json()["user_count"] == 2
@@ -0,0 +1,109 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+import pytest
+from sqlalchemy import create_engine, delete
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from fastapi.testclient import TestClient
+
+import schemas
+from models.models import Base, UserSearchTerm
+from crud.user_crud import (
+    backfill_search_terms,
+    create_user,
+    create_users_batch,
+    delete_user,
+    modify_user,
+    search_terms,
+    search_user_rows,
+)
+from db.database import get_read_db, get_write_db
+from main import app
+
+# Setup a test database (in-memory SQLite shared across threads for the API client)
+engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def db_session():
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture
+def users(db_session):
+    ann = create_user(db_session, schemas.UserCreate(name="Ann O'Brien", email="ann@example.com"))
+    anna = create_user(db_session, schemas.UserCreate(name="Anna Smith", email="asmith@corp.io"))
+    create_users_batch(db_session, [(0, schemas.UserCreate(name="Bob Annan", email="bob@example.com"))])
+    return {"ann": ann.id, "anna": anna.id}
+
+def names(rows):
+    return [row.name for row in rows]
+
+
+def test_search_terms_sort_bytewise_on_postgresql():
+    # Prefix ranges need byte order, not the language-aware default collation
+    ddl = str(CreateTable(UserSearchTerm.__table__).compile(dialect=postgresql.dialect()))
+    assert 'term VARCHAR COLLATE "C"' in ddl
+
+def test_search_terms():
+    assert search_terms("Ann O'Brien", "Ann@Example.com") == ["ann", "ann@example.com", "brien", "example.com", "o", "o'brien"]
+
+def test_prefix_search(db_session, users):
+    # Name words, emails and domains match by prefix, whatever the case
+    assert sorted(names(search_user_rows(db_session, "AN")[0])) == ["Ann O'Brien", "Anna Smith", "Bob Annan"]
+    assert names(search_user_rows(db_session, "asmith@")[0]) == ["Anna Smith"]
+    assert sorted(names(search_user_rows(db_session, "example")[0])) == ["Ann O'Brien", "Bob Annan"]
+    # Every word of the query has to match
+    assert names(search_user_rows(db_session, "ann bri")[0]) == ["Ann O'Brien"]
+    assert search_user_rows(db_session, "zed")[0] == []
+
+def test_search_pages_list_every_user_once(db_session, users):
+    # "ann" matches Ann through both a name word and the email
+    seen, cursor = [], None
+    while True:
+        rows, cursor = search_user_rows(db_session, "ann", limit=1, cursor=cursor)
+        seen.extend(names(rows))
+        if cursor is None:
+            break
+    assert sorted(seen) == ["Ann O'Brien", "Anna Smith", "Bob Annan"]
+
+def test_search_follows_writes(db_session, users):
+    # When a user is renamed, then another one deleted
+    modify_user(db_session, users["anna"], schemas.UserCreate(name="Zoe Smith", email="unused@example.com"))
+    delete_user(db_session, users["ann"])
+    # Then the index reflects both changes
+    assert names(search_user_rows(db_session, "ann")[0]) == ["Bob Annan"]
+    assert names(search_user_rows(db_session, "zoe")[0]) == ["Zoe Smith"]
+
+def test_backfill_search_terms(db_session, users):
+    # Given a database that predates the index
+    db_session.execute(delete(UserSearchTerm))
+    db_session.commit()
+    # Then the backfill restores it
+    assert backfill_search_terms(db_session, chunk_size=2) > 0
+    assert names(search_user_rows(db_session, "asm")[0]) == ["Anna Smith"]
+    assert backfill_search_terms(db_session) == 0
+
+def test_search_endpoint(db_session, users):
+    app.dependency_overrides[get_read_db] = app.dependency_overrides[get_write_db] = lambda: db_session
+    try:
+        client = TestClient(app)
+        response = client.get("/users/search", params={"q": "an", "limit": 2})
+        assert response.status_code == 200
+        assert len(response.json()) == 2
+        response = client.get("/users/search", params={"q": "an", "cursor": response.headers["x-next-cursor"]})
+        assert len(response.json()) == 1
+        assert "x-next-cursor" not in response.headers
+        assert client.get("/users/search", params={"q": "an", "cursor": "bogus"}).status_code == 400
+        assert client.get("/users/search").status_code == 422
+    finally:
+        app.dependency_overrides.clear()
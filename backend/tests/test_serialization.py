@@ -0,0 +1,86 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+import pytest
+from datetime import datetime, timedelta, timezone
+from typing import List
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from fastapi.testclient import TestClient
+
+import core.serialization as serialization
+import schemas
+from models.models import Base, User
+from crud.user_crud import create_connection, get_possible_users_to_connect, get_user_connections, get_users_page
+from db.database import get_read_db, get_write_db
+from main import app
+
+# Setup a test database (in-memory SQLite shared across threads for the API client)
+DATABASE_URL = "sqlite:///:memory:"
+engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def db_session():
+    # Create the database tables
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture
+def client(db_session):
+    app.dependency_overrides[get_read_db] = app.dependency_overrides[get_write_db] = lambda: db_session
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+@pytest.fixture
+def graph(db_session):
+    # me - friend - candidate, with names that need escaping
+    users = {
+        "me": User(name="Zoë \"Z\" \\ Ünal", email="me@example.com", created_at=datetime(2024, 1, 1, 12, 0, 0)),
+        "friend": User(name="Tab\there\n😀", email="friend@example.com", created_at=datetime(2024, 1, 1, 12, 0, 0, 5)),
+        "candidate": User(name="Candidate", email="candidate@example.com", created_at=datetime(2024, 1, 2, 8, 30, 0, 250000)),
+    }
+    db_session.add_all(users.values())
+    db_session.commit()
+    create_connection(db_session, users["me"].id, users["friend"].id)
+    create_connection(db_session, users["friend"].id, users["candidate"].id)
+    return users
+
+
+@pytest.mark.parametrize("value", [
+    datetime(2024, 1, 1, 12, 0, 0),
+    datetime(2024, 1, 1, 12, 0, 0, 120),
+    datetime(2024, 1, 1, 12, 0, 0, tzinfo=timezone.utc),
+    datetime(2024, 1, 1, 12, 0, 0, 500000, tzinfo=timezone(timedelta(hours=-3))),
+    datetime(2024, 1, 1, 12, 0, 0, tzinfo=timezone(timedelta(hours=5, minutes=30, seconds=10))),
+])
+def test_format_datetime_matches_pydantic(value):
+    expected = TypeAdapter(datetime).dump_json(value).decode().strip('"')
+    assert serialization.format_datetime(value) == expected
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_list_endpoints_are_byte_compatible(client, db_session, graph, monkeypatch, use_orjson):
+    # Given the encoder in use (orjson or the stdlib fallback)
+    if not use_orjson:
+        monkeypatch.setattr(serialization, "orjson", None)
+    users = TypeAdapter(List[schemas.User])
+    possible = TypeAdapter(List[schemas.PossibleConnection])
+    me = graph["me"]
+    # Then every list endpoint returns exactly what the response models produce
+    def dump_users(models):
+        return users.dump_json(users.validate_python(models, from_attributes=True))
+    assert client.get("/users/").content == dump_users(get_users_page(db_session)[0])
+    assert client.get(f"/users/{me.id}/connections").content == dump_users(get_user_connections(db_session, me.id))
+    expected = [
+        schemas.PossibleConnection.model_validate(user).model_copy(update={"mutual_connections": mutual})
+        for user, mutual in get_possible_users_to_connect(db_session, me.id)
+    ]
+    assert client.get(f"/users/{me.id}/possible_connections").content == possible.dump_json(expected)
@@ -0,0 +1,102 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+
+from core.cache import NullCache, ResponseCache, STATS_TAG
+from core.singleflight import SingleFlight
+
+
+def wait_for(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def test_concurrent_calls_share_one_load():
+    # Given a load that only finishes once every other caller is waiting on it
+    flight, calls = SingleFlight(), []
+
+    def loader():
+        calls.append(1)
+        wait_for(lambda: flight.coalesced == 7)
+        return {"user_count": 3}
+
+    # When eight threads ask for the same key
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda _: flight.do("stats@1", loader, metric_key="stats"), range(8)))
+    # Then the loader ran once and everyone got its result
+    assert len(calls) == 1 and results == [{"user_count": 3}] * 8
+    assert flight.metrics() == {"loads": 1, "coalesced": 7, "coalesced_by_key": {"stats": 7}}
+    # And the key is released: the next call loads again
+    flight.do("stats@1", lambda: None)
+    assert flight.loads == 2
+
+def test_waiting_callers_receive_the_error():
+    flight, started = SingleFlight(), threading.Event()
+
+    def loader():
+        started.set()
+        wait_for(lambda: flight.coalesced == 1)
+        raise ValueError("database is down")
+
+    with ThreadPoolExecutor(2) as pool:
+        leader = pool.submit(flight.do, "key", loader)
+        started.wait()
+        follower = pool.submit(flight.do, "key", loader)
+        for future in (leader, follower):
+            with pytest.raises(ValueError):
+                future.result()
+
+def test_async_calls_share_one_load():
+    flight, calls = SingleFlight(), []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return len(calls)
+
+    async def main():
+        return await asyncio.gather(*(flight.ado("connections@1", loader) for _ in range(10)))
+
+    assert asyncio.run(main()) == [1] * 10
+    assert (flight.loads, flight.coalesced) == (1, 9)
+
+def test_async_waiters_reload_when_the_first_request_is_cancelled():
+    flight, calls = SingleFlight(), []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "fresh"
+
+    async def main():
+        leader = asyncio.ensure_future(flight.ado("key", loader))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.ado("key", loader))
+        await asyncio.sleep(0)
+        # When the request that started the load goes away
+        leader.cancel()
+        # Then the waiting one runs its own load instead of failing
+        return await follower
+
+    assert asyncio.run(main()) == "fresh" and len(calls) == 2
+
+def test_requests_after_an_invalidation_do_not_join_an_older_load():
+    # Given a load that is overtaken by a write
+    cache = ResponseCache(NullCache(), SingleFlight())
+
+    def stale_loader():
+        cache.invalidate(STATS_TAG)
+        # The same key, requested again while the first load is in flight,
+        # gets its own load (joining would wait on this very call)
+        assert cache.get_or_load("stats", [STATS_TAG], lambda: "fresh") == "fresh"
+        return "stale"
+
+    assert cache.get_or_load("stats", [STATS_TAG], stale_loader) == "stale"
+    assert cache.metrics()["loads"] == 2
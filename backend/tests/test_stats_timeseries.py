@@ -0,0 +1,93 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+import pytest
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from fastapi.testclient import TestClient
+
+import schemas
+from models.models import Base, Connection, StatsRollup, User
+from crud.statistics_crud import bucket_start, get_timeseries, rebuild_rollups
+from crud.user_crud import create_connection, create_user, delete_user
+from db.database import get_read_db, get_write_db
+from main import app
+
+# Setup a test database (in-memory SQLite shared across threads for the API client)
+engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def db_session():
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture
+def client(db_session):
+    app.dependency_overrides[get_read_db] = app.dependency_overrides[get_write_db] = lambda: db_session
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+def rollup_rows(db_session):
+    return sorted(db_session.execute(select(
+        StatsRollup.bucket, StatsRollup.bucket_start, StatsRollup.new_users, StatsRollup.new_connections
+    )).all())
+
+
+def test_writes_update_the_current_buckets(db_session):
+    # Given three users and two connections created through the CRUD layer
+    users = [create_user(db_session, schemas.UserCreate(name=f"U{i}", email=f"u{i}@example.com")) for i in range(3)]
+    create_connection(db_session, users[0].id, users[1].id)
+    create_connection(db_session, users[1].id, users[2].id)
+    delete_user(db_session, users[2].id)
+    # When reading the current hour and day
+    now = datetime.now(timezone.utc)
+    hourly = get_timeseries(db_session, "hour", now - timedelta(hours=1), now)
+    daily = get_timeseries(db_session, "day", now - timedelta(days=1), now)
+    # Then the creations are counted once per granularity and the delete takes nothing back
+    for series in (hourly, daily):
+        assert len(series) == 2
+        assert sum(point["new_users"] for point in series) == 3
+        assert sum(point["new_connections"] for point in series) == 2
+
+def test_rebuild_matches_history(db_session):
+    # Given rows written without the CRUD layer, across two days
+    times = [datetime(2024, 1, 1, 10, 5), datetime(2024, 1, 1, 10, 55), datetime(2024, 1, 2, 0, 0)]
+    users = [User(name=f"U{i}", email=f"u{i}@example.com", created_at=at) for i, at in enumerate(times)]
+    db_session.add_all(users)
+    db_session.flush()
+    db_session.add(Connection(user_id=users[0].id, connected_user_id=users[1].id, connection_made_at=times[1]))
+    db_session.commit()
+    # When rebuilding the rollups from the tables, twice
+    rebuild_rollups(db_session, chunk_size=2)
+    assert rebuild_rollups(db_session) == 4
+    # Then each bucket holds what was created in it
+    assert rollup_rows(db_session) == [
+        ("day", datetime(2024, 1, 1), 2, 1),
+        ("day", datetime(2024, 1, 2), 1, 0),
+        ("hour", datetime(2024, 1, 1, 10), 2, 1),
+        ("hour", datetime(2024, 1, 2, 0), 1, 0),
+    ]
+    assert bucket_start(datetime(2024, 1, 1, 23, 30, tzinfo=timezone(timedelta(hours=-3))), "day") == datetime(2024, 1, 2)
+
+def test_timeseries_endpoint(client, db_session):
+    # Given one user created now
+    create_user(db_session, schemas.UserCreate(name="A", email="a@example.com"))
+    # When asking for the last days
+    response = client.get("/stats/timeseries", params={"bucket": "day"})
+    # Then the series ends with today's bucket
+    assert response.status_code == 200
+    points = response.json()["points"]
+    assert len(points) == 48 and sum(point["new_users"] for point in points[-2:]) == 1
+    # And oversized, inverted or unknown ranges are rejected
+    assert client.get("/stats/timeseries", params={"bucket": "hour", "from": "2000-01-01T00:00:00Z"}).status_code == 400
+    assert client.get("/stats/timeseries", params={"from": "2024-01-02T00:00:00Z", "to": "2024-01-01T00:00:00Z"}).status_code == 400
+    assert client.get("/stats/timeseries", params={"bucket": "week"}).status_code == 422
@@ -0,0 +1,79 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+import uuid
+import pytest
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.orm import Session
+
+from models.models import Base, Connection, User, UserAdjacency
+from crud.user_crud import get_neighbor_ids, get_user_by_id
+from db.migrations import check_schema, run_migrations
+from db.uuid_storage import convert_database, legacy_metadata, legacy_uuid_columns
+
+
+@pytest.fixture
+def legacy_database(tmp_path):
+    # A database in the old format: ids as hex text in columns declared "UUID"
+    path = tmp_path / "legacy.db"
+    engine = create_engine(f"sqlite:///{path}")
+    metadata = legacy_metadata()
+    metadata.create_all(engine)
+    a, b = uuid.uuid4(), uuid.uuid4()
+    connection_id = uuid.uuid4()
+    tables = metadata.tables
+    with engine.begin() as connection:
+        connection.execute(insert(tables["users"]), [
+            {"id": a, "name": "A", "email": "a@example.com"},
+            {"id": b, "name": "B", "email": "b@example.com"},
+        ])
+        connection.execute(insert(tables["connections"]), [{"id": connection_id, "user_id": a, "connected_user_id": b}])
+        connection.execute(insert(tables["user_adjacency"]), [
+            {"user_id": a, "neighbor_id": b, "connection_id": connection_id},
+            {"user_id": b, "neighbor_id": a, "connection_id": connection_id},
+        ])
+        # An all-digit id SQLite turned into a number, which cannot be read back
+        connection.execute(text("INSERT INTO users (id, name, email) VALUES (1.5e300, 'Lost', 'lost@example.com')"))
+    engine.dispose()
+    return path, a, b
+
+
+def test_ids_are_stored_as_16_bytes(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'new.db'}")
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        user = User(name="A", email="a@example.com")
+        db.add(user)
+        db.commit()
+        user_id = user.id
+        # Then the column holds the raw bytes and reads back as a UUID
+        assert db.execute(text("SELECT typeof(id), length(id) FROM users")).one() == ("blob", 16)
+        assert get_user_by_id(db, user_id).id == user_id
+    assert legacy_uuid_columns(engine) == []
+
+def test_legacy_databases_are_refused(legacy_database):
+    path, _, _ = legacy_database
+    engine = create_engine(f"sqlite:///{path}")
+    assert "users.id" in legacy_uuid_columns(engine)
+    with pytest.raises(RuntimeError, match="convert_uuids"):
+        check_schema(engine)
+    with pytest.raises(RuntimeError, match="convert_uuids"):
+        run_migrations(engine)
+
+def test_convert_database(legacy_database, tmp_path):
+    path, a, b = legacy_database
+    target = tmp_path / "converted.db"
+    # When converting the legacy file
+    counts = convert_database(path, target, batch_size=1)
+    # Then every readable row is copied, and the mangled one is reported
+    assert counts["users"] == (2, 1)
+    assert counts["user_adjacency"] == (2, 0)
+    engine = create_engine(f"sqlite:///{target}")
+    run_migrations(engine)
+    with Session(engine) as db:
+        assert get_neighbor_ids(db, a) == [b]
+        assert db.query(Connection).one().user_id == a
+        assert db.query(UserAdjacency).count() == 2
+    # And converting back gives the old format again
+    assert convert_database(target, tmp_path / "back.db", to_legacy=True)["users"] == (2, 0)
+    assert "users.id" in legacy_uuid_columns(create_engine(f"sqlite:///{tmp_path / 'back.db'}"))
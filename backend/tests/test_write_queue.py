@@ -0,0 +1,136 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+import uuid
+import pytest
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+from fastapi.testclient import TestClient
+
+from models.models import Base, Connection, ConnectionOperation, User
+from core.write_queue import WriteQueue, configure_write_queue
+from crud.operation_crud import APPLIED, CREATE, DELETE, FAILED, apply_pending_operations, journal_operations
+from crud.statistics_crud import get_statistics, reconcile_statistics
+from crud.user_crud import get_neighbor_ids
+from db.database import get_read_db, get_write_db, install_sqlite_pragmas
+from main import app
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    # The worker thread opens its own sessions, so the database is a file
+    engine = create_engine(f"sqlite:///{tmp_path / 'queue.db'}", connect_args={"check_same_thread": False})
+    install_sqlite_pragmas(engine)
+    Base.metadata.create_all(engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@pytest.fixture
+def users(session_factory):
+    with session_factory() as db:
+        users = [User(name=f"User {i}", email=f"user{i}@example.com") for i in range(4)]
+        db.add_all(users)
+        db.commit()
+        return [user.id for user in users]
+
+@pytest.fixture
+def queue(session_factory):
+    queue = WriteQueue(session_factory, batch_size=3, flush_interval=0.01)
+    queue.start()
+    yield queue
+    queue.stop()
+
+def statuses(session_factory):
+    with session_factory() as db:
+        return [(row.kind, row.status, row.detail) for row in db.query(ConnectionOperation).order_by(ConnectionOperation.seq)]
+
+
+def test_queued_operations_are_applied_in_order(session_factory, users, queue):
+    a, b, c, d = users
+    # When creates and deletes are queued, including a create and delete of the same pair
+    futures = [
+        queue.submit(CREATE, a, b),
+        queue.submit(CREATE, a, c),
+        queue.submit(CREATE, c, d),
+        queue.submit(DELETE, c, a),
+        queue.submit(CREATE, b, c),
+    ]
+    ids = [future.result(timeout=5) for future in futures]
+    queue.stop()
+    # Then every operation got its own id and was applied, oldest first
+    assert len(set(ids)) == 5
+    assert [status for _, status, _ in statuses(session_factory)] == [APPLIED] * 5
+    with session_factory() as db:
+        assert sorted(get_neighbor_ids(db, c)) == sorted([b, d])
+        # And the counters agree with the tables
+        assert get_statistics(db)["connection_count"] == 3
+        assert reconcile_statistics(db) == {}
+    assert queue.metrics()["flushes"] >= 2
+
+def test_failed_operations_are_recorded(session_factory, users, queue):
+    a, b, _, _ = users
+    queue.submit(CREATE, a, b)
+    queue.submit(CREATE, b, a)
+    queue.submit(DELETE, a, uuid.uuid4())
+    queue.submit(CREATE, a, uuid.uuid4()).result(timeout=5)
+    queue.stop()
+    # Then the conflicts are reported on the operations, and only one edge exists
+    assert [(status, detail is not None) for _, status, detail in statuses(session_factory)] == [
+        (APPLIED, False), (FAILED, True), (FAILED, True), (FAILED, True),
+    ]
+    with session_factory() as db:
+        assert db.query(func.count(Connection.id)).scalar() == 1
+
+def test_idempotency_keys_return_the_first_operation(session_factory, users, queue):
+    a, b, _, _ = users
+    first = queue.submit(CREATE, a, b, idempotency_key="retry-me").result(timeout=5)
+    # When the same request is retried, in a later batch and twice in one
+    again = [queue.submit(CREATE, a, b, idempotency_key="retry-me") for _ in range(2)]
+    # Then it maps to the operation already journaled
+    assert [future.result(timeout=5) for future in again] == [first, first]
+    queue.stop()
+    assert [status for _, status, _ in statuses(session_factory)] == [APPLIED]
+
+def test_journaled_operations_survive_a_restart(session_factory, users):
+    # Given operations that were acknowledged but not applied before a crash
+    a, b, c, _ = users
+    with session_factory() as db:
+        journal_operations(db, [
+            {"kind": CREATE, "user_id": a, "connected_user_id": b},
+            {"kind": CREATE, "user_id": b, "connected_user_id": c},
+        ])
+    # When a new worker starts
+    queue = WriteQueue(session_factory)
+    queue.start()
+    queue.stop()
+    # Then it applies them, and they are never applied twice
+    assert [status for _, status, _ in statuses(session_factory)] == [APPLIED, APPLIED]
+    with session_factory() as db:
+        assert apply_pending_operations(db) == 0
+
+def test_write_behind_endpoints(session_factory, users, queue):
+    a, b, _, _ = users
+    previous = configure_write_queue(queue)
+    db = session_factory()
+    app.dependency_overrides[get_read_db] = app.dependency_overrides[get_write_db] = lambda: db
+    try:
+        client = TestClient(app)
+        # The create is acknowledged with an operation id
+        response = client.post("/users/connect", json={"user_id": str(a), "connected_user_id": str(b)},
+                               headers={"Idempotency-Key": "k1"})
+        assert response.status_code == 202
+        operation_id = response.json()["operation_id"]
+        assert response.headers["location"] == f"/users/connections/operations/{operation_id}"
+        queue.stop()
+        # Which can be followed until it is applied
+        operation = client.get(f"/users/connections/operations/{operation_id}").json()
+        assert (operation["kind"], operation["status"]) == (CREATE, APPLIED)
+        assert client.get(f"/users/connections/operations/{uuid.uuid4()}").status_code == 404
+        # Requests that fail validation are still rejected right away
+        assert client.post("/users/connect", json={"user_id": str(a), "connected_user_id": str(b)}).status_code == 400
+        assert client.delete(f"/users/connections/{a}/{uuid.uuid4()}").status_code == 404
+        # And nothing is accepted once the queue has stopped
+        assert client.delete(f"/users/connections/{a}/{b}").status_code == 503
+    finally:
+        app.dependency_overrides.clear()
+        configure_write_queue(previous)
+        db.close()
@@ -10,6 +10,8 @@ import Error from "../common/error";
 
 export interface UsersViewProps {}
 
+const PAGE_SIZE = 500;
+
 export default function UsersView(props: UsersViewProps) {
   const [users, setUsers] = useState([]);
   const [loading, setLoading] = useState(true);
@@ -20,8 +22,17 @@ export default function UsersView(props: UsersViewProps) {
   const fetchUsers = async () => {
     setLoading(true);
     try {
-      const response = await axios.get("http://localhost:8001/users");
-      setUsers(response.data);
+      // The API returns one page at a time; follow X-Next-Cursor to the end
+      const allUsers: any[] = [];
+      let cursor: string | undefined;
+      do {
+        const response = await axios.get("http://localhost:8001/users", {
+          params: { limit: PAGE_SIZE, cursor },
+        });
+        allUsers.push(...response.data);
+        cursor = response.headers?.["x-next-cursor"];
+      } while (cursor);
+      setUsers(allUsers);
     } catch (error) {
       setError("An error occurred while fetching users.");
     } finally {
@@ -1,8 +1,13 @@
 import React from 'react';
 import ReactDOM from 'react-dom/client';
+import axios from 'axios';
 import './index.css';
 import App from './App';
 
+// The API is on another origin; credentials let its read-your-writes cookie
+// come back, so the list shown after a change includes that change
+axios.defaults.withCredentials = true;
+
 const root = ReactDOM.createRoot(
   document.getElementById('root') as HTMLElement
 );
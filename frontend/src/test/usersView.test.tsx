@@ -59,6 +59,26 @@ describe("UsersView Component", () => {
     });
   });
 
+  it("follows the next cursor until every page is loaded", async () => {
+    mockedAxios.get
+      .mockResolvedValueOnce({
+        data: [{ id: 1, name: "John Doe", created_at: "2024-06-23T06:25:35" }],
+        headers: { "x-next-cursor": "next" },
+      })
+      .mockResolvedValueOnce({
+        data: [{ id: 2, name: "Jane Doe", created_at: "2024-06-23T06:25:35" }],
+        headers: {},
+      });
+    render(<UsersView />, { wrapper: BrowserRouter });
+    await waitFor(() => {
+      expect(screen.getByText(/jane doe/i)).toBeInTheDocument();
+    });
+    expect(screen.getByText(/john doe/i)).toBeInTheDocument();
+    expect(mockedAxios.get).toHaveBeenLastCalledWith("http://localhost:8001/users", {
+      params: { limit: 500, cursor: "next" },
+    });
+  });
+
   it('opens modal when "Create Your First User" button is clicked', async () => {
     mockedAxios.get.mockResolvedValue({ data: [] }); // Mock axios call with empty array
     render(<UsersView />, { wrapper: BrowserRouter });